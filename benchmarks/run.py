@@ -0,0 +1,162 @@
+"""
+Offline benchmarks of the pipeline stages on synthetic cities.
+
+Every case runs in a fresh process that first generates its synthetic input
+and then times the stage, recording the wall time and the peak memory added
+by the stage (resident set size high-water mark above the one after the
+input was generated). Results can be saved as JSON and compared with a
+baseline, the script then exits with status 1 if any case got slower or
+bigger than the tolerance allows, so it can be used as a regression gate.
+
+Examples:
+    python benchmarks/run.py --sizes 10000 100000
+    python benchmarks/run.py --cases streets buildings --sizes 1000000 --save baseline.json
+    python benchmarks/run.py --baseline baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+#The sequential classifier replaced by the rule engine is kept in the tests as a reference
+TESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests')
+
+SIZES = [10000, 100000, 1000000, 10000000]
+#Features per zone unit of the synthetic cities
+FEATURES_PER_ZONE = 1000
+
+def _peak_rss():
+    """ Resident set size high-water mark of the process in bytes """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _osmpoi(directory):
+    from spatialzosm.spatialize import Osmpoi
+    osmpoi = Osmpoi('Synthetic city')
+    osmpoi.save_filtered = False
+    osmpoi.file_export = os.path.join(directory, 'POIs')
+    return osmpoi
+
+def case_filter(size, directory):
+    import synthetic
+    df = synthetic.raw_pois(size)
+    osmpoi = _osmpoi(directory)
+    return lambda: osmpoi.filter_osm_points(df)
+
+def case_classify(size, directory):
+    import synthetic
+    from spatialzosm.utils._poirules import engine
+    df = synthetic.raw_pois(size)
+    return lambda: engine.classify(df, ranks=True)
+
+def case_classify_masks(size, directory):
+    import synthetic
+    sys.path.insert(0, TESTS)
+    from test_poirules import baseline_classify
+    df = synthetic.raw_pois(size)
+    return lambda: baseline_classify(df)
+
+def case_streets(size, directory):
+    import synthetic
+    n_zones = max(size // FEATURES_PER_ZONE, 1)
+    streets = synthetic.grid_streets(size, n_zones)
+    pop_size = synthetic.population(n_zones, size)
+    osmpoi = _osmpoi(directory)
+    return lambda: osmpoi.create_houses_streets(streets.copy(), pop_size.copy(), index_col='zone', seed=0,
+                                                output=os.path.join(directory, 'streets.csv'))
+
+def case_buildings(size, directory):
+    import synthetic
+    n_zones = max(size // FEATURES_PER_ZONE, 1)
+    buildings = synthetic.buildings(size, n_zones)
+    pop_size = synthetic.population(n_zones, size)
+    osmpoi = _osmpoi(directory)
+    return lambda: osmpoi.create_houses_buildings(buildings.copy(), pop_size.copy(), index_column='zone', seed=0,
+                                                  output=os.path.join(directory, 'buildings.csv'))
+
+def case_areas(size, directory):
+    import synthetic
+    n_zones = max(size // FEATURES_PER_ZONE, 1)
+    zones = synthetic.zone_units(n_zones)
+    osmpoi = _osmpoi(directory)
+    return lambda: osmpoi.create_houses_areas(zones, pop_size=size // len(zones), seed=0, output=os.path.join(directory, 'areas.csv'))
+
+def case_normal(size, directory):
+    import numpy
+    import synthetic
+    from spatialzosm.utils._randist import normal
+    polygon = synthetic.zone_units(1).geometry.values[0]
+    return lambda: normal(polygon, size, rng=numpy.random.default_rng(0))
+
+CASES = {'filter': case_filter, 'classify': case_classify, 'classify_masks': case_classify_masks, 'streets': case_streets, 'buildings': case_buildings, 'areas': case_areas, 'normal': case_normal}
+
+def _run_case(name, size, queue):
+    with tempfile.TemporaryDirectory() as directory:
+        stage = CASES[name](size, directory)
+        before = _peak_rss()
+        start = time.perf_counter()
+        stage()
+        seconds = time.perf_counter() - start
+        queue.put({'case': name, 'size': size, 'seconds': seconds, 'peak_mb': (_peak_rss() - before) / 2**20})
+
+def run(name, size):
+    """ Run one benchmark case in a fresh process and return its result """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(name, size, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Benchmark {name} with {size} features failed with exit code {process.exitcode}.")
+    return queue.get()
+
+def compare(results, baseline, tolerance):
+    """ Cases of results slower or bigger than the same case in baseline by more than tolerance """
+    reference = {(item['case'], item['size']): item for item in baseline}
+    regressions = []
+    for item in results:
+        base = reference.get((item['case'], item['size']))
+        if base is None:
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            # Times below 50 ms and memory deltas below 1 MB are noise of the timer and of the allocator
+            floor = 1.0 if metric == 'peak_mb' else 0.05
+            if item[metric] > max(base[metric], floor) * (1 + tolerance):
+                regressions.append('{} {} {}: {:.2f} (baseline {:.2f})'.format(item['case'], item['size'], metric, item[metric], base[metric]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks of spatialzosm on synthetic cities.')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES[:2], help='number of features of the synthetic inputs')
+    parser.add_argument('--save', help='save the results as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare with, exit with status 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown or memory growth')
+    args = parser.parse_args(argv)
+
+    results = []
+    print('{:<15} {:>10} {:>10} {:>10}'.format('case', 'size', 'seconds', 'peak MB'))
+    for size in args.sizes:
+        for name in args.cases:
+            result = run(name, size)
+            results.append(result)
+            print('{:<15} {:>10} {:>10.2f} {:>10.1f}'.format(name, size, result['seconds'], result['peak_mb']))
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print('Regression:', regression)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
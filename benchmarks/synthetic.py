@@ -0,0 +1,120 @@
+import numpy
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from spatialzosm.utils._poirules import RULES, Group
+from spatialzosm.utils._streets import STREET_TYPES
+
+""" module: synthetic city generator for offline benchmarks """
+
+#Size of the city in degrees (about 11 x 11 km at mid latitudes) and its south west corner
+EXTENT = 0.1
+ORIGIN = (13.7, 51.0)
+
+#Share of the raw OSM features carrying every tag, roughly as in a European city extract
+TAG_DENSITY = {'building': .6, 'addr:housenumber': .3, 'amenity': .12, 'highway': .05, 'shop': .04, 'landuse': .03,
+               'leisure': .03, 'name': .3}
+DEFAULT_DENSITY = .01
+
+#Street classes of the generated edges, including classes that are not used to place homes
+STREET_MIX = STREET_TYPES + ['footway', 'service', "['residential', 'tertiary']", "['footway', 'primary']"]
+STREET_WEIGHTS = [.35, .05, .05, .08, .05, .04, .08, .15, .1, .03, .02]
+
+def _zipf_choice(generator, values, size, exponent=1.2):
+    """ Draw values with frequencies falling like a Zipf law, so a few values dominate as in OSM """
+    weights = 1.0 / numpy.arange(1, len(values) + 1) ** exponent
+    return numpy.asarray(values, dtype=object)[generator.choice(len(values), size, p=weights / weights.sum())]
+
+def zone_units(n_zones):
+    """ Square grid of about n_zones zone units covering the city, with ids 0 to n-1 in the zone column """
+    side = int(numpy.ceil(numpy.sqrt(n_zones)))
+    step = EXTENT / side
+    x, y = (grid.ravel() + origin for grid, origin in zip(numpy.meshgrid(numpy.arange(side) * step, numpy.arange(side) * step), ORIGIN))
+    return gpd.GeoDataFrame({'zone': numpy.arange(side * side)}, geometry=shapely.box(x, y, x + step, y + step), crs='EPSG:4326')
+
+def zone_of(geoms, n_zones):
+    """ Zone of the grid of zone_units containing the centroid of every geometry """
+    side = int(numpy.ceil(numpy.sqrt(n_zones)))
+    centroids = shapely.centroid(numpy.asarray(geoms))
+    column = numpy.clip(((shapely.get_x(centroids) - ORIGIN[0]) / EXTENT * side).astype(int), 0, side - 1)
+    row = numpy.clip(((shapely.get_y(centroids) - ORIGIN[1]) / EXTENT * side).astype(int), 0, side - 1)
+    return row * side + column
+
+def population(n_zones, total, seed=0):
+    """ Population of every zone of zone_units, summing to about total """
+    generator = numpy.random.default_rng(seed)
+    side = int(numpy.ceil(numpy.sqrt(n_zones)))
+    share = generator.dirichlet(numpy.ones(side * side))
+    return pd.Series(numpy.round(share * total), index=pd.Index(numpy.arange(side * side), name='zone'))
+
+def _edges(start, end, generator, n_zones):
+    lines = shapely.linestrings(numpy.stack([start, end], axis=1))
+    highway = numpy.asarray(STREET_MIX, dtype=object)[generator.choice(len(STREET_MIX), len(lines), p=STREET_WEIGHTS)]
+    return gpd.GeoDataFrame({'zone': zone_of(lines, n_zones), 'highway': highway, 'length': shapely.length(lines) * 111000,
+                             'osmid': numpy.arange(len(lines))}, geometry=lines, crs='EPSG:4326')
+
+def grid_streets(n_edges, n_zones=100, seed=0):
+    """
+    Street edges of a jittered grid city, with osmnx-like highway and length columns and the zone of every edge.
+    """
+    generator = numpy.random.default_rng(seed)
+    side = max(int(numpy.ceil(numpy.sqrt(n_edges / 2))), 2)
+    step = EXTENT / side
+    x, y = numpy.meshgrid(numpy.arange(side + 1) * step + ORIGIN[0], numpy.arange(side + 1) * step + ORIGIN[1])
+    nodes = numpy.stack([x, y], axis=-1) + generator.normal(0, step / 10, (side + 1, side + 1, 2))
+    start = numpy.concatenate([nodes[:, :-1].reshape(-1, 2), nodes[:-1, :].reshape(-1, 2)])
+    end = numpy.concatenate([nodes[:, 1:].reshape(-1, 2), nodes[1:, :].reshape(-1, 2)])
+    keep = generator.permutation(len(start))[:n_edges]
+    return _edges(start[keep], end[keep], generator, n_zones)
+
+def random_streets(n_edges, n_zones=100, seed=0):
+    """
+    Street edges of an irregular city, the edges of the Delaunay triangulation of random intersections.
+    """
+    generator = numpy.random.default_rng(seed)
+    # A triangulation of n points has about 3n edges, less those missing on the hull
+    points = generator.random((n_edges // 3 + 2 * int(numpy.sqrt(n_edges)) + 3, 2)) * EXTENT + ORIGIN
+    edges = shapely.get_parts(shapely.delaunay_triangles(shapely.multipoints(points), only_edges=True))
+    edges = edges[generator.permutation(len(edges))[:n_edges]]
+    coordinates = shapely.get_coordinates(edges).reshape(-1, 2, 2)
+    return _edges(coordinates[:, 0], coordinates[:, 1], generator, n_zones)
+
+def buildings(n_buildings, n_zones=100, seed=0):
+    """
+    Rotated rectangular building footprints from sheds to blocks, with building and building:levels tags and the zone of every building.
+    """
+    generator = numpy.random.default_rng(seed)
+    center = generator.random((n_buildings, 2)) * EXTENT + ORIGIN
+    size = numpy.exp(generator.normal(numpy.log(1.5e-4), .6, (n_buildings, 2)))
+    angle = generator.random(n_buildings) * numpy.pi
+    corners = numpy.array([[-.5, -.5], [.5, -.5], [.5, .5], [-.5, .5], [-.5, -.5]])
+    rotation = numpy.stack([numpy.cos(angle), -numpy.sin(angle), numpy.sin(angle), numpy.cos(angle)], axis=-1).reshape(-1, 2, 2)
+    rings = center[:, None, :] + numpy.einsum('nij,nkj->nki', rotation, corners[None, :, :] * size[:, None, :])
+    polygons = shapely.polygons(rings)
+    building = _zipf_choice(generator, ['yes', 'house', 'apartments', 'residential', 'garage', 'shed', 'commercial', 'school'], n_buildings)
+    levels = numpy.where(generator.random(n_buildings) < .4, generator.integers(1, 12, n_buildings).astype(str), None)
+    return gpd.GeoDataFrame({'zone': zone_of(polygons, n_zones), 'building': building, 'building:levels': levels},
+                            geometry=polygons, crs='EPSG:4326')
+
+def raw_pois(n_features, seed=0):
+    """
+    Raw OSM features as returned by fetch_osm_points: x, y, name and the tag columns used by the POI filter,
+    mostly empty and with Zipf distributed values.
+    """
+    generator = numpy.random.default_rng(seed)
+    vocabulary = set()
+    for rule in RULES:
+        if isinstance(rule, Group):
+            vocabulary.update(rule.amenities)
+        elif rule.values:
+            vocabulary.update(rule.values)
+    vocabulary = ['yes'] + sorted(vocabulary) + ['bus_stop', 'footway', 'unknown']
+    columns = dict.fromkeys(['amenity', 'highway'] + [rule.column for rule in RULES if not isinstance(rule, Group)])
+    data = {'x': generator.random(n_features) * EXTENT + ORIGIN[0], 'y': generator.random(n_features) * EXTENT + ORIGIN[1]}
+    for column in ['name'] + list(columns):
+        #'yes' is by far the most common building value
+        values = _zipf_choice(generator, vocabulary if column == 'building' else generator.permutation(vocabulary), n_features)
+        values[generator.random(n_features) >= TAG_DENSITY.get(column, DEFAULT_DENSITY)] = numpy.nan
+        data[column] = values
+    return pd.DataFrame(data)
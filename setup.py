@@ -9,4 +9,7 @@ setup(
     packages=find_packages(where='src'),
     package_dir={'': 'src'},
     install_requires=required,
+    #Parquet and Feather files, and local OSM extracts (pyosmium is published as osmium)
+    extras_require={'parquet': ['pyarrow'], 'extract': ['osmium']},
+    entry_points={'console_scripts': ['spatialzosm=spatialzosm.batch:main']},
 )
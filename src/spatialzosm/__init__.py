@@ -1 +1,21 @@
-from . import spatialize
\ No newline at end of file
+import importlib
+
+#Public names and the modules defining them, imported at the first access so that
+#sampling-only workers do not pay for osmnx (see spatialzosm.sampling)
+_EXPORTS = {'Osmpoi': 'spatialzosm.spatialize', 'HouseSampler': 'spatialzosm.sampling',
+            'OsmCache': 'spatialzosm.utils._cache', 'OsmFile': 'spatialzosm.utils._localosm',
+            'TiledDownloader': 'spatialzosm.utils._tiled', 'BatchRunner': 'spatialzosm.batch', 'Place': 'spatialzosm.batch',
+            'PoiIndex': 'spatialzosm.utils._poiindex'}
+_SUBMODULES = ('spatialize', 'sampling', 'batch')
+
+__all__ = list(_EXPORTS) + list(_SUBMODULES)
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
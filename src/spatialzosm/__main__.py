@@ -0,0 +1,5 @@
+import sys
+
+from spatialzosm.batch import main
+
+sys.exit(main())
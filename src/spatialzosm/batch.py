@@ -0,0 +1,333 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from spatialzosm.utils._instrument import logger
+
+""" module: resumable batch runs of the pipeline over many places """
+
+#Stages in the order they are run for every place
+STAGES = ('fetch', 'filter', 'streets', 'buildings', 'sample')
+#Stages waiting on the network, the others are CPU bound
+NETWORK_STAGES = ('fetch', 'streets', 'buildings')
+#Stages every stage waits for when they are part of the same run. The buildings wait for the POIs so both come from one download,
+#the sample stage waits for the stage of its sample_on option
+DEPENDS = {'fetch': (), 'filter': ('fetch',), 'streets': (), 'buildings': ('fetch',), 'sample': ()}
+
+Place = namedtuple('Place', ['name', 'query', 'zones', 'population', 'zone_column'], defaults=[None, None, None, None])
+Place.__doc__ = """
+A place of a batch run.
+
+name: the name of the place, also used for its directory.
+query: the place as accepted by osmnx (str or dict), by default the name.
+zones: the polygons of the zone units (path or GeoDataFrame), needed by the sample stage.
+population: the population of every zone (path to a CSV with the zone ids in the first column and the population in the second, or a
+	pandas.Series indexed by zone id), needed by the sample stage.
+zone_column: the column of the zone ids, by default the name of the index of the population.
+"""
+
+def read_places(file_path):
+	"""
+	Read the places of a batch run from a text file with one place per line (empty lines and lines starting with # are skipped), or from a CSV
+	file with a place column and optional zones, population and zone_column columns.
+	"""
+	if os.path.splitext(file_path)[1].lower() == '.csv':
+		import pandas as pd
+		table = pd.read_csv(file_path, dtype=str)
+		table = table.astype(object).where(table.notna(), None)
+		columns = [column for column in Place._fields[2:] if column in table.columns]
+		return [Place(row['place'], **{column: row[column] for column in columns}) for _, row in table.iterrows()]
+	with open(file_path) as file:
+		lines = (line.strip() for line in file)
+		return [Place(line) for line in lines if line and not line.startswith('#')]
+
+def _slug(name):
+	""" Directory name of a place """
+	return re.sub(r'[^\w.-]+', '_', str(name)).strip('_') or 'place'
+
+def _default_format():
+	""" The file format of a batch run: Parquet when pyarrow is installed (the parquet extra), else CSV """
+	import importlib.util
+	return 'parquet' if importlib.util.find_spec('pyarrow') is not None else 'csv'
+
+def _population(place):
+	""" The population of the zones of a place as a Series indexed by zone id """
+	import pandas as pd
+	if isinstance(place.population, str):
+		return pd.read_csv(place.population, index_col=0).iloc[:, 0]
+	return place.population
+
+def _network_stage(osmpoi, stage, options):
+	"""
+	Run a network stage with the Osmpoi of the place. The fetch methods log their errors and return None, which is raised here.
+	"""
+	osmpoi.instrumentation.clear()
+	if stage == 'fetch':
+		osmpoi.save_raw = True
+		raw_format = options['format'] if options['format'] in ('csv', 'parquet', 'feather') else 'csv'
+		result = osmpoi.fetch_osm_points(format=raw_format)
+		path = osmpoi.file_export + '_raw.' + raw_format
+	elif stage == 'streets':
+		result = osmpoi.fetch_osm_streets(save_file=True, format=options['format'])
+		path = osmpoi.file_export + '_streets.' + options['format']
+	else:
+		result = osmpoi.fetch_osm_buildings(save_file=True, format=options['format'])
+		path = osmpoi.file_export + '_buildings.' + options['format']
+	if result is None:
+		raise RuntimeError(f"The {stage} stage of {osmpoi.place_name} failed, see the log.")
+	return {'result': path, 'report': osmpoi.run_report()}
+
+def _cpu_stage(place, stage, directory, options):
+	"""
+	Run a CPU bound stage of a place from the files written by the earlier stages. It runs in a worker process.
+	"""
+	file_export = os.path.join(directory, 'POIs')
+	if stage == 'filter':
+		from spatialzosm.spatialize import Osmpoi
+		osmpoi = Osmpoi(place.query or place.name)
+		osmpoi.file_export = file_export
+		raw_format = options['format'] if options['format'] in ('csv', 'parquet', 'feather') else 'csv'
+		if osmpoi.filter_osm_points(file_export + '_raw.' + raw_format, chunk_size=options['chunk_size']) is None:
+			raise RuntimeError(f"The filter stage of {place.name} could not read the raw POIs, see the log.")
+		return {'result': file_export + '_clean.csv', 'report': osmpoi.run_report()}
+
+	from spatialzosm.sampling import HouseSampler
+	sampler = HouseSampler()
+	population = _population(place)
+	zone_column = place.zone_column or population.index.name
+	houses_format = 'csv' if options['format'] == 'csv' else 'parquet'
+	output = os.path.join(directory, 'houses.' + houses_format)
+	source = file_export + '_' + options['sample_on'] + '.' + options['format']
+	sampling = {'seed': options['seed'], 'workers': options['workers'], 'format': houses_format, 'output': output, 'zones': place.zones,
+		'weights': options['weights']}
+	if options['chunk_size'] is not None:
+		sampling['chunk_size'] = options['chunk_size']
+	if options['sample_on'] == 'streets':
+		sampler.create_houses_streets(source, population, index_col=zone_column, **sampling)
+	else:
+		sampler.create_houses_buildings(source, population, index_column=zone_column, **sampling)
+	return {'result': output, 'report': sampler.run_report()}
+
+class BatchRunner:
+	"""
+	Run the stages of the pipeline (fetch, filter, streets, buildings and sample) for many places.
+
+	Network stages run on a pool of threads and CPU bound stages on a pool of processes, each with its own limit, and only as many jobs as
+	there are workers are handed to a pool, so the places are processed in order and their downloads do not pile up in memory. Every finished
+	stage is checkpointed in the directory of its place, a new run with the same output skips the stages already done. A failed stage does
+	not stop the other places, the stages depending on it are blocked until a later run.
+
+	Examples:
+		>>> runner = BatchRunner(read_places('municipalities.txt'), stages=('fetch', 'filter'), cache='osm_cache', network_workers=2) # doctest: +SKIP
+		>>> status = runner.run() # doctest: +SKIP
+	"""
+
+	def __init__(self, places, stages=STAGES, output='batch', network_workers=2, cpu_workers=1, cache=None, downloader=None, format=None,
+			sample_on='buildings', weights=None, seed=None, chunk_size=None, workers=1, restart=False, processes=True, callback=None):
+		"""
+		Args:
+			places (list): The places, as Place objects or names.
+			stages (list of str, optional): The stages to run, out of fetch, filter, streets, buildings and sample. Defaults to all of them.
+			output (str, optional): The directory of the results, with a subdirectory for every place. Defaults to 'batch'.
+			network_workers (int, optional): Number of fetch, streets and buildings stages run at a time. Defaults to 2.
+			cpu_workers (int, optional): Number of filter and sample stages run at a time. Defaults to 1.
+			cache (OsmCache or str, optional): Cache of the OSM downloads shared by all the places, or the path of its directory. Defaults to None.
+			downloader (object or str, optional): The downloader of the places, see Osmpoi. Defaults to None (osmnx).
+			format (str, optional): The file format of the downloaded data, 'csv', 'gpkg', 'parquet' or 'feather'. Defaults to None ('parquet' if pyarrow
+				is installed, else 'csv').
+			sample_on (str, optional): Whether the sample stage places the houses in the 'buildings' or along the 'streets'. Defaults to 'buildings'.
+			weights (str, optional): The weights of the sample stage, see create_houses_buildings. Defaults to None.
+			seed (int, optional): The seed of the sample stage. Defaults to None.
+			chunk_size (int, optional): Number of raw POIs filtered at a time by the filter stage (see filter_osm_points) and of houses sampled and
+				written at a time by the sample stage (see create_houses_buildings). Defaults to None (the whole file, and blocks of 1000000 houses).
+			workers (int, optional): Number of processes sampling the zones of a place in the sample stage, on top of cpu_workers. Defaults to 1.
+			restart (bool, optional): Whether to run again the stages already checkpointed. Defaults to False.
+			processes (bool, optional): Whether the CPU bound stages run in processes rather than threads. Defaults to True.
+			callback (callable, optional): Called as callback(place, stage, status) when a stage is done, resumed from a checkpoint, failed
+				or blocked. Defaults to None (logged to the 'spatialzosm' logger).
+		"""
+		unknown = set(stages) - set(STAGES)
+		if unknown:
+			raise ValueError(f"Unknown stages {sorted(unknown)}, use some of {STAGES}.")
+		if sample_on not in ('buildings', 'streets'):
+			raise ValueError("sample_on must be 'buildings' or 'streets'.")
+		self.places = [place if isinstance(place, Place) else Place(place) for place in places]
+		names = [place.name for place in self.places]
+		if len(set(names)) != len(names):
+			raise ValueError("The names of the places must be unique.")
+		if 'sample' in stages:
+			missing = [place.name for place in self.places if place.population is None]
+			if missing:
+				raise ValueError(f"The sample stage needs the population of the zones of {missing}.")
+		self.stages = [stage for stage in STAGES if stage in stages]
+		self.output = output
+		self.network_workers = max(network_workers, 1)
+		self.cpu_workers = max(cpu_workers, 1)
+		if isinstance(cache, str):
+			from spatialzosm.utils._cache import OsmCache
+			cache = OsmCache(cache)
+		self.cache = cache
+		self.downloader = downloader
+		self.options = {'format': format or _default_format(), 'sample_on': sample_on, 'weights': weights, 'seed': seed, 'chunk_size': chunk_size,
+			'workers': workers}
+		self.restart = restart
+		self.processes = processes
+		self.callback = callback
+		#Osmpoi of every place with a fetch or buildings stage to run, they share one download
+		self._osmpois = {}
+
+	def directory(self, place):
+		""" The directory of the results of a place """
+		return os.path.join(self.output, _slug(place.name))
+
+	def checkpoint(self, place, stage):
+		""" The checkpoint file of a stage of a place """
+		return os.path.join(self.directory(place), 'checkpoints', stage + '.json')
+
+	def run(self):
+		"""
+		Run the stages of all the places.
+
+		Returns:
+			dict: The status of every (place name, stage): 'done', 'resumed' (checkpointed by an earlier run), 'failed' or 'blocked' (a stage
+				it depends on failed).
+		"""
+		status = {}
+		for place in self.places:
+			os.makedirs(os.path.dirname(self.checkpoint(place, 'fetch')), exist_ok=True)
+			for stage in self.stages:
+				if not self.restart and os.path.exists(self.checkpoint(place, stage)):
+					self.__set(status, place, stage, 'resumed')
+		network = ThreadPoolExecutor(self.network_workers)
+		#Spawned rather than forked, as the process already runs the network threads
+		cpu = ProcessPoolExecutor(self.cpu_workers, mp_context=multiprocessing.get_context('spawn')) if self.processes else ThreadPoolExecutor(self.cpu_workers)
+		running = {}
+		try:
+			while True:
+				self.__submit(status, running, network, cpu)
+				if not running:
+					break
+				finished, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in finished:
+					place, stage, start = running.pop(future)
+					try:
+						result = future.result()
+					except Exception as e:
+						logger.error("Stage %s of %s failed: %s", stage, place.name, e)
+						self.__set(status, place, stage, 'failed')
+					else:
+						self.__save_checkpoint(place, stage, result, time.time() - start)
+						self.__set(status, place, stage, 'done')
+					self.__release(place, status)
+		finally:
+			network.shutdown(cancel_futures=True)
+			cpu.shutdown(cancel_futures=True)
+		return {(place.name, stage): status[place.name, stage] for place in self.places for stage in self.stages}
+
+	def __submit(self, status, running, network, cpu):
+		"""
+		Hand the stages whose dependencies are done to the pools, the earliest places first, while they have idle workers.
+		"""
+		busy = {'network': 0, 'cpu': 0}
+		for place, stage, _ in running.values():
+			busy['network' if stage in NETWORK_STAGES else 'cpu'] += 1
+		for place in self.places:
+			for stage in self.stages:
+				if (place.name, stage) in status or any(item[:2] == (place, stage) for item in running.values()):
+					continue
+				depends = DEPENDS[stage] if stage != 'sample' else (self.options['sample_on'],)
+				depends = [status.get((place.name, other)) for other in depends if other in self.stages]
+				if any(state in ('failed', 'blocked') for state in depends):
+					self.__set(status, place, stage, 'blocked')
+					continue
+				if not all(state in ('done', 'resumed') for state in depends):
+					continue
+				kind = 'network' if stage in NETWORK_STAGES else 'cpu'
+				if busy[kind] >= (self.network_workers if kind == 'network' else self.cpu_workers):
+					continue
+				if kind == 'network':
+					future = network.submit(_network_stage, self.__osmpoi(place, stage), stage, self.options)
+				else:
+					future = cpu.submit(_cpu_stage, place, stage, self.directory(place), self.options)
+				running[future] = (place, stage, time.time())
+				busy[kind] += 1
+
+	def __osmpoi(self, place, stage):
+		"""
+		The Osmpoi of a network stage. The fetch and buildings stages of a place share one, so the buildings come from the download of the POIs.
+		"""
+		from spatialzosm.spatialize import Osmpoi
+		if stage == 'streets':
+			osmpoi = Osmpoi(place.query or place.name, cache=self.cache, downloader=self.downloader)
+		else:
+			if place.name not in self._osmpois:
+				self._osmpois[place.name] = Osmpoi(place.query or place.name, cache=self.cache, downloader=self.downloader)
+			osmpoi = self._osmpois[place.name]
+		osmpoi.file_export = os.path.join(self.directory(place), 'POIs')
+		return osmpoi
+
+	def __release(self, place, status):
+		""" Drop the shared download of a place once its fetch and buildings stages are over """
+		if all((place.name, stage) in status for stage in ('fetch', 'buildings') if stage in self.stages):
+			self._osmpois.pop(place.name, None)
+
+	def __save_checkpoint(self, place, stage, result, seconds):
+		path = self.checkpoint(place, stage)
+		partial = path + '.partial'
+		with open(partial, 'w') as file:
+			json.dump(dict(result, place=place.name, stage=stage, seconds=seconds, finished=time.time()), file, indent=1, default=str)
+		os.replace(partial, path)
+
+	def __set(self, status, place, stage, state):
+		status[place.name, stage] = state
+		if self.callback is not None:
+			self.callback(place.name, stage, state)
+		elif state != 'failed':  #failures are logged with their error
+			logger.info('Stage %s of %s %s', stage, place.name, state)
+
+def main(argv=None):
+	"""
+	Command line entry point of the batch runner, it exits with status 1 if any stage failed or was blocked.
+	"""
+	parser = argparse.ArgumentParser(prog='spatialzosm', description='Run the spatialzosm pipeline for many places, resuming interrupted runs.')
+	parser.add_argument('places', help='text file with one place per line, or CSV file with place, zones, population and zone_column columns')
+	parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+	parser.add_argument('--output', default='batch', help='directory of the results, with a subdirectory per place')
+	parser.add_argument('--network-workers', type=int, default=2, help='fetch, streets and buildings stages run at a time')
+	parser.add_argument('--cpu-workers', type=int, default=1, help='filter and sample stages run at a time')
+	parser.add_argument('--cache', help='directory of the cache of the OSM downloads')
+	parser.add_argument('--extract', help='local .osm or .osm.pbf extract used instead of Overpass')
+	parser.add_argument('--format', choices=('csv', 'gpkg', 'parquet', 'feather'), help='file format of the results, parquet if pyarrow is installed, else csv')
+	parser.add_argument('--sample-on', choices=('buildings', 'streets'), default='buildings')
+	parser.add_argument('--weights', help="'capacity' or a column of weights for the sample stage")
+	parser.add_argument('--seed', type=int)
+	parser.add_argument('--chunk-size', type=int, help='raw POIs filtered and houses sampled at a time, it bounds the memory used')
+	parser.add_argument('--workers', type=int, default=1, help='processes sampling the zones of a place in the sample stage')
+	parser.add_argument('--zones', help='zone units used for the places without their own')
+	parser.add_argument('--population', help='population CSV used for the places without their own')
+	parser.add_argument('--zone-column', help='column of the zone ids')
+	parser.add_argument('--restart', action='store_true', help='run again the stages already checkpointed')
+	parser.add_argument('--quiet', action='store_true', help='only log errors')
+	args = parser.parse_args(argv)
+
+	logging.basicConfig(level=logging.ERROR if args.quiet else logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+	places = [place._replace(zones=place.zones or args.zones, population=place.population or args.population,
+		zone_column=place.zone_column or args.zone_column) for place in read_places(args.places)]
+	try:
+		runner = BatchRunner(places, stages=args.stages, output=args.output, network_workers=args.network_workers, cpu_workers=args.cpu_workers,
+			cache=args.cache, downloader=args.extract, format=args.format, sample_on=args.sample_on, weights=args.weights, seed=args.seed,
+			chunk_size=args.chunk_size, workers=args.workers, restart=args.restart)
+	except ValueError as e:
+		parser.error(str(e))
+	status = runner.run()
+	failed = [key for key, state in status.items() if state in ('failed', 'blocked')]
+	for name, stage in failed:
+		print(f"{name}: {stage} {status[name, stage]}")
+	print(f"{len(status) - len(failed)} of {len(status)} stages done, results in {args.output}")
+	return 1 if failed else 0
@@ -0,0 +1,645 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+from spatialzosm.utils._allocate import allocate
+from spatialzosm.utils._capacity import building_capacity, street_capacity
+from spatialzosm.utils._instrument import Instrumentation, logger
+from spatialzosm.utils._streets import STREET_SHARES, STREET_TYPES, street_class
+
+""" module: sampling of houses from pre-downloaded data, it does not need osmnx """
+
+def _existing_columns(file_path, columns):
+	"""
+	The columns present in a Parquet or Feather file, out of the requested ones.
+	"""
+	import pyarrow.dataset as ds
+	extension = os.path.splitext(file_path)[1].lower()
+	names = ds.dataset(file_path, format=extension[1:]).schema.names
+	return [column for column in dict.fromkeys(columns) if column in names]
+
+class HouseSampler:
+	"""
+	Sampling of the coordinates of houses on streets, buildings or zone units read from files or GeoDataFrames.
+
+	It does not import osmnx (nor geopandas until it is used), so batch workers that only sample pre-downloaded data start fast.
+	Osmpoi extends it with the methods fetching the data from OSM.
+	"""
+	triangulation_cache=4 #Number of polygon triangulations (and zone indexes) kept for reuse across scenarios
+
+	def __init__(self, callback=None, progress=None):
+		"""
+		Args:
+			callback (callable, optional): Called with the record (a dict with the wall time, rows in and out, peak memory and cache use) of every finished stage.
+				Defaults to None (the records are logged to the 'spatialzosm' logger).
+			progress (callable, optional): Called as progress(stage, done, total) while the houses are sampled. Defaults to None.
+		"""
+		#Per-stage records of the run, see run_report
+		self.instrumentation = Instrumentation(callback, progress)
+		self._triangulations = {}
+		self._zone_indexes = {}
+
+	def create_houses_streets(self,streets,pop_size=10, index_col=None,road_column=None, crs='EPSG:4326', seed=None, workers=1,
+			save_file=True, format='csv', output=None, chunk_size=1000000, zones=None, clip=False, weights=None, incremental=False):
+		"""
+		Create coordinates of houses based on street network data.
+
+		Parameters:
+			streets (str or geopandas.GeoDataFrame): The input data representing street network. It can be a path to a CSV, GPKG, Parquet or Feather file, a geopandas.GeoDataFrame object, or a MultiDigraph containing the line geometries of the streets.
+			pop_size (int): The population size used for generating random points on streets. Default is 10.
+			crs (str): The coordinate reference system (CRS) to use. Default is 'EPSG:4326'.
+			index_col (str): The name of the index column in the population size data. Default is None.
+			seed (int, optional): Seed of the random streams, the same seed gives the same houses for any number of workers. Default is None.
+			workers (int, optional): Number of processes sampling the zones in parallel. Default is 1.
+			save_file (bool, optional): Whether to stream the houses to a file instead of returning them. Default is True.
+			format (str, optional): The file format, 'csv' or 'parquet'. Default is 'csv'.
+			output (str, optional): The file path. Default is None (sampled_houses_streets.csv or .parquet).
+			chunk_size (int, optional): Number of houses sampled and written at a time, it bounds the memory used. Default is 1000000.
+			zones (str or geopandas.GeoDataFrame, optional): The polygons of the zone units. If given, every street is assigned to the zone containing its midpoint
+				and index_col is filled with the zone ids (the index_col column of zones, or its index). Default is None (streets already have index_col).
+			clip (bool, optional): Whether to split the streets at the zone borders instead, the pieces are weighted by their share of the street length. Default is False.
+			weights (str, optional): How the houses of a zone and street type are spread over the streets. None spreads them evenly, 'capacity' in proportion
+				to the street length (the length column if present, else the length of the geometry) and any other value is the name of a column of precomputed weights.
+				Default is None.
+			incremental (bool, optional): Whether to resample only the zones whose population, streets or settings changed since the last incremental run writing
+				output. The fingerprint of every zone is stored next to output (output + '.zones.json') and the houses of the other zones are kept from the
+				previous output, which has an index_col column with the zone of every house. The houses of a zone only depend on its fingerprint, not on the
+				other zones. Requires save_file. Default is False.
+
+		Returns:
+			The path of the file with the coordinates of the generated houses, or a DataFrame with the coordinates if save_file is False.
+
+		Raises:
+			None
+		"""
+		if incremental and not save_file:
+			raise ValueError("Incremental resampling splices the houses into the output file, it requires save_file=True.")
+		if index_col is None:
+			index_col= pop_size.index.name
+		if road_column is None:
+			road_column='highway'
+		import geopandas as gpd
+		#Reading based on type of file
+		if isinstance(streets, str): #reading file from disk	
+			with self.instrumentation.stage('read') as record:
+				gdf = self.__read_geodata(streets, columns=[index_col, road_column, 'geometry', 'length' if weights == 'capacity' else weights])
+				record['rows_out'] = len(gdf)
+		elif isinstance(streets, gpd.GeoDataFrame): #reading a Geopandas obejct
+			gdf=streets
+		else:  #reading MultiDigraph directly
+			import osmnx as ox
+			gdf = ox.convert.graph_to_gdfs(streets,nodes=False,edges=True,node_geometry=True)		
+		
+		#Cleaning of type of street clumn	
+		gdf.reset_index(inplace=True)
+		if zones is not None:
+			gdf = self.__assign_zones(gdf, zones, index_col, clip=clip)
+		
+		with self.instrumentation.stage('street_classes', rows_in=len(gdf)) as record:
+			gdf['highway'] = street_class(gdf[road_column], STREET_TYPES)
+			gdf = gdf[gdf['highway'].notna()]
+			gdf.sort_values([index_col,'highway'],inplace=True)
+			record['rows_out'] = len(gdf)
+		pop_size.sort_index(inplace=True)
+		pop_size=pop_size.fillna(0).astype(int)
+		output = output or 'sampled_houses_streets.'+format
+		if incremental:
+			allocate_zone, arrays = self.__zone_allocation(gdf, 'streets', weights, zones is not None and clip)
+			return self.__resample_zones(gdf, index_col, pop_size, seed, output, format, 'streets', allocate_zone, *arrays,
+				crs=crs, workers=workers, chunk_size=chunk_size)
+		allocation_seed, sampling_seed = np.random.SeedSequence(seed).spawn(2)
+		generator = np.random.default_rng(allocation_seed)
+		with self.instrumentation.stage('allocation', rows_in=len(gdf)) as record:
+			#Random generation of points based on the types of street that sum the total of points needed 
+			logger.info('Calculating random number of points per street type...')
+			num_per_type = generator.multinomial(pop_size, STREET_SHARES)
+			logger.info('Calculating number of points per street...')
+			#Each (zone, street type) pair is a group, streets of zones without population get no group
+			zone_code = pop_size.index.get_indexer(gdf[index_col])
+			group_code = np.where(zone_code >= 0, zone_code * len(STREET_TYPES) + gdf['highway'].cat.codes.to_numpy(), -1)
+			capacity = self.__street_weights(gdf, weights, zones is not None and clip)
+			df_points_per_street = allocate(group_code, num_per_type.ravel(), weights=capacity, rng=generator)
+			record['rows_out'] = int(df_points_per_street.sum())
+		#Sampling points using Geopandas
+		logger.info('Sampling points on streets...')
+		chunks = self.__spatial_distribution(gdf,size=df_points_per_street,method='uniform',rng=sampling_seed,crs=crs,zones=gdf[index_col],
+			workers=workers,chunk_size=chunk_size)
+		return self.__save_houses(chunks, save_file, format, output, total=record['rows_out'])
+
+	def create_houses_buildings(self,buildings,pop_size=10,index_column=None,building_column=None, crs='EPSG:4326', method='uniform', seed=None, workers=1,
+			save_file=True, format='csv', output=None, chunk_size=1000000, zones=None, weights=None, incremental=False):
+		"""
+			Creates coordinates of houses based on building data.
+
+			Parameters:
+			- buildings: str or GeoDataFrame or MultiDigraph
+				- If str, it represents the path to a CSV, GPKG, Parquet or Feather file containing building data.
+				- If GeoDataFrame, it represents a GeoPandas object containing building data.
+				- If MultiDigraph, it represents a networkx MultiDigraph object containing building data.
+			- index_column: str
+				- The name of the column in the building data that represents the index.
+			- building_column: str, optional
+				- The name of the column in the building data that represents the building type. Default is None.
+			- pop_size: int, optional
+				- The population size. Default is 10.
+			- crs: str, optional
+				- The coordinate reference system. Default is 'EPSG:4326'.
+			- method: str, optional
+				- The method used for sampling points within the buildings, 'uniform' or 'triangulated'. Default is 'uniform'.
+			- seed: int, optional
+				- Seed of the random streams, the same seed gives the same houses for any number of workers. Default is None.
+			- workers: int, optional
+				- Number of processes sampling the zones in parallel. Default is 1.
+			- save_file: bool, optional
+				- Whether to stream the houses to a file instead of returning them. Default is True.
+			- format: str, optional
+				- The file format, 'csv' or 'parquet'. Default is 'csv'.
+			- output: str, optional
+				- The file path. Default is None (sampled_houses_buildings.csv or .parquet).
+			- chunk_size: int, optional
+				- Number of houses sampled and written at a time, it bounds the memory used. Default is 1000000.
+			- zones: str or GeoDataFrame, optional
+				- The polygons of the zone units. If given, every building is assigned to the zone containing its centroid and index_column
+				  is filled with the zone ids (the index_column column of zones, or its index). Default is None (buildings already have index_column).
+			- weights: str, optional
+				- How the houses of a zone are spread over the buildings. None spreads them evenly, 'capacity' in proportion to the footprint area times
+				  the number of levels (building:levels column, one level if missing) and any other value is the name of a column of precomputed weights.
+				  Default is None.
+			- incremental: bool, optional
+				- Whether to resample only the zones whose population, buildings or settings changed since the last incremental run writing output. The
+				  fingerprint of every zone is stored next to output (output + '.zones.json') and the houses of the other zones are kept from the previous
+				  output, which has an index_column column with the zone of every house. Requires save_file. Default is False.
+
+			Returns:
+			The path of the file with the coordinates of the generated houses, or a DataFrame with the coordinates if save_file is False.
+	"""
+
+		if incremental and not save_file:
+			raise ValueError("Incremental resampling splices the houses into the output file, it requires save_file=True.")
+		if index_column is None:			
+			index_column= pop_size.index.name
+		if building_column is None:
+			building_column='building'
+		import geopandas as gpd
+		if type(buildings) == str: #reading file from disk	
+			with self.instrumentation.stage('read') as record:
+				gdf = self.__read_geodata(buildings, columns=[index_column, building_column, 'geometry', 'building:levels' if weights == 'capacity' else weights])
+				record['rows_out'] = len(gdf)
+		elif isinstance(buildings, gpd.GeoDataFrame): #reading a Geopandas object
+			gdf=buildings
+		else:  #reading MultiDigraph directly
+			import osmnx as ox
+			gdf = ox.convert.graph_to_gdfs(buildings,nodes=False,edges=True,node_geometry=True)
+		gdf.reset_index(inplace=True)
+		if zones is not None:
+			gdf = self.__assign_zones(gdf, zones, index_column)
+		gdf[building_column]=gdf[building_column].astype('category')
+		building_type = gdf[building_column].unique()
+		gdf[building_column]=gdf[building_column].cat.remove_unused_categories() 
+			
+		pop_size = pop_size.loc[gdf[index_column].unique()]
+		pop_size.sort_index(inplace=True)
+		pop_size = pop_size.fillna(0).astype(int)
+		gdf.sort_values([index_column,building_column],inplace=True)
+		output = output or 'sampled_houses_buildings.'+format
+		if incremental:
+			allocate_zone, arrays = self.__zone_allocation(gdf, 'buildings', weights)
+			return self.__resample_zones(gdf, index_column, pop_size, seed, output, format, 'buildings', allocate_zone, *arrays,
+				method=method, crs=crs, workers=workers, chunk_size=chunk_size)
+		allocation_seed, sampling_seed = np.random.SeedSequence(seed).spawn(2)
+		generator = np.random.default_rng(allocation_seed)
+		logger.info('Calculating number of points per building...')
+		with self.instrumentation.stage('allocation', rows_in=len(gdf)) as record:
+			zone_code = pop_size.index.get_indexer(gdf[index_column])
+			df_points_buildings = allocate(zone_code, pop_size.to_numpy(), weights=self.__building_weights(gdf, weights), rng=generator)
+			record['rows_out'] = int(df_points_buildings.sum())
+		logger.info('Sampling points on buildings...')
+		chunks = self.__spatial_distribution(gdf,size=df_points_buildings,method=method,rng=sampling_seed,crs=crs,zones=gdf[index_column],
+			workers=workers,chunk_size=chunk_size)
+		return self.__save_houses(chunks, save_file, format, output, total=record['rows_out'])
+
+	def create_houses_areas(self,zus, method='uniform',pop_size=10, crs='EPSG:4326', seed=None, workers=1,
+			save_file=True, format='csv', output=None, chunk_size=1000000):
+			"""
+			Creates houses areas by sampling points on a given ZU (zone unit) dataset.
+
+			Parameters:
+			- zus (str or GeoDataFrame): The ZUs dataset to sample points from. It can be either a file path to a shapefile or a GeoDataFrame object.
+			- crs (str, optional): The coordinate reference system of the ZUs dataset. Defaults to 'EPSG:4326'.
+			- method (str, optional): The method used for sampling points, 'uniform', 'normal' or 'triangulated'. Defaults to 'uniform'.
+			- pop_size (int, optional): The number of points to sample. Defaults to 10.
+			- seed (int, optional): Seed of the random streams, the same seed gives the same houses for any number of workers. Defaults to None.
+			- workers (int, optional): Number of processes sampling the zones in parallel. Defaults to 1.
+			- save_file (bool, optional): Whether to stream the houses to a file instead of returning them. Defaults to True.
+			- format (str, optional): The file format, 'csv' or 'parquet'. Defaults to 'csv'.
+			- output (str, optional): The file path. Defaults to None (sampled_houses_area_<method>.csv or .parquet).
+			- chunk_size (int, optional): Number of houses sampled and written at a time, it bounds the memory used. Defaults to 1000000.
+
+			Returns:
+			The path of the file with the coordinates of the generated houses, or a DataFrame with the coordinates if save_file is False.
+
+			"""
+			
+			import geopandas as gpd
+			if isinstance(zus, str):
+				with self.instrumentation.stage('read') as record:
+					gdf = self.__read_geodata(zus, columns=['geometry'])
+					record['rows_out'] = len(gdf)
+			elif isinstance(zus, gpd.GeoDataFrame): #reading a Geopandas obejct
+				gdf=zus
+			else:  #reading MultiDigraph directly
+				import osmnx as ox
+				gdf = ox.convert.graph_to_gdfs(zus,nodes=False,edges=True,node_geometry=True)	
+			#Sampling points on TAZ with distribution 
+			logger.info('Sampling points on areas...')		
+			chunks = self.__spatial_distribution(gdf,size=pop_size,method=method,rng=seed,crs=crs,workers=workers,chunk_size=chunk_size)
+			total = int(np.nan_to_num(np.asarray(pop_size, dtype=float)).astype(np.int64).sum()) if type(pop_size) is not int else pop_size * len(gdf)
+			return self.__save_houses(chunks, save_file, format, output or 'sampled_houses_area_'+method+'.'+format, total=total)
+				
+	def iter_houses(self, features, pop_size, zone_column=None, kind='buildings', type_column=None, method='uniform', seed=None, workers=1,
+			weights=None, batch_size=100000, chunk_size=1000000):
+		"""
+		Sample the houses of features that do not fit in memory, a batch of whole zones at a time, and yield them in blocks.
+
+		Parameters:
+			features (str or iterable of geopandas.GeoDataFrame): The streets, buildings or zone unit polygons, with a zone_column column. It can be a path
+				to a Parquet or Feather file, to a directory of them (hive partitions such as zone=12/part.parquet are read as columns) or any iterable
+				of GeoDataFrames. Files are read batch_size features at a time, and the features of every zone must be contiguous (e.g. every file holds
+				whole zones, or the file is sorted by zone).
+			pop_size (pandas.Series): The population of every zone, indexed by zone id.
+			zone_column (str): The name of the column of the zone ids. Default is None (the name of the index of pop_size).
+			kind (str): How the population of a zone is spread over its features: 'streets' as in create_houses_streets, 'buildings' as in
+				create_houses_buildings, or 'areas' in proportion to the area of the polygons. Default is 'buildings'.
+			type_column (str): The column of the street or building types. Default is None ('highway' for streets, 'building' for buildings).
+			method (str): The sampling method, 'uniform', 'normal' or 'triangulated'. Default is 'uniform'.
+			seed (int, optional): Seed of the random streams. The houses of a zone only depend on the seed, the zone id and its features in the order of
+				their rows, so they do not change with the order of the zones, the partitioning of the features, batch_size or workers as long as the rows
+				of every zone keep their order. Default is None.
+			workers (int, optional): Number of processes sampling the zones of a batch in parallel. Default is 1.
+			weights (str, optional): How the houses of a zone are spread over its streets or buildings, see create_houses_streets and create_houses_buildings.
+				Default is None.
+			batch_size (int, optional): Number of features read at a time. With the features of the zone being read, it bounds the memory used. Default is 100000.
+			chunk_size (int, optional): Number of houses of every block, the last block of a batch can be smaller. Default is 1000000.
+
+		Yields:
+			pandas.DataFrame: The x and y coordinates of the houses and the zone_column of every house. The blocks can be handed to any writer, for
+				instance spatialzosm.utils._writer.PointWriter.
+
+		Raises:
+			ValueError: If kind is unknown or the features of a zone are not contiguous.
+		"""
+		import geopandas as gpd
+		from spatialzosm.utils._incremental import zone_seeds
+		from spatialzosm.utils._parallel import iter_partitions, partition_bounds
+		from spatialzosm.utils._partitioned import read_batches, zone_frames
+		if kind not in ('streets', 'buildings', 'areas'):
+			raise ValueError(f"Unknown kind of features {kind}, use 'streets', 'buildings' or 'areas'.")
+		if method not in ("uniform", "normal", "triangulated"):
+			raise AttributeError(f"This module has no sampling method {method}.")
+		zone_column = zone_column or pop_size.index.name
+		type_column = type_column or {'streets': 'highway', 'buildings': 'building'}.get(kind)
+		if isinstance(features, str):
+			extra = {'streets': 'length', 'buildings': 'building:levels'}.get(kind) if weights == 'capacity' else weights
+			features = read_batches(features, columns=[column for column in (zone_column, type_column, extra) if column is not None], batch_size=batch_size)
+		pop_size = pop_size.fillna(0).astype(np.int64)
+		total = int(pop_size.sum())
+		seconds = {'read': 0.0, 'allocation': 0.0, 'sampling': 0.0}
+		rows = {'read': 0, 'allocation': 0}
+		done = 0
+		frames = zone_frames(features, zone_column)
+		try:
+			while True:
+				start = time.perf_counter()
+				gdf = next(frames, None)
+				seconds['read'] += time.perf_counter() - start
+				if gdf is None:
+					break
+				rows['read'] += len(gdf)
+				start = time.perf_counter()
+				if not isinstance(gdf, gpd.GeoDataFrame):
+					gdf = gpd.GeoDataFrame(gdf, geometry='geometry')
+				if kind == 'streets':
+					gdf['highway'] = street_class(gdf[type_column], STREET_TYPES)
+					gdf = gdf[gdf['highway'].notna()].sort_values([zone_column, 'highway'], kind='stable')
+				elif kind == 'buildings' and type_column in gdf.columns:
+					gdf = gdf.sort_values([zone_column, type_column], kind='stable')
+				bounds = partition_bounds(gdf[zone_column]) if len(gdf) else np.zeros(1, dtype=np.int64)
+				zone_ids = gdf[zone_column].to_numpy()
+				population = pop_size.reindex(zone_ids[bounds[:-1]]).fillna(0).astype(np.int64).to_numpy()
+				streams = zone_seeds(seed, zone_ids[bounds[:-1]])
+				allocate_zone, _ = self.__zone_allocation(gdf, kind, weights)
+				size = self.__allocate_zones(len(gdf), bounds, range(len(bounds) - 1), population, streams, allocate_zone)
+				rows['allocation'] += int(size.sum())
+				geoms = np.asarray(gdf.geometry.values)
+				if method == 'triangulated':
+					from spatialzosm.utils._randist import Triangulation
+					triangulation = Triangulation(geoms)
+				else:
+					triangulation = None
+				seconds['allocation'] += time.perf_counter() - start
+				blocks = iter_partitions(geoms, size, bounds, method=method, seed=[stream[1] for stream in streams], workers=workers,
+					triangulation=triangulation, chunk_size=chunk_size)
+				while True:
+					start = time.perf_counter()
+					block = next(blocks, None)
+					seconds['sampling'] += time.perf_counter() - start
+					if block is None:
+						break
+					x, y, index = block
+					done += len(x)
+					self.instrumentation.advance('sampling', done, total)
+					yield pd.DataFrame({'x': x, 'y': y, zone_column: zone_ids[index]})
+		finally:
+			#Recorded even if the consumer stops early
+			self.instrumentation.record('read', seconds['read'], rows_out=rows['read'], batch_size=batch_size)
+			self.instrumentation.record('allocation', seconds['allocation'], rows_in=rows['read'], rows_out=rows['allocation'])
+			self.instrumentation.record('sampling', seconds['sampling'], rows_in=total, rows_out=done)
+
+	def __spatial_distribution(self,gdf, size=10, method="uniform", rng=None,crs='EPSG:4326', zones=None, workers=1, chunk_size=None, zone_column=None, **kwargs):
+			"""
+			Apply spatial distribution to a GeoDataFrame.
+
+			Parameters:
+			-----------
+			gdf : GeoDataFrame
+				The GeoDataFrame to apply spatial distribution to.
+			size : int or array-like, optional
+				The size of the spatial distribution. If int, it represents the number of points to sample uniformly or normally. If array-like, it represents the size of each point to sample normally. Default is 10.
+			method : str, optional
+				The method of spatial distribution. Possible values are "uniform", "normal" and "triangulated". Default is "uniform".
+			rng : int, numpy.random.SeedSequence, list or None, optional
+				The seed from which a random stream is spawned for every zone, or a list with the stream of every zone. If None, fresh entropy is used. Default is None.
+			crs : str, optional
+				The coordinate reference system (CRS) of the resulting GeoSeries. Default is 'EPSG:4326'.
+			zones : array-like, optional
+				The zone of every feature, gdf must be sorted by zone. If None, every feature is its own zone. Default is None.
+			workers : int, optional
+				The number of processes sampling the zones in parallel. Default is 1.
+			chunk_size : int, optional
+				The minimum number of points of every yielded block, whole zones are yielded together. If None, every zone is yielded on its own. Default is None.
+			zone_column : str, optional
+				If given, the zone of every point is added to the blocks as this column. Default is None.
+			**kwargs : dict, optional
+				Additional keyword arguments to pass to the sampling method.
+
+			Yields:
+			-------
+			DataFrame
+				Blocks of x and y coordinates of the sampled points, indexed by the label of the feature they were sampled in.
+
+			Raises:
+			-------
+			AttributeError
+				If the specified method is not supported.
+
+			"""
+			
+			from spatialzosm.utils._parallel import iter_partitions, partition_bounds
+			if method not in ("uniform", "normal", "triangulated"):
+				raise AttributeError(
+				f"This module has no sampling method {method}."
+				)
+			if type(size) is not int:
+				size = np.nan_to_num(np.asarray(size, dtype=float)).astype(np.int64)
+
+			bounds = np.arange(len(gdf) + 1) if zones is None else partition_bounds(zones)
+			zone_ids = np.asarray(zones) if zone_column is not None else None
+			triangulation = self.__triangulation(gdf) if method == "triangulated" else None
+			for x, y, index in iter_partitions(np.asarray(gdf.geometry.values), size, bounds, method=method, seed=rng,
+					workers=workers, triangulation=triangulation, chunk_size=chunk_size):
+				block = pd.DataFrame({'x': x, 'y': y}, index=gdf.index[index])
+				if zone_column is not None:
+					block[zone_column] = zone_ids[index]
+				yield block
+
+	def __save_houses(self, chunks, save_file, format, output, total=None, previous=None, columns=('x', 'y')):
+		"""
+		Stream the blocks of sampled houses to the output file, or gather them in a DataFrame if save_file is False.
+		The time spent sampling the blocks and writing them is recorded as the sampling and write stages.
+		The blocks of previous (houses kept from an earlier output) are written first, to a new file that replaces output once it is complete.
+		"""
+		from spatialzosm.utils._writer import PointWriter
+		seconds = {'sampling': 0.0, 'write': 0.0}
+		frames = []
+		done = 0
+		chunks = iter(chunks)
+		writer = PointWriter(output if previous is None else output + '.partial', format) if save_file else None
+		try:
+			start = time.perf_counter()
+			for chunk in previous or ():
+				if isinstance(chunk, tuple):
+					writer.write_lines(*chunk)
+				else:
+					writer.write(chunk)
+			kept = writer.rows if writer is not None else 0
+			seconds['write'] += time.perf_counter() - start
+			while True:
+				start = time.perf_counter()
+				chunk = next(chunks, None)
+				seconds['sampling'] += time.perf_counter() - start
+				if chunk is None:
+					break
+				start = time.perf_counter()
+				if writer is None:
+					frames.append(chunk)
+				else:
+					writer.write(chunk)
+				seconds['write'] += time.perf_counter() - start
+				done += len(chunk)
+				self.instrumentation.advance('sampling', done, total)
+		finally:
+			if writer is not None:
+				start = time.perf_counter()
+				writer.close(columns)
+				seconds['write'] += time.perf_counter() - start
+		self.instrumentation.record('sampling', seconds['sampling'], rows_in=total, rows_out=done)
+		if writer is None:
+			logger.info("Sampling completed. Coordinates not saved to disk")
+			return pd.concat(frames) if frames else pd.DataFrame({'x': [], 'y': []})
+		if previous is not None:
+			os.replace(writer.path, output)
+		self.instrumentation.record('write', seconds['write'], rows_in=done, rows_out=writer.rows, file=output,
+			**({} if previous is None else {'kept': kept}))
+		logger.info("Sampling completed. %s coordinates saved to disk as %s", writer.rows, output)
+		return output
+
+	def __resample_zones(self, gdf, zone_column, pop_size, seed, output, format, kind, allocate_zone, *arrays, method='uniform', crs='EPSG:4326',
+			workers=1, chunk_size=None):
+		"""
+		Resample the zones of gdf (sorted by zone_column) whose fingerprint changed since the last run writing output and splice their houses
+		into it. allocate_zone(start, stop, population, generator) returns the houses of the features start to stop of a zone, arrays are the
+		per-feature values they depend on.
+		"""
+		from spatialzosm.utils._incremental import IncrementalOutput, zone_fingerprints, zone_seeds
+		from spatialzosm.utils._parallel import partition_bounds
+		incremental = IncrementalOutput(output, format, zone_column, kind=kind)
+		with self.instrumentation.stage('fingerprints', rows_in=len(gdf)) as record:
+			bounds = partition_bounds(gdf[zone_column]) if len(gdf) else np.zeros(1, dtype=np.int64)
+			ids = gdf[zone_column].to_numpy()[bounds[:-1]]
+			population = pop_size.reindex(ids).fillna(0).astype(np.int64).to_numpy()
+			changed = incremental.plan(ids, zone_fingerprints(gdf.geometry.values, bounds, population, seed, *arrays, method=method))
+			record.update(rows_out=len(changed), zones=len(ids), cache='hit' if incremental.previous else 'miss')
+		if incremental.previous and not len(changed) and not incremental.drop:
+			logger.info('No zone changed since the last run, %s is up to date', output)
+			return output
+		logger.info('Resampling %s of %s zones...', len(changed), len(ids))
+		streams = zone_seeds(seed, ids)
+		with self.instrumentation.stage('allocation', rows_in=int((bounds[changed + 1] - bounds[changed]).sum())) as record:
+			size = self.__allocate_zones(len(gdf), bounds, changed, population, streams, allocate_zone)
+			record['rows_out'] = int(size.sum())
+		chunks = self.__spatial_distribution(gdf, size=size, method=method, rng=[stream[1] for stream in streams], crs=crs, zones=gdf[zone_column],
+			workers=workers, chunk_size=chunk_size, zone_column=zone_column)
+		output = self.__save_houses(chunks, True, format, output, total=record['rows_out'], previous=incremental.kept(chunk_size or 1000000),
+			columns=('x', 'y', zone_column))
+		incremental.commit()
+		return output
+
+	def __zone_allocation(self, gdf, kind, weights, clipped=False):
+		"""
+		Get allocate_zone(start, stop, population, generator), the houses of the features start to stop of one zone of gdf (sorted by zone and
+		type), with the same draws as create_houses_streets, create_houses_buildings or, for areas, in proportion to the area of the polygons.
+		The per-feature arrays the houses depend on are returned with it.
+		"""
+		if kind == 'streets':
+			capacity = self.__street_weights(gdf, weights, clipped)
+			street_type = gdf['highway'].cat.codes.to_numpy()
+			allocate_zone = lambda start, stop, population, generator: allocate(street_type[start:stop], generator.multinomial(population, STREET_SHARES),
+				weights=None if capacity is None else capacity[start:stop], rng=generator)
+			return allocate_zone, (street_type, capacity)
+		capacity = self.__building_weights(gdf, weights) if kind == 'buildings' else shapely.area(np.asarray(gdf.geometry.values))
+		allocate_zone = lambda start, stop, population, generator: allocate(np.zeros(stop - start, dtype=np.int64), [population],
+			weights=None if capacity is None else capacity[start:stop], rng=generator)
+		return allocate_zone, (capacity,)
+
+	def __allocate_zones(self, n, bounds, positions, population, streams, allocate_zone):
+		"""
+		Houses of the n features of the zones at positions, every zone drawing from the allocation stream of its zone_seeds.
+		"""
+		size = np.zeros(n, dtype=np.int64)
+		for position in positions:
+			start, stop = bounds[position], bounds[position + 1]
+			size[start:stop] = allocate_zone(start, stop, population[position], np.random.default_rng(streams[position][0]))
+		return size
+
+	def run_report(self, file_path=None):
+		"""
+		Get the machine-readable report of the stages run so far (wall time, rows in and out, peak memory and cache use of every stage).
+
+		Args:
+			file_path (str, optional): Also save the report as JSON to this file. Defaults to None.
+
+		Returns:
+			dict: The stages in the order they finished, their total time and the peak memory of the run.
+		"""
+		if file_path is not None:
+			self.instrumentation.save(file_path)
+		return self.instrumentation.report()
+
+	def __assign_zones(self, gdf, zones, id_column, clip=False):
+		"""
+		Fill id_column of gdf with the zone of every feature, features outside all the zones are dropped.
+		If clip is set, lines are split at the zone borders and the share of the length of every piece is stored in zone_weight.
+		"""
+		if isinstance(zones, str):
+			zones = self.__read_geodata(zones)
+		if zones.crs is not None and gdf.crs is not None and zones.crs != gdf.crs:
+			zones = zones.to_crs(gdf.crs)
+		index = self.__zone_index(zones, id_column)
+		with self.instrumentation.stage('zone_assignment', rows_in=len(gdf)) as record:
+			geoms = np.asarray(gdf.geometry.values)
+			if clip:
+				import geopandas as gpd
+				feature, zone, pieces, weight = index.clip(geoms)
+				gdf = gdf.iloc[feature].copy()
+				gdf[gdf.geometry.name] = gpd.GeoSeries(pieces, index=gdf.index, crs=gdf.crs)
+				gdf['zone_weight'] = weight
+			else:
+				zone = index.locate(geoms)
+				gdf = gdf[zone >= 0].copy()
+				zone = zone[zone >= 0]
+			gdf[id_column] = index.ids[zone]
+			record['rows_out'] = len(gdf)
+		return gdf
+
+	def __street_weights(self, gdf, weights, clipped):
+		"""
+		Allocation weights of the streets, see create_houses_streets. Clipped pieces get their share of the weight of the street.
+		"""
+		share = gdf['zone_weight'].to_numpy() if clipped else None
+		if weights is None:
+			return share
+		if weights == 'capacity':
+			# Without a CRS the streets are taken to be in longitude and latitude, like OSM data
+			geographic = gdf.crs is None or gdf.crs.is_geographic
+			if 'length' not in gdf.columns:
+				# The length of the clipped geometries is already the length of the pieces
+				return street_capacity(gdf.geometry.values, geographic=geographic)
+			capacity = street_capacity(gdf.geometry.values, gdf['length'], geographic=geographic)
+		else:
+			capacity = pd.to_numeric(gdf[weights], errors='coerce').fillna(0).to_numpy(dtype=float)
+		return capacity if share is None else capacity * share
+
+	def __building_weights(self, gdf, weights):
+		"""
+		Allocation weights of the buildings, see create_houses_buildings.
+		"""
+		if weights is None:
+			return None
+		if weights == 'capacity':
+			return building_capacity(gdf.geometry.values, gdf['building:levels'] if 'building:levels' in gdf.columns else None)
+		return pd.to_numeric(gdf[weights], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+	def __zone_index(self, zones, id_column):
+		"""
+		Get the STRtree index of the zone units, cached by geometry so repeated scenarios reuse it.
+		"""
+		from spatialzosm.utils._zones import ZoneIndex
+		ids = zones[id_column] if id_column in zones.columns else None
+		key = self.__geometry_key(zones) + str(id_column if ids is not None else None)
+		return self.__cached('zone_index', self._zone_indexes, key, lambda: ZoneIndex(zones, ids))
+
+	def __triangulation(self, gdf):
+		"""
+		Get the triangulation of the polygons of gdf, cached by geometry so repeated scenarios reuse it.
+		"""
+		from spatialzosm.utils._randist import Triangulation
+		return self.__cached('triangulation', self._triangulations, self.__geometry_key(gdf), lambda: Triangulation(np.asarray(gdf.geometry.values)))
+
+	def __geometry_key(self, gdf):
+		wkb = shapely.to_wkb(np.asarray(gdf.geometry.values))
+		wkb[pd.isna(wkb)] = b''
+		return hashlib.sha1(b''.join(wkb)).hexdigest()
+
+	def __cached(self, name, cache, key, build):
+		"""
+		Get an entry of one of the geometry caches, built if missing. The oldest entries are dropped beyond triangulation_cache.
+		"""
+		with self.instrumentation.stage(name, cache='hit' if key in cache else 'miss'):
+			if key not in cache:
+				while len(cache) >= max(self.triangulation_cache, 1):
+					cache.pop(next(iter(cache)))
+				cache[key] = build()
+			return cache[key]
+
+	def __read_geodata(self, file_path, columns=None):
+		"""
+		Read a GeoDataFrame from a file. From CSV, Parquet and Feather files only the requested columns present in the file are loaded.
+		CSV files are those saved by Osmpoi, with the geometries as WKT in a geometry column and in EPSG:4326.
+		"""
+		import geopandas as gpd
+		extension = os.path.splitext(file_path)[1].lower()
+		if extension == '.csv':
+			if columns is not None:
+				names = pd.read_csv(file_path, nrows=0).columns
+				columns = [column for column in dict.fromkeys(columns) if column in names]
+			df = pd.read_csv(file_path, usecols=columns)
+			return gpd.GeoDataFrame(df, geometry=gpd.GeoSeries.from_wkt(df.pop('geometry')), crs='EPSG:4326')
+		if extension not in ('.parquet', '.feather'):
+			return gpd.read_file(file_path)
+		if columns is not None:
+			columns = _existing_columns(file_path, columns)
+		reader = gpd.read_parquet if extension == '.parquet' else gpd.read_feather
+		return reader(file_path, columns=columns)
@@ -0,0 +1,72 @@
+import numpy
+
+""" module: vectorized multinomial allocation of points to features """
+
+def allocate(groups, totals, weights=None, rng=None):
+    """
+
+    Spread the points of every group over the features of that group.
+
+    The result follows the same distribution as one multinomial draw per group
+    (with equal probabilities, or probabilities proportional to weights) but all
+    groups are drawn at once: every point draws the offset of a feature within
+    its group and the points are counted per feature with a single bincount.
+
+    Parameters
+    ----------
+    groups : array-like of int
+        group code (0 to len(totals) - 1) of every feature. Negative codes
+        mark features that do not belong to any group and get no points.
+
+    totals : array-like of int
+        number of points to allocate in every group. Points of groups
+        without features are dropped.
+
+    weights : array-like of float, optional
+        relative weight of every feature within its group. Groups whose
+        weights sum to zero are allocated evenly. Default is None (even).
+
+    rng : numpy.random.Generator or seed, optional
+
+    Returns
+    -------
+    numpy.ndarray of int, the number of points of every feature, aligned
+    with groups.
+
+    Examples
+    --------
+    >>> allocate([0, 0, 1], [10, 4]) # doctest: +SKIP
+    array([6, 4, 4])
+    """
+    generator = numpy.random.default_rng(seed=rng)
+    groups = numpy.asarray(groups, dtype=numpy.int64)
+    totals = numpy.asarray(totals, dtype=numpy.int64)
+    n_groups = len(totals)
+    counts = numpy.zeros(len(groups), dtype=numpy.int64)
+    member = groups >= 0
+    if not member.any():
+        return counts
+
+    index = numpy.flatnonzero(member)
+    order = index[numpy.argsort(groups[index], kind='stable')]
+    sorted_groups = groups[order]
+    n_features = numpy.bincount(sorted_groups, minlength=n_groups)
+    starts = numpy.concatenate(([0], numpy.cumsum(n_features)[:-1]))
+    totals = numpy.where(n_features > 0, totals, 0)
+    owner = numpy.repeat(numpy.arange(n_groups), totals)
+
+    if weights is None:
+        position = starts[owner] + generator.integers(n_features[owner])
+    else:
+        weights = numpy.asarray(weights, dtype=float)[order]
+        group_weight = numpy.bincount(sorted_groups, weights=weights, minlength=n_groups)
+        weights = numpy.where(group_weight[sorted_groups] > 0, weights, 1.0)
+        group_weight = numpy.bincount(sorted_groups, weights=weights, minlength=n_groups)
+        cumulative = numpy.cumsum(weights)
+        base = numpy.concatenate(([0.0], cumulative))[starts]
+        target = base[owner] + generator.random(len(owner)) * group_weight[owner]
+        position = numpy.searchsorted(cumulative, target, side='right')
+        position = numpy.clip(position, starts[owner], starts[owner] + n_features[owner] - 1)
+
+    counts[order] = numpy.bincount(position, minlength=len(order))
+    return counts
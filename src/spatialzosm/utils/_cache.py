@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import shapely
+
+""" module: persistent on-disk cache of OSM downloads """
+
+def _jsonable(value):
+    """ Make place names, polygons and tag sets hashable as JSON """
+    if isinstance(value, shapely.Geometry):
+        return shapely.to_wkb(value, hex=True)
+    if isinstance(value, (set, frozenset, tuple)):
+        return sorted(value, key=str) if isinstance(value, (set, frozenset)) else list(value)
+    return str(value)
+
+def _remove(file_path):
+    """ Remove a file that another thread or process may have removed already """
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+class OsmCache:
+    """
+
+    Content-addressed cache of OSM downloads stored as pickle files.
+
+    Every entry is keyed on the SHA1 of the query (place name or polygon,
+    tags, network type and the other arguments) and the version of the
+    downloader, so upgrading osmnx never returns stale results. Entries older
+    than ttl are refetched and, when the cache grows over max_size, the least
+    recently used entries (by access time) are evicted. Several threads and
+    processes can share a cache: entries are written to unique temporary
+    files and renamed, and entries removed by another writer are skipped.
+
+    Parameters
+    ----------
+    path : str
+        the cache directory, it is created if needed.
+
+    max_size : int, optional
+        maximum size of the cache in bytes. Default is None (unbounded).
+
+    ttl : float, optional
+        time to live of the entries in seconds. Default is None (never expire).
+
+    offline : bool, optional
+        never call the downloader, a query missing from the cache raises
+        LookupError. Default is False.
+
+    Examples
+    --------
+    >>> cache = OsmCache('osm_cache', max_size=2**30, ttl=30*24*3600) # doctest: +SKIP
+    >>> dresden = Osmpoi('Dresden, Germany', cache=cache) # doctest: +SKIP
+    """
+
+    def __init__(self, path='osm_cache', max_size=None, ttl=None, offline=False):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.offline = offline
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(*query, **arguments):
+        """ SHA1 of a query, arguments are sorted so their order does not matter """
+        text = json.dumps([query, arguments], sort_keys=True, default=_jsonable)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def __file(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def __fresh(self, file_path):
+        modified = os.path.getmtime(file_path)
+        return self.ttl is None or time.time() - modified <= self.ttl
+
+    def __contains__(self, key):
+        try:
+            return self.__fresh(self.__file(key))
+        except FileNotFoundError:
+            return False
+
+    def get(self, key, fetch):
+        """
+        Return the cached result of key, calling fetch() and storing its result on a miss.
+        """
+        file_path = self.__file(key)
+        if key in self:
+            try:
+                with open(file_path, 'rb') as file:
+                    result = pickle.load(file)
+                # Access times are not updated on noatime mounts, so set it explicitly for the LRU
+                os.utime(file_path, (time.time(), os.path.getmtime(file_path)))
+                return result
+            except FileNotFoundError:
+                # Evicted by another writer since it was checked, it is a miss
+                pass
+        if self.offline:
+            raise LookupError(f"Query {key} is not in the cache {self.path} and the cache is offline.")
+        result = fetch()
+        self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        """ Store a result, written to a temporary file first so a crash never leaves a partial entry """
+        file_path = self.__file(key)
+        # A unique name per writer, threads of the same process may store the same key at once
+        descriptor, temporary = tempfile.mkstemp(prefix=key + '.', suffix='.tmp', dir=self.path)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, file_path)
+        except BaseException:
+            _remove(temporary)
+            raise
+        self.evict(keep=file_path)
+
+    def evict(self, keep=None):
+        """ Remove expired entries and the least recently used ones until the cache fits max_size """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.pkl'):
+                continue
+            file_path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+                _remove(file_path)
+                continue
+            entries.append((stat.st_atime, stat.st_size, file_path))
+        if self.max_size is None:
+            return
+        total = sum(entry[1] for entry in entries)
+        for _, size, file_path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if file_path == keep:
+                continue
+            _remove(file_path)
+            total -= size
+
+    def clear(self):
+        """ Remove all the entries """
+        for name in os.listdir(self.path):
+            if name.endswith('.pkl'):
+                _remove(os.path.join(self.path, name))
@@ -0,0 +1,79 @@
+import numpy
+import pandas as pd
+import shapely
+
+from spatialzosm.utils._geo import line_lengths
+
+""" module: vectorized capacity weights of buildings and streets """
+
+def _numbers(values):
+    """
+    Parse OSM numeric tags (e.g. building:levels '3', '2.5' or '3;4') to floats,
+    NaN if they cannot be parsed. Every distinct value is parsed once.
+    """
+    codes, uniques = pd.factorize(pd.Series(values))
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object).astype(str).str.split(';').str[0].str.strip(), errors='coerce')
+    # The extra slot at the end is hit by the NA code -1
+    return numpy.append(parsed.to_numpy(dtype=float), numpy.nan)[codes]
+
+def building_capacity(geoms, levels=None):
+    """
+
+    Capacity of buildings as their footprint area times their number of levels.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the footprints of the buildings. Only the relative capacity of the
+        buildings of a zone is used, so the area can be in the units of any
+        CRS, including degrees.
+
+    levels : array-like, optional
+        the number of levels (building:levels tag) of every building. Missing
+        or unparsable values count as one level. Default is None (one level).
+
+    Returns
+    -------
+    numpy.ndarray of float, the capacity of every building.
+    """
+    area = shapely.area(numpy.asarray(geoms))
+    if levels is None:
+        return area
+    levels = _numbers(levels)
+    return area * numpy.where(levels > 0, levels, 1.0)
+
+def street_capacity(geoms, length=None, geographic=True):
+    """
+
+    Capacity of streets as their length.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the lines of the streets.
+
+    length : array-like, optional
+        the length of every street (e.g. the length column of osmnx, in
+        meters). Missing or unparsable values are replaced by the length of
+        the geometry. Default is None (length of the geometries).
+
+    geographic : bool, optional
+        whether the geometries are in longitude and latitude, their length is
+        then measured in meters like the osmnx lengths. Otherwise it is in the
+        units of their projected CRS. Default is True.
+
+    Returns
+    -------
+    numpy.ndarray of float, the capacity of every street.
+    """
+    geoms = numpy.asarray(geoms)
+    if length is not None:
+        length = _numbers(length)
+        missing = ~numpy.isfinite(length)
+        if not missing.any():
+            return length
+    measure = line_lengths if geographic else shapely.length
+    if length is None:
+        return measure(geoms)
+    length[missing] = measure(geoms[missing])
+    return length
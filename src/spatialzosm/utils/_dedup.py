@@ -0,0 +1,149 @@
+import numpy
+import pandas as pd
+import shapely
+
+from spatialzosm.utils._geo import project
+
+""" module: spatial deduplication of the POIs mapped both as nodes and as polygons """
+
+POLYGON_TYPES = (shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON)
+
+def as_geometries(values):
+    """
+    Shapely geometries of values, which may already be geometries or be WKB (Parquet, Feather) or WKT (CSV).
+    Missing and unreadable values are None.
+    """
+    values = numpy.asarray(values, dtype=object)
+    geometries = numpy.full(len(values), None, dtype=object)
+    present = ~pd.isna(values)
+    for kind, parse in ((shapely.Geometry, None), (bytes, shapely.from_wkb), (str, shapely.from_wkt)):
+        mask = present & numpy.fromiter((isinstance(value, kind) for value in values), dtype=bool, count=len(values))
+        if mask.any():
+            geometries[mask] = values[mask] if parse is None else parse(values[mask], on_invalid='ignore')
+    return geometries
+
+def _close_pairs(X, Y, distance):
+    """
+    Pairs (i, j), i < j, of the points closer than distance, found on a hashed grid of cells of that size: the points of
+    every cell are only compared with those of the same cell and of the 4 following neighbour cells.
+    """
+    if len(X) == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    cx = numpy.floor(X / distance).astype(numpy.int64)
+    cy = numpy.floor(Y / distance).astype(numpy.int64)
+    cx -= cx.min()
+    cy -= cy.min()
+    # One unused row between columns, so that the keys of the neighbours of a column do not wrap into the next one
+    height = cy.max() + 2
+    keys = cx * height + cy
+    order = numpy.argsort(keys, kind='stable')
+    cells, starts, counts = numpy.unique(keys[order], return_index=True, return_counts=True)
+    left, right = [], []
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        neighbours = cells + dx * height + dy
+        target = numpy.minimum(numpy.searchsorted(cells, neighbours), len(cells) - 1)
+        source = numpy.flatnonzero(cells[target] == neighbours)
+        target = target[source]
+        if dx == dy == 0:
+            source = target = source[counts[source] > 1]
+        sizes = counts[source] * counts[target]
+        # The k-th pair of points of the cells (source, target) is (k // size of target, k % size of target)
+        block = numpy.repeat(numpy.arange(len(source)), sizes)
+        k = numpy.arange(len(block)) - numpy.repeat(numpy.cumsum(sizes) - sizes, sizes)
+        i = starts[source][block] + k // counts[target][block]
+        j = starts[target][block] + k % counts[target][block]
+        if dx == dy == 0:
+            i, j = i[i < j], j[i < j]
+        left.append(order[i])
+        right.append(order[j])
+    left, right = numpy.concatenate(left), numpy.concatenate(right)
+    close = numpy.hypot(X[left] - X[right], Y[left] - Y[right]) <= distance
+    left, right = left[close], right[close]
+    return numpy.minimum(left, right), numpy.maximum(left, right)
+
+def duplicates(x, y, group, amenity, rank, generic, geometry=None, building=None, distance=2.0):
+    """
+
+    Mask of the POIs that duplicate a more specific POI.
+
+    Two POIs of the same group are candidate duplicates when they have the
+    same amenity or one of them only has the generic amenity of a building,
+    land use or address, and either their points are closer than distance or
+    one is a node inside the building polygon of the other. A building
+    polygon is only a duplicate of a node inside it when that node is its
+    single candidate, so a building with several shops keeps all of them.
+    Polygons that are not buildings (land use, campuses, parks) are areas
+    around other features and are never duplicates. Of every pair, the POI
+    with the highest rank is dropped, then the polygon, then the last row.
+    Close points are found on a hashed grid and the nodes inside buildings
+    with a STRtree query, so the time grows almost linearly with the POIs.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        longitude and latitude of the point of every POI.
+
+    group, amenity : numpy.ndarray
+        the classification of every POI.
+
+    rank : numpy.ndarray of int
+        specificity of the amenity of every POI, lower is more specific (see
+        PoiRuleEngine.classify).
+
+    generic : numpy.ndarray of bool
+        whether the amenity of every POI comes from a building, land use or
+        address tag.
+
+    geometry : numpy.ndarray of shapely geometries, optional
+        the OSM geometry of every POI. Without it only close points are
+        duplicates.
+
+    building : numpy.ndarray of bool, optional
+        whether every POI has a building tag. Default is None (no polygon is
+        a building, so no polygon is a duplicate).
+
+    distance : float, optional
+        distance in metres under which two points are duplicates. Default is 2.
+
+    Returns
+    -------
+    numpy.ndarray of bool, True for the POIs to drop.
+    """
+    n = len(x)
+    if n < 2:
+        return numpy.zeros(n, dtype=bool)
+    x, y = numpy.asarray(x, dtype=float), numpy.asarray(y, dtype=float)
+    located = numpy.flatnonzero(~(numpy.isnan(x) | numpy.isnan(y)))
+    origin = (x[located].mean(), y[located].mean()) if len(located) else (0.0, 0.0)
+    left, right = _close_pairs(*project(x[located], y[located], origin), distance)
+    pairs = [(located[left], located[right])]
+    group, amenity = numpy.asarray(group, dtype=object), numpy.asarray(amenity, dtype=object)
+    same = lambda left, right: (group[left] == group[right]) & ((amenity[left] == amenity[right]) | generic[left] | generic[right])
+    polygon = numpy.zeros(n, dtype=bool)
+    if geometry is not None:
+        polygon = numpy.isin(shapely.get_type_id(geometry), POLYGON_TYPES)
+        building = numpy.zeros(n, dtype=bool) if building is None else numpy.asarray(building, dtype=bool)
+        #Areas that are not buildings are never duplicates, not even of a close point
+        area = polygon & ~building
+        close = ~(area[pairs[0][0]] | area[pairs[0][1]])
+        pairs = [(pairs[0][0][close], pairs[0][1][close])]
+        outer = numpy.flatnonzero(polygon & building)
+        nodes = numpy.flatnonzero(~polygon)
+        if len(outer) and len(nodes):
+            inner, which = shapely.STRtree(geometry[outer]).query(shapely.points(x[nodes], y[nodes]), predicate='within')
+            inner, outer = nodes[inner], outer[which]
+            candidate = same(inner, outer)
+            inner, outer = inner[candidate], outer[candidate]
+            #A building with several candidate nodes inside is a POI of its own (e.g. a mall and its shops)
+            single = numpy.bincount(outer, minlength=n)[outer] == 1
+            pairs.append((inner[single], outer[single]))
+    left = numpy.concatenate([pair[0] for pair in pairs])
+    right = numpy.concatenate([pair[1] for pair in pairs])
+    same_pair = same(left, right)
+    left, right = left[same_pair], right[same_pair]
+    #Position of every POI in the order of preference (rank, point before polygon, row)
+    order = numpy.empty(n, dtype=numpy.int64)
+    order[numpy.lexsort((numpy.arange(n), polygon, rank))] = numpy.arange(n)
+    dropped = numpy.zeros(n, dtype=bool)
+    dropped[numpy.where(order[left] > order[right], left, right)] = True
+    return dropped
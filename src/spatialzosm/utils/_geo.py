@@ -0,0 +1,74 @@
+import numpy
+import shapely
+
+""" module: distances in metres on longitude and latitude coordinates """
+
+#Mean Earth radius in metres
+EARTH_RADIUS = 6371008.8
+#Metres per degree of latitude, and of longitude at the equator, on the sphere of EARTH_RADIUS
+METRES_PER_DEGREE = numpy.radians(EARTH_RADIUS)
+
+def scale(latitude):
+    """ Metres per degree of longitude and of latitude at a latitude """
+    return (float(METRES_PER_DEGREE * numpy.cos(numpy.radians(latitude))), float(METRES_PER_DEGREE))
+
+def project(x, y, origin, factors=None):
+    """
+
+    Equirectangular projection in metres around an origin.
+
+    Distances are exact at the latitude of the origin and off by the
+    relative change of the cosine of the latitude elsewhere, under 0.3% within
+    10 km of it at 60 degrees of latitude.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        longitudes and latitudes.
+
+    origin : tuple of float
+        the longitude and latitude mapped to (0, 0).
+
+    factors : tuple of float, optional
+        the metres per degree of longitude and latitude. Default is None
+        (scale of the latitude of the origin).
+
+    Returns
+    -------
+    X, Y : numpy.ndarray of the coordinates in metres.
+    """
+    factors = scale(origin[1]) if factors is None else factors
+    return (x - origin[0]) * factors[0], (y - origin[1]) * factors[1]
+
+def line_lengths(geoms):
+    """
+
+    Great-circle length of lines in longitude and latitude.
+
+    Every segment is measured with the haversine formula, so the length is
+    exact on a sphere up to the curvature of the segments, well under the
+    error of the data for street-sized segments.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the lines (LineString or MultiLineString), in EPSG:4326. The length
+        of other geometries is that of their boundary.
+
+    Returns
+    -------
+    numpy.ndarray of float, the length of every geometry in metres, 0 for
+    missing or empty geometries.
+    """
+    geoms = numpy.asarray(geoms, dtype=object)
+    lines = shapely.boundary(geoms)
+    lines = numpy.where(shapely.get_dimensions(geoms) == 2, lines, geoms)
+    parts, owner = shapely.get_parts(lines, return_index=True)
+    coords, part = shapely.get_coordinates(parts, return_index=True)
+    # Consecutive points of the same part are the segments
+    segment = part[1:] == part[:-1]
+    lon, lat = numpy.radians(coords[:, 0]), numpy.radians(coords[:, 1])
+    dlon, dlat = numpy.diff(lon)[segment], numpy.diff(lat)[segment]
+    a = numpy.sin(dlat / 2) ** 2 + numpy.cos(lat[:-1][segment]) * numpy.cos(lat[1:][segment]) * numpy.sin(dlon / 2) ** 2
+    length = 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+    return numpy.bincount(owner[part[:-1][segment]], weights=length, minlength=len(geoms))
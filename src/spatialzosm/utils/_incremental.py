@@ -0,0 +1,213 @@
+import hashlib
+import itertools
+import json
+import os
+
+import numpy
+import pandas as pd
+import shapely
+
+""" module: per-zone fingerprints for incremental resampling of houses """
+
+def _zone_key(zone):
+    """ Key of a zone id in the fingerprint file, the same for the id read back from a CSV output """
+    return str(zone)
+
+def zone_seeds(seed, zones):
+    """
+
+    Allocation and sampling streams of every zone.
+
+    The streams only depend on seed and the zone id, so the houses of a zone
+    are the same whichever other zones are sampled with it.
+
+    Parameters
+    ----------
+    seed : int, numpy.random.SeedSequence or None
+        root of the streams.
+
+    zones : array-like
+        the zone ids.
+
+    Returns
+    -------
+    list with a pair of numpy.random.SeedSequence (allocation, sampling) for
+    every zone.
+    """
+    root = seed if isinstance(seed, numpy.random.SeedSequence) else numpy.random.SeedSequence(seed)
+    streams = []
+    for zone in zones:
+        key = int.from_bytes(hashlib.sha1(_zone_key(zone).encode()).digest()[:8], 'little')
+        streams.append(numpy.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (key,)).spawn(2))
+    return streams
+
+def zone_fingerprints(geoms, bounds, population, seed, *arrays, **parameters):
+    """
+
+    Fingerprint of every zone of a sorted set of features.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the features, sorted by zone.
+
+    bounds : array-like of int
+        start of every zone followed by len(geoms), see _parallel.partition_bounds.
+
+    population : array-like of int
+        the population of every zone.
+
+    seed : int or None
+        the seed of the run.
+
+    *arrays : numpy.ndarray or None
+        per-feature values the houses depend on (e.g. the street classes or the
+        allocation weights), None is skipped.
+
+    **parameters
+        other settings of the run (e.g. the sampling method).
+
+    Returns
+    -------
+    list of str, the SHA1 of the population, features, values, seed and
+    parameters of every zone.
+    """
+    wkb = shapely.to_wkb(numpy.asarray(geoms))
+    wkb[pd.isna(wkb)] = b''
+    lengths = numpy.fromiter(map(len, wkb), dtype=numpy.int64, count=len(wkb))
+    arrays = [numpy.ascontiguousarray(values) for values in arrays if values is not None]
+    common = json.dumps([seed, parameters], sort_keys=True, default=str).encode()
+    fingerprints = []
+    for zone, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        digest = hashlib.sha1(common)
+        digest.update(numpy.int64(population[zone]).tobytes())
+        # The lengths separate the WKB of consecutive features
+        digest.update(lengths[start:stop].tobytes())
+        digest.update(b''.join(wkb[start:stop]))
+        for values in arrays:
+            digest.update(values[start:stop].tobytes())
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+class IncrementalOutput:
+    """
+
+    Output file of houses resampled zone by zone.
+
+    The fingerprint of every zone is stored next to the output in a JSON file
+    (output + '.zones.json'). A later run only resamples the zones whose
+    fingerprint changed; the houses of the other zones are copied from the
+    previous output, which therefore needs a zone column. The JSON file also
+    records the size and modification time of the output it describes, an
+    output written or modified since (e.g. by a run that is not incremental)
+    is resampled entirely.
+
+    Parameters
+    ----------
+    output : str
+        the path of the CSV or Parquet file of houses.
+
+    format : str
+        'csv' or 'parquet'.
+
+    zone_column : str
+        the column of the zone ids in the output.
+
+    **header
+        settings stored with the fingerprints (e.g. the kind of features); a
+        previous output written with other settings is resampled entirely.
+
+    Examples
+    --------
+    >>> incremental = IncrementalOutput('houses.csv', 'csv', 'district') # doctest: +SKIP
+    >>> changed = incremental.plan(ids, zone_fingerprints(geoms, bounds, population, seed)) # doctest: +SKIP
+    """
+
+    def __init__(self, output, format, zone_column, **header):
+        self.output = output
+        self.format = format
+        self.zone_column = zone_column
+        self.path = output + '.zones.json'
+        self.header = dict(header, format=format, zone_column=str(zone_column))
+        self.fingerprints = {}
+        self.drop = set()
+        self.previous = self.__read()
+
+    def __read(self):
+        """ Fingerprints of the previous output, empty if there is none or it was written with other settings """
+        if not (os.path.exists(self.path) and os.path.exists(self.output)):
+            return {}
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if data.get('header') != self.header or data.get('output') != self.__stat():
+            return {}
+        try:
+            columns = self.__columns()
+        except (OSError, ValueError):
+            return {}
+        # An output without zone column cannot be spliced, it is resampled entirely
+        if str(self.zone_column) not in map(str, columns):
+            return {}
+        return data.get('zones', {})
+
+    def __stat(self):
+        """ Size and modification time of the output, to tell whether it is the one the fingerprints describe """
+        stat = os.stat(self.output)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def __columns(self):
+        if self.format == 'csv':
+            return pd.read_csv(self.output, nrows=0).columns
+        import pyarrow.parquet as pq
+        return pq.read_schema(self.output).names
+
+    def plan(self, zones, fingerprints):
+        """
+        Compare the fingerprints of the zones of this run with the previous ones.
+
+        Returns
+        -------
+        numpy.ndarray with the position of the zones to resample. The houses of
+        the zones that changed or are gone are dropped from the previous output.
+        """
+        self.fingerprints = dict(zip(map(_zone_key, zones), fingerprints))
+        self.drop = {key for key, fingerprint in self.previous.items() if self.fingerprints.get(key) != fingerprint}
+        return numpy.flatnonzero([self.previous.get(key) != fingerprint for key, fingerprint in self.fingerprints.items()])
+
+    def kept(self, chunk_size=1000000):
+        """
+        Blocks of the houses of the previous output whose zone did not change, None if there is no previous output.
+        Blocks of a CSV output are (columns, lines) pairs of the lines copied as they are, see PointWriter.write_lines.
+        """
+        if not self.previous:
+            return None
+        return self.__kept_lines(chunk_size) if self.format == 'csv' else self.__kept(chunk_size)
+
+    def __kept(self, chunk_size):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(self.output).iter_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas()
+            keep = ~chunk[self.zone_column].astype(str).isin(self.drop).to_numpy()
+            if keep.any():
+                yield chunk[keep]
+
+    def __kept_lines(self, chunk_size):
+        # Only the zone column is parsed, formatting the coordinates again would cost as much as sampling them
+        zones = pd.read_csv(self.output, usecols=[self.zone_column], dtype={self.zone_column: str}, chunksize=chunk_size)
+        with open(self.output) as file:
+            columns = next(file).rstrip('\n').split(',')
+            for chunk in zones:
+                keep = ~chunk[self.zone_column].isin(self.drop).to_numpy()
+                lines = list(itertools.islice(file, len(keep)))
+                if keep.any():
+                    yield columns, list(itertools.compress(lines, keep))
+
+    def commit(self):
+        """ Store the fingerprints of this run, once the output has been written """
+        partial = self.path + '.partial'
+        with open(partial, 'w') as file:
+            json.dump({'header': self.header, 'output': self.__stat(), 'zones': self.fingerprints}, file)
+        os.replace(partial, self.path)
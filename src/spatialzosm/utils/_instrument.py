@@ -0,0 +1,147 @@
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+""" module: stage-level instrumentation of the pipeline """
+
+logger = logging.getLogger('spatialzosm')
+
+def peak_memory(children=False):
+    """
+    Resident set size high-water mark in MB of the process, or with children of its largest child process waited for
+    (e.g. the workers of a finished process pool). NaN where it is not available.
+    """
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def log_stage(record):
+    """ Default callback, log a finished stage at INFO level """
+    counts = ''
+    if record.get('rows_in') is not None or record.get('rows_out') is not None:
+        counts = ', rows {} -> {}'.format(record.get('rows_in', '-'), record.get('rows_out', '-'))
+    logger.info('%s finished in %.2fs%s, memory +%.0f MB (peak %.0f MB)', record['stage'], record['seconds'], counts,
+                record.get('stage_mb', float('nan')), record['peak_mb'])
+
+class Instrumentation:
+    """
+
+    Record the wall time, the rows in and out, the memory and the cache hits
+    of every stage of a run.
+
+    Every finished stage is passed as a dict to callback (by default logged
+    to the 'spatialzosm' logger) and kept for the run report, which is
+    machine-readable and can be saved as JSON. The memory of a stage is
+    recorded as:
+
+    - stage_mb: the growth of the resident set size high-water mark of the
+      process during the stage. It is a lower bound, a stage staying under
+      the peak of an earlier stage records 0.
+    - traced_mb: if tracemalloc is tracing, the peak of the memory allocated
+      by Python during the stage, whatever the earlier stages used.
+    - peak_mb: the high-water mark of the process so far, it only grows.
+    - workers_mb: the high-water mark of the largest child process finished
+      so far (the workers of the process pools), NaN on Windows. On Linux a
+      child starts from the high-water mark of its parent when it was forked,
+      so it is an upper bound of the memory of the workers.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        called with the record of every finished stage. Default is None
+        (log_stage).
+
+    progress : callable, optional
+        called as progress(stage, done, total) while long loops (sampling and
+        writing of houses) advance. Default is None.
+
+    Examples
+    --------
+    >>> instrumentation = Instrumentation(progress=lambda stage, done, total: print(stage, done, total)) # doctest: +SKIP
+    >>> with instrumentation.stage('filter', rows_in=len(df)) as record: # doctest: +SKIP
+    ...     record['rows_out'] = len(filtered)
+    """
+
+    def __init__(self, callback=None, progress=None):
+        self.callback = log_stage if callback is None else callback
+        self.progress = progress
+        self.records = []
+        self._open = []
+        self._marks = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None, **fields):
+        """ Time a stage and measure its memory, fields set on the yielded record (e.g. rows_out) are kept in it """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        record.update(fields)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # The traced peak is reset for this stage, the enclosing stages keep the peak they reached so far
+            traced = tracemalloc.get_traced_memory()[1]
+            for mark in self._marks:
+                mark['traced'] = max(mark['traced'], traced)
+            tracemalloc.reset_peak()
+        mark = {'peak': peak_memory(), 'traced': 0}
+        self._open.append(record)
+        self._marks.append(mark)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self._open.pop()
+            self._marks.pop()
+            memory = {'stage_mb': max(peak_memory() - mark['peak'], 0.0)}
+            if tracing and tracemalloc.is_tracing():
+                memory['traced_mb'] = max(mark['traced'], tracemalloc.get_traced_memory()[1]) / 2**20
+            self.record(record.pop('stage'), time.perf_counter() - start, **memory, **record)
+
+    def record(self, name, seconds, rows_in=None, rows_out=None, **fields):
+        """ Record a stage timed elsewhere """
+        end = time.time()
+        record = {'stage': name, 'start': end - seconds, 'seconds': seconds, 'rows_in': rows_in, 'rows_out': rows_out,
+                  'peak_mb': peak_memory(), 'workers_mb': peak_memory(children=True)}
+        record.update(fields)
+        self.records.append(record)
+        self.callback(record)
+        return record
+
+    def note(self, **fields):
+        """ Add fields (e.g. cache hits) to the innermost open stage """
+        if self._open:
+            self._open[-1].update(fields)
+
+    def advance(self, name, done, total=None):
+        """ Report the progress of a long loop """
+        if self.progress is not None:
+            self.progress(name, done, total)
+
+    def report(self):
+        """
+        Machine-readable report of the run: the stages in the order they finished, the wall time from the start of
+        the first stage to the end of the last one (stages can be nested, e.g. the triangulation is part of the
+        sampling, so their times do not add up) and the peak memory of the process and of its largest worker.
+        """
+        end = max((record['start'] + record['seconds'] for record in self.records), default=0.0)
+        start = min((record['start'] for record in self.records), default=0.0)
+        return {'stages': list(self.records), 'seconds': end - start,
+                'peak_mb': max((record['peak_mb'] for record in self.records), default=peak_memory()),
+                'workers_mb': max((record.get('workers_mb', float('nan')) for record in self.records), default=peak_memory(children=True))}
+
+    def save(self, file_path):
+        """ Save the run report as JSON """
+        with open(file_path, 'w') as file:
+            json.dump(self.report(), file, indent=1, default=str)
+
+    def clear(self):
+        """ Start a new report """
+        self.records = []
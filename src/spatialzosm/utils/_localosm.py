@@ -0,0 +1,131 @@
+import hashlib
+import os
+import tempfile
+from warnings import warn
+
+import osmnx as ox
+import shapely
+
+""" module: local .osm/.pbf extracts used in place of the Overpass API """
+
+#Ways left out of the network_type='all' graph of osmnx
+EXCLUDED_HIGHWAYS = {'abandoned', 'construction', 'no', 'planned', 'platform', 'proposed', 'raceway', 'razed'}
+
+def _matches(tags, query):
+    """ Whether the tags of an OSM object match any of the osmnx query tags """
+    for key, value in query.items():
+        tag = tags.get(key)
+        if tag is None:
+            continue
+        if value is True or tag == value or (not isinstance(value, str) and tag in value):
+            return True
+    return False
+
+def _is_street(tags):
+    """ Whether an OSM way belongs to the network_type='all' street network """
+    return ('highway' in tags and tags.get('area') != 'yes' and tags.get('highway') not in EXCLUDED_HIGHWAYS
+            and tags.get('service') != 'private')
+
+class OsmFile:
+    """
+
+    Downloader reading the features and street network of a local OSM XML or
+    PBF extract (e.g. from Geofabrik) instead of querying Overpass.
+
+    The extract is read in one streaming pass with pyosmium that keeps only
+    the objects with the requested tags, plus the nodes and ways they
+    reference. The result is written to a temporary OSM XML file and read with
+    the XML readers of osmnx, so the output is the same as that of the
+    functions of osmnx querying Overpass. The memory used is bounded by the
+    filtered objects rather than by the size of the extract, but they are all
+    held by osmnx at once (and their XML file takes a few times their size on
+    disk), so regions with millions of matching objects need as much memory
+    as the same Overpass query would. Requires pyosmium.
+
+    Parameters
+    ----------
+    path : str
+        the .osm, .osm.bz2 or .osm.pbf file.
+
+    polygon : shapely.Polygon or shapely.MultiPolygon, optional
+        the area to keep, in EPSG:4326, whatever the place. Default is None,
+        the area of the place is used.
+
+    geocode : bool, optional
+        whether places given by name are geocoded with osmnx (one Nominatim
+        query per place) and the extract clipped to them. If False the whole
+        extract is used and the place name is ignored. Places given as
+        polygons are never geocoded. Default is True.
+
+    Examples
+    --------
+    >>> saxony = Osmpoi('Saxony', downloader=OsmFile('sachsen-latest.osm.pbf')) # doctest: +SKIP
+    >>> dresden = Osmpoi('Dresden, Germany', downloader=OsmFile('sachsen-latest.osm.pbf')) # doctest: +SKIP
+    """
+
+    #Reported as the source of the downloads in the run records
+    source = 'extract'
+
+    def __init__(self, path, polygon=None, geocode=True):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"OSM file {path} not found.")
+        self.path = path
+        self.polygon = polygon
+        self.geocode = geocode
+        self._areas = {}
+
+    @property
+    def __version__(self):
+        # Part of the cache key, a modified extract or another area is read again
+        if self.polygon is not None:
+            area = hashlib.sha1(shapely.to_wkb(self.polygon)).hexdigest()[:12]
+        else:
+            area = 'place' if self.geocode else 'all'
+        return '{}:{}:{}:{}'.format(os.path.abspath(self.path), os.path.getmtime(self.path), ox.__version__, area)
+
+    def area(self, place):
+        """ The polygon the features and streets of place are clipped to, None for the whole extract """
+        if self.polygon is not None:
+            return self.polygon
+        if isinstance(place, (shapely.Polygon, shapely.MultiPolygon)):
+            return place
+        if not self.geocode:
+            warn("The place {} is ignored, the whole extract {} is read.".format(place, self.path), UserWarning, stacklevel=3)
+            return None
+        key = repr(place)
+        if key not in self._areas:
+            self._areas[key] = shapely.union_all(ox.geocode_to_gdf(place).geometry.values)
+        return self._areas[key]
+
+    def __extract(self, keys, keep, directory):
+        """ Stream the objects with one of keys passing keep, with their back references, to an XML file """
+        import osmium
+        output = os.path.join(directory, 'extract.osm')
+        with osmium.BackReferenceWriter(output, ref_src=self.path, overwrite=True) as writer:
+            for obj in osmium.FileProcessor(self.path).with_filter(osmium.filter.KeyFilter(*keys)):
+                if keep(obj):
+                    writer.add(obj)
+        return output
+
+    def features_from_place(self, place, tags):
+        """ Features of the extract matching tags in the area of place, like osmnx.features_from_place """
+        polygon = self.area(place)
+        with tempfile.TemporaryDirectory() as directory:
+            output = self.__extract(list(tags), lambda obj: _matches(obj.tags, tags), directory)
+            return ox.features_from_xml(output, polygon=polygon, tags=tags)
+
+    def graph_from_place(self, place, network_type='all', simplify=True, retain_all=False):
+        """ Street network of the extract in the area of place, like osmnx.graph_from_place with network_type='all' """
+        if network_type != 'all':
+            raise ValueError(f"Only network_type='all' can be read from OSM files, not {network_type}.")
+        polygon = self.area(place)
+        with tempfile.TemporaryDirectory() as directory:
+            output = self.__extract(['highway'], lambda obj: obj.is_way() and _is_street(obj.tags), directory)
+            graph = ox.graph_from_xml(output, bidirectional=False, simplify=False, retain_all=True)
+        if polygon is not None:
+            graph = ox.truncate.truncate_graph_polygon(graph, polygon)
+        if simplify:
+            graph = ox.simplification.simplify_graph(graph)
+        if not retain_all:
+            graph = ox.truncate.largest_component(graph)
+        return graph
@@ -0,0 +1,137 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+import pandas as pd
+import shapely
+
+from spatialzosm.utils._randist import sample_xy
+
+""" module: deterministic partitioned sampling on a process pool """
+
+def partition_bounds(keys):
+    """
+
+    Positions where the runs of equal keys of a sorted array start.
+
+    Returns
+    -------
+    numpy.ndarray with the start of every partition followed by len(keys).
+    """
+    codes, _ = pd.factorize(pd.Series(keys).to_numpy())
+    change = numpy.flatnonzero(codes[1:] != codes[:-1]) + 1
+    return numpy.concatenate(([0], change, [len(codes)]))
+
+def _sample_partition(task):
+    geoms, sizes, method, seed, triangulation, wkb = task
+    if wkb:
+        geoms = shapely.from_wkb(geoms)
+    return sample_xy(geoms, sizes, method=method, rng=numpy.random.default_rng(seed), triangulation=triangulation)
+
+def sample_partitions(geoms, size, bounds, method='uniform', seed=None, workers=1, triangulation=None):
+    """
+
+    Sample points partition by partition, optionally on a pool of processes.
+
+    Every partition draws from its own stream spawned from seed, so the result
+    only depends on the seed and the partitions, not on the number of workers.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the shapes in which to sample, sorted by partition.
+
+    size : integer or array-like of integers
+        how many points to sample in every geometry.
+
+    bounds : array-like of int
+        start of every partition followed by len(geoms), see partition_bounds.
+
+    method : str
+        the sampling method, see _randist.sample_xy.
+
+    seed : int, numpy.random.SeedSequence, list or None
+        root of the streams of the partitions, or a list with the
+        numpy.random.SeedSequence of every partition.
+
+    workers : int
+        number of processes. With 1 the partitions are sampled in this process.
+
+    triangulation : _randist.Triangulation, optional
+        precomputed triangulation of geoms for the 'triangulated' method.
+
+    Returns
+    -------
+    x, y : numpy.ndarray of the sampled coordinates
+    index : numpy.ndarray with the position in geoms of every sampled point.
+    """
+    chunks = list(iter_partitions(geoms, size, bounds, method, seed, workers, triangulation))
+    if not chunks:
+        empty = numpy.empty(0)
+        return empty, empty, numpy.empty(0, dtype=numpy.int64)
+    return tuple(numpy.concatenate(arrays) for arrays in zip(*chunks))
+
+def iter_partitions(geoms, size, bounds, method='uniform', seed=None, workers=1, triangulation=None, chunk_size=None):
+    """
+
+    Sample points partition by partition and yield them in blocks.
+
+    Same as sample_partitions, but the points are yielded in partition order as
+    soon as at least chunk_size of them are ready, so only a bounded number of
+    partitions are held in memory. With chunk_size None every partition is
+    yielded on its own.
+
+    Yields
+    ------
+    x, y : numpy.ndarray of the sampled coordinates
+    index : numpy.ndarray with the position in geoms of every sampled point.
+    """
+    geoms = numpy.asarray(geoms, dtype=object)
+    sizes = numpy.broadcast_to(numpy.asarray(size, dtype=numpy.int64), geoms.shape)
+    if isinstance(seed, numpy.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    if isinstance(seed, (list, tuple)):
+        seeds = seed
+    else:
+        if not isinstance(seed, numpy.random.SeedSequence):
+            seed = numpy.random.SeedSequence(seed)
+        seeds = seed.spawn(len(bounds) - 1)
+    parallel = workers > 1 and len(bounds) > 2
+
+    def tasks():
+        for start, stop, child in zip(bounds[:-1], bounds[1:], seeds):
+            if not sizes[start:stop].any():
+                continue
+            subset = triangulation.subset(start, stop) if triangulation is not None else None
+            #Geometries are sent to the workers as WKB, which pickles much faster than shapely objects
+            shapes = shapely.to_wkb(geoms[start:stop]) if parallel else geoms[start:stop]
+            yield start, (shapes, sizes[start:stop], method, child, subset, parallel)
+
+    def results():
+        if not parallel:
+            for start, task in tasks():
+                yield start, _sample_partition(task)
+            return
+        #Keep a bounded number of partitions in flight so memory does not grow with the area
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for start, task in tasks():
+                pending.append((start, executor.submit(_sample_partition, task)))
+                if len(pending) >= workers * 4:
+                    start, future = pending.popleft()
+                    yield start, future.result()
+            while pending:
+                start, future = pending.popleft()
+                yield start, future.result()
+
+    block = []
+    points = 0
+    for start, (x, y, index) in results():
+        block.append((x, y, index + start))
+        points += len(x)
+        if chunk_size is None or points >= chunk_size:
+            yield tuple(numpy.concatenate(arrays) for arrays in zip(*block))
+            block = []
+            points = 0
+    if block:
+        yield tuple(numpy.concatenate(arrays) for arrays in zip(*block))
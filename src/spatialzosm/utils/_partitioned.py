@@ -0,0 +1,122 @@
+import json
+import os
+
+import pandas as pd
+import shapely
+
+from spatialzosm.utils._parallel import partition_bounds
+
+""" module: lazy reading of features partitioned by zone """
+
+FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather', '.ipc': 'feather'}
+
+def _format(path):
+    """ Dataset format of a Parquet or Feather file, or of the first of them found in a directory """
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in FORMATS:
+                    return FORMATS[os.path.splitext(name)[1].lower()]
+        raise ValueError(f"No Parquet or Feather file found in {path}.")
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported partitioned file {path}, use Parquet or Feather files.")
+    return FORMATS[extension]
+
+def read_batches(path, columns=None, batch_size=100000):
+    """
+
+    Read a Parquet or Feather file, or a directory of them, batch by batch.
+
+    Directories may be hive-partitioned (e.g. zone=12/part.parquet), the
+    partition keys are then read as columns. The files are read one after
+    another in the order of their paths, so at most batch_size features are
+    loaded at a time.
+
+    Parameters
+    ----------
+    path : str
+        the file or directory.
+
+    columns : list of str, optional
+        the columns to read, those missing from the files are skipped. The
+        geometry column is always read.
+
+    batch_size : int, optional
+        the maximum number of features of every batch. Default is 100000.
+
+    Yields
+    ------
+    pandas.DataFrame with the shapely geometries (decoded from WKB) in the
+    'geometry' column.
+    """
+    import pyarrow.dataset as ds
+    format = _format(path)
+    dataset = ds.dataset(path, format=format, partitioning='hive')
+    #Without read-ahead nor pre-buffering only the batch being sampled is decoded, else the scanner buffers a large part of the file
+    options = dict(batch_readahead=0, use_threads=False)
+    if format == 'parquet':
+        options['fragment_scan_options'] = ds.ParquetFragmentScanOptions(pre_buffer=False)
+    metadata = dataset.schema.metadata or {}
+    #GeoParquet files name their geometry column in the 'geo' metadata
+    geometry = json.loads(metadata[b'geo'])['primary_column'] if b'geo' in metadata else 'geometry'
+    names = dataset.schema.names
+    if columns is not None:
+        columns = [column for column in dict.fromkeys(list(columns) + [geometry]) if column in names]
+    for fragment in dataset.get_fragments():
+        for batch in fragment.to_batches(columns=columns, schema=dataset.schema, batch_size=batch_size, **options):
+            frame = batch.to_pandas()
+            frame['geometry'] = shapely.from_wkb(frame.pop(geometry).to_numpy())
+            yield frame
+
+def zone_frames(frames, zone_column):
+    """
+
+    Regroup a stream of frames into frames of whole zones.
+
+    The features of a zone must be contiguous in the stream, e.g. the stream
+    is sorted by zone or every file of a partitioned dataset holds whole
+    zones. The features of the last zone of a frame are held back until the
+    zone ends, so a zone is never split across the yielded frames.
+
+    Parameters
+    ----------
+    frames : iterable of pandas.DataFrame
+        the features.
+
+    zone_column : str
+        the column of the zone ids.
+
+    Yields
+    ------
+    pandas.DataFrame with the features of one or more whole zones.
+
+    Raises
+    ------
+    ValueError
+        If the features of a zone are not contiguous.
+    """
+    done = set()
+    carry = []
+    for frame in frames:
+        if not len(frame):
+            continue
+        zones = frame[zone_column].to_numpy()
+        if carry and (zones[0] != zones[-1] or zones[0] != carry[0][zone_column].iat[0]):
+            #The held back zone may go on in this frame, its features are gathered before splitting
+            frame = pd.concat(carry + [frame], ignore_index=True)
+            zones = frame[zone_column].to_numpy()
+            carry = []
+        bounds = partition_bounds(zones)
+        ids = zones[bounds[:-1]]
+        if len(set(ids)) < len(ids) or not done.isdisjoint(ids):
+            raise ValueError(f"The features of every zone must be contiguous, zones of {zone_column} are split.")
+        if len(ids) == 1 and carry:
+            carry.append(frame)
+            continue
+        done.update(ids[:-1])
+        if len(ids) > 1:
+            yield frame.iloc[:bounds[-2]].reset_index(drop=True)
+        carry = [frame.iloc[bounds[-2]:]]
+    if carry:
+        yield pd.concat(carry, ignore_index=True)
@@ -0,0 +1,344 @@
+import json
+import os
+
+import numpy
+import shapely
+
+from spatialzosm.utils._geo import project, scale
+
+""" module: persistent grid index of the filtered POIs for batch radius, nearest and zone queries """
+
+#Cells are keyed by their column and row shifted by OFFSET, so keys are non-negative
+OFFSET = 2**20
+#Average number of POIs per cell, the cell size of every group follows its density
+POIS_PER_CELL = 4
+#Candidate (query, cell) pairs processed at a time, it bounds the memory of batch queries
+BATCH_PAIRS = 2**22
+ARRAYS = ('x', 'y', 'X', 'Y', 'row', 'keys', 'starts', 'group_cells', 'group_points')
+
+class PoiIndex:
+    """
+
+    Spatial index of the filtered POIs, partitioned by group.
+
+    The POIs of every group are sorted by the cell of a sparse square grid
+    whose cell size follows the density of the group, so the nearest POIs of
+    rare and common groups are both found within a few cells. Coordinates are
+    projected to metres with an equirectangular projection around the centre of
+    the POIs, which is accurate at the scale of a city or a region.
+
+    The index is a set of numpy arrays that can be saved to a directory and
+    loaded memory-mapped, so worker processes share one copy through the page
+    cache instead of building their own.
+
+    Parameters
+    ----------
+    arrays : dict of numpy.ndarray
+        the arrays of the index, see build.
+
+    meta : dict
+        the groups, their cell sizes and bounds and the projection.
+
+    Examples
+    --------
+    >>> index = PoiIndex.build(pois) # doctest: +SKIP
+    >>> index.save('pois_index') # doctest: +SKIP
+    >>> index = PoiIndex.load('pois_index') # doctest: +SKIP
+    >>> query, row, distance = index.radius(homes.x, homes.y, 500, group='Education') # doctest: +SKIP
+    >>> row, distance = index.knn(homes.x, homes.y, k=3, group='Health') # doctest: +SKIP
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.groups = list(meta['groups'])
+
+    def __len__(self):
+        return len(self.row)
+
+    @classmethod
+    def build(cls, pois, cell_size=None):
+        """
+        Build the index of a DataFrame of POIs.
+
+        Parameters
+        ----------
+        pois : pandas.DataFrame
+            the POIs with x (longitude), y (latitude) and group columns, as
+            returned by filter_osm_points. POIs without group are left out.
+
+        cell_size : float, optional
+            the side of the cells in metres for all the groups. Default is None
+            (a size giving about POIS_PER_CELL POIs per cell in every group).
+
+        Returns
+        -------
+        PoiIndex, whose queries return the positions (rows) of the POIs in pois.
+        """
+        x = pois['x'].to_numpy(dtype=float)
+        y = pois['y'].to_numpy(dtype=float)
+        codes, groups = _factorize(pois['group'])
+        valid = (codes >= 0) & numpy.isfinite(x) & numpy.isfinite(y)
+        origin = (float(numpy.mean(x[valid])), float(numpy.mean(y[valid]))) if valid.any() else (0.0, 0.0)
+        meta = {'groups': [str(group) for group in groups], 'origin': origin, 'scale': scale(origin[1])}
+        row = numpy.flatnonzero(valid)
+        X, Y = _project(x[row], y[row], meta)
+        codes = codes[row]
+
+        cell_sizes = []
+        bounds = []
+        keys = numpy.empty(len(row), dtype=numpy.int64)
+        for group in range(len(groups)):
+            member = codes == group
+            low = (X[member].min(), Y[member].min()) if member.any() else (0.0, 0.0)
+            high = (X[member].max(), Y[member].max()) if member.any() else (0.0, 0.0)
+            size = cell_size
+            if size is None:
+                area = max((high[0] - low[0]) * (high[1] - low[1]), 1.0)
+                size = max(numpy.sqrt(area * POIS_PER_CELL / max(member.sum(), 1)), 1.0)
+            cell_sizes.append(float(size))
+            bounds.append([float(value) for value in low + high])
+            keys[member] = _keys(numpy.floor(X[member] / size), numpy.floor(Y[member] / size))
+        meta['cell_size'] = cell_sizes
+        meta['bounds'] = bounds
+
+        order = numpy.lexsort((keys, codes))
+        row, X, Y, codes, keys = row[order], X[order], Y[order], codes[order], keys[order]
+        # One entry per occupied cell of every group, starts[i] is the first POI of cell i
+        first = numpy.flatnonzero(numpy.concatenate(([True], (keys[1:] != keys[:-1]) | (codes[1:] != codes[:-1])))) if len(keys) else numpy.empty(0, dtype=numpy.int64)
+        arrays = {'x': x[row], 'y': y[row], 'X': X, 'Y': Y, 'row': row, 'keys': keys[first],
+                  'starts': numpy.append(first, len(keys)),
+                  'group_cells': numpy.searchsorted(codes[first], numpy.arange(len(groups) + 1)),
+                  'group_points': numpy.searchsorted(codes, numpy.arange(len(groups) + 1))}
+        return cls(arrays, meta)
+
+    def save(self, path):
+        """ Save the index as .npy files and a meta.json file in the directory path """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            numpy.save(os.path.join(path, name + '.npy'), numpy.asarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(self.meta, file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """ Load an index saved with save, memory-mapped (read only) unless mmap is False """
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: numpy.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None) for name in ARRAYS}
+        return cls(arrays, meta)
+
+    def radius(self, x, y, radius, group=None):
+        """
+        POIs within a distance of every query point.
+
+        Parameters
+        ----------
+        x, y : array-like of float
+            longitude and latitude of the query points.
+
+        radius : float
+            the distance in metres.
+
+        group : str or list of str, optional
+            the groups of the POIs. Default is None (all the groups).
+
+        Returns
+        -------
+        query : numpy.ndarray of int
+            the position of the query point of every match.
+        row : numpy.ndarray of int
+            the row of the matched POI in the DataFrame the index was built from.
+        distance : numpy.ndarray of float
+            the distance in metres, the matches are sorted by query and distance.
+        """
+        X, Y = _project(numpy.atleast_1d(numpy.asarray(x, dtype=float)), numpy.atleast_1d(numpy.asarray(y, dtype=float)), self.meta)
+        found = []
+        for group in self.__groups(group):
+            ring = int(numpy.ceil(radius / self.meta['cell_size'][group]))
+            for query, position in self.__square(group, X, Y, ring):
+                distance = numpy.hypot(self.X[position] - X[query], self.Y[position] - Y[query])
+                inside = distance <= radius
+                found.append((query[inside], position[inside], distance[inside]))
+        return self.__sorted(found)
+
+    def knn(self, x, y, k=1, group=None, max_distance=numpy.inf):
+        """
+        The k nearest POIs of every query point.
+
+        Parameters
+        ----------
+        x, y : array-like of float
+            longitude and latitude of the query points.
+
+        k : int
+            the number of POIs per query point.
+
+        group : str or list of str, optional
+            the groups of the POIs. Default is None (all the groups).
+
+        max_distance : float, optional
+            the largest distance in metres. Default is numpy.inf.
+
+        Returns
+        -------
+        row : numpy.ndarray of int, shape (n, k)
+            the rows of the nearest POIs, nearest first, -1 where there are fewer than k.
+        distance : numpy.ndarray of float, shape (n, k)
+            their distances in metres, inf where there are fewer than k.
+        """
+        X, Y = _project(numpy.atleast_1d(numpy.asarray(x, dtype=float)), numpy.atleast_1d(numpy.asarray(y, dtype=float)), self.meta)
+        positions, distances = [], []
+        for group in self.__groups(group):
+            size = self.meta['cell_size'][group]
+            low_x, low_y, high_x, high_y = self.meta['bounds'][group]
+            # Beyond this ring the square covers the whole group
+            farthest = numpy.hypot(numpy.maximum(numpy.abs(X - low_x), numpy.abs(X - high_x)), numpy.maximum(numpy.abs(Y - low_y), numpy.abs(Y - high_y)))
+            last = numpy.ceil(numpy.minimum(farthest, max_distance) / size).astype(numpy.int64) + 1
+            position_k = numpy.full((len(X), k), -1, dtype=numpy.int64)
+            distance_k = numpy.full((len(X), k), numpy.inf)
+            todo = numpy.arange(len(X))
+            ring = 1
+            while len(todo):
+                pairs = [(todo[query], position) for query, position in self.__square(group, X[todo], Y[todo], ring)]
+                query, position, distance = _first(*self.__sorted([(query, position, numpy.hypot(self.X[position] - X[query], self.Y[position] - Y[query]))
+                                                                   for query, position in pairs], rows=False), k)
+                rank = numpy.arange(len(query)) - numpy.searchsorted(query, query)
+                # A larger square holds all the candidates of a smaller one, so the slots of the queries not done are overwritten
+                position_k[query, rank] = position
+                distance_k[query, rank] = distance
+                # Only POIs closer than ring cells are sure to be in the square
+                done = (distance_k[todo, k - 1] <= ring * size) | (ring >= last[todo])
+                todo = todo[~done]
+                ring *= 2
+            positions.append(position_k)
+            distances.append(distance_k)
+        position = numpy.concatenate(positions, axis=1)
+        distance = numpy.concatenate(distances, axis=1)
+        if len(positions) > 1:
+            order = numpy.argsort(distance, axis=1, kind='stable')[:, :k]
+            position = numpy.take_along_axis(position, order, axis=1)
+            distance = numpy.take_along_axis(distance, order, axis=1)
+        missing = (position < 0) | (distance > max_distance)
+        rows = numpy.where(missing, -1, numpy.asarray(self.row)[numpy.maximum(position, 0)])
+        distance[missing] = numpy.inf
+        return rows, distance
+
+    def within(self, polygon, group=None):
+        """
+        Rows of the POIs inside a polygon (in EPSG:4326), sorted.
+        """
+        low_x, low_y, high_x, high_y = shapely.bounds(polygon)
+        rows = []
+        for group in self.__groups(group):
+            start, stop = self.group_points[group], self.group_points[group + 1]
+            x, y = self.x[start:stop], self.y[start:stop]
+            candidate = numpy.flatnonzero((x >= low_x) & (x <= high_x) & (y >= low_y) & (y <= high_y))
+            inside = shapely.contains_xy(polygon, x[candidate], y[candidate])
+            rows.append(self.row[start + candidate[inside]])
+        return numpy.sort(numpy.concatenate(rows)) if rows else numpy.empty(0, dtype=numpy.int64)
+
+    def locate(self, zones, ids=None, size=None):
+        """
+        Zone of every POI, in one bulk query of the zone polygons.
+
+        Parameters
+        ----------
+        zones : geopandas.GeoDataFrame
+            the polygons of the zone units.
+
+        ids : array-like, optional
+            the id of every zone. Default is None (the index of zones).
+
+        size : int, optional
+            the number of rows of the DataFrame the index was built from.
+            Default is None (the largest row of the index plus one).
+
+        Returns
+        -------
+        pandas.Series with the zone id of every row, NaN for POIs outside all the
+        zones and for rows without group.
+        """
+        import pandas as pd
+        from spatialzosm.utils._zones import ZoneIndex
+        if zones.crs is not None and not zones.crs.equals('EPSG:4326'):
+            zones = zones.to_crs('EPSG:4326')
+        index = ZoneIndex(zones, ids)
+        position = index.locate(shapely.points(numpy.asarray(self.x), numpy.asarray(self.y)))
+        size = int(self.row.max()) + 1 if size is None and len(self.row) else size or 0
+        result = pd.Series(numpy.nan, index=pd.RangeIndex(size), dtype=object)
+        located = position >= 0
+        result.iloc[numpy.asarray(self.row)[located]] = index.ids[position[located]]
+        return result.infer_objects()
+
+    def __groups(self, group):
+        """ Codes of the queried groups """
+        if group is None:
+            return range(len(self.groups))
+        names = [group] if isinstance(group, str) else list(group)
+        unknown = [name for name in names if name not in self.groups]
+        if unknown:
+            raise KeyError(f"No POIs of the groups {unknown} in the index.")
+        return [self.groups.index(name) for name in names]
+
+    def __square(self, group, X, Y, ring):
+        """
+        Candidate POIs of a group in the square of cells within ring cells of every query point,
+        yielded as (query, position) arrays in batches of at most BATCH_PAIRS query cells.
+        """
+        size = self.meta['cell_size'][group]
+        cell_start, cell_stop = self.group_cells[group], self.group_cells[group + 1]
+        keys = self.keys[cell_start:cell_stop]
+        if not len(keys):
+            return
+        offset = numpy.arange(-ring, ring + 1)
+        dx, dy = (value.ravel() for value in numpy.meshgrid(offset, offset))
+        column, line = numpy.floor(X / size), numpy.floor(Y / size)
+        step = max(BATCH_PAIRS // len(dx), 1)
+        for begin in range(0, len(X), step):
+            query = numpy.repeat(numpy.arange(begin, min(begin + step, len(X))), len(dx))
+            wanted = _keys(column[query] + numpy.tile(dx, len(query) // len(dx)), line[query] + numpy.tile(dy, len(query) // len(dx)))
+            cell = numpy.minimum(numpy.searchsorted(keys, wanted), len(keys) - 1)
+            hit = keys[cell] == wanted
+            query, cell = query[hit], cell + cell_start
+            cell = cell[hit]
+            start, stop = self.starts[cell], self.starts[cell + 1]
+            count = stop - start
+            # Positions of the POIs of every hit cell, laid end to end
+            position = numpy.repeat(start - numpy.cumsum(count) + count, count) + numpy.arange(count.sum())
+            yield numpy.repeat(query, count), position
+
+    def __sorted(self, found, rows=True):
+        """ Concatenate (query, position, distance) matches sorted by query and distance, with positions turned into rows """
+        if not found:
+            empty = numpy.empty(0, dtype=numpy.int64)
+            return empty, empty, numpy.empty(0)
+        query, position, distance = (numpy.concatenate(arrays) for arrays in zip(*found))
+        order = _order(query, distance)
+        query, position, distance = query[order], position[order], distance[order]
+        return query, numpy.asarray(self.row)[position] if rows else position, distance
+
+def _factorize(values):
+    import pandas as pd
+    return pd.factorize(values, sort=True)
+
+def _project(x, y, meta):
+    """ Equirectangular projection in metres around the origin of the index, with the scale it was built with """
+    return project(x, y, meta['origin'], meta['scale'])
+
+def _keys(column, line):
+    """ Key of the cells of a grid, from their column and line """
+    return (column.astype(numpy.int64) + OFFSET) * (2 * OFFSET) + (line.astype(numpy.int64) + OFFSET)
+
+def _order(query, distance):
+    """ Order of matches by query and distance, with one sort of a composite key instead of a slower lexsort """
+    if not len(query):
+        return numpy.empty(0, dtype=numpy.int64)
+    return numpy.argsort(query + distance * (0.5 / (distance.max() + 1.0)))
+
+def _first(query, position, distance, k):
+    """ The first k matches of every query of matches sorted by query """
+    rank = numpy.arange(len(query)) - numpy.searchsorted(query, query)
+    keep = rank < k
+    return query[keep], position[keep], distance[keep]
@@ -0,0 +1,244 @@
+from collections import namedtuple
+
+import numpy
+import pandas as pd
+
+""" module: declarative OSM tag rules used to classify POIs """
+
+#Fill the amenity of rows without one from a tag column. If values is None any
+#non-null tag matches, otherwise the tag must be in values. If amenity is None
+#the tag value itself is copied. group is assigned together with the fill.
+Fill = namedtuple('Fill', ['column', 'values', 'amenity', 'group'], defaults=(None, None, None))
+#Assign group to every row whose (already filled) amenity is in amenities
+Group = namedtuple('Group', ['group', 'amenities'])
+
+ACCOMODATION = ['apartments', 'barracks', 'bungalow', 'cabin', 'detached', 'dormitory', 'farm', 'ger', 'house', 'houseboat',
+                'semidetached_house', 'shed', 'static_caravan', 'stilt_house', 'terrace', 'tree_house']
+RETAIL = ['commercial', 'industrial', 'kiosk', 'retail', 'supermarket']
+SPORT_BUILDINGS = ['grandstand', 'pavilion', 'riding_hall', 'sports_hall', 'sports_centre', 'stadium']
+LANDUSE = ['farmland', 'farmyard', 'forest', 'grass', 'greenhouse', 'greenhouse_horticulture', 'orchard', 'plant_nuersey',
+           'recreation_ground']
+
+#Tag columns whose fills describe the building or the land rather than the POI itself
+GENERIC_COLUMNS = ('building', 'landuse', 'addr:housenumber', 'addr:housename')
+
+#Rules are applied in order: the first Fill matching a row sets its amenity and
+#the last Group rule after that fill containing the amenity sets its group.
+RULES = (
+    #AERODROME from OSM tagging system
+    Fill('aeroway'),
+    Group('aeroway', ['aerodrome', 'hangar', 'heliport', 'terminal']),
+    #SUSTENANCE amenities from OSM tagging system
+    Fill('cuisine', amenity='restaurant'),
+    Group('sustenance', ['bar', 'biergarten', 'cafe', 'fast_food', 'food_court', 'ice_cream', 'pub', 'restaurant']),
+    #CRAFT
+    Fill('craft'),
+    Group('craft', ['agricultural_engines', 'atelier', 'bakery', 'basket_maker', 'beekeeper', 'blacksmith', 'boatbuilder',
+                    'bookbinder', 'brewery', 'builder', 'cabinet_maker', 'candlemaker', 'car_painter', 'carpenter',
+                    'carpet_layer', 'caterer', 'chimney_sweeper', 'cleaning', 'clockmaker', 'confectionery', 'cooper',
+                    'dental_technician', 'distillery', 'door_construction', 'dressmaker', 'electronics_repair',
+                    'embroiderer', 'electrician', 'engraver', 'fence_maker', 'floorer', 'fruit_press', 'gardener',
+                    'glaziery', 'goldsmith', 'grinding_mill', 'handicraft', 'hvac', 'insulation', 'interior_decorator',
+                    'interior_work', 'jeweller', 'joiner', 'key_cutter', 'locksmith', 'metal_construction', 'mint',
+                    'musical_instrument', 'oil_mill', 'optician', 'organ_builder', 'painter', 'parquet_layer', 'paver',
+                    'photographer', 'photographic_laboratory', 'piano_tuner', 'plasterer', 'plumber', 'pottery',
+                    'printer', 'printmaker', 'rigger', 'roofer', 'saddler', 'sailmaker', 'sawmill', 'scaffolder',
+                    'sculptor', 'shoemaker', 'signmaker', 'stand_builder', 'stonemason', 'stove_fitter',
+                    'sun_protection', 'tailor', 'tiler', 'tinsmith', 'toolmaker', 'turner', 'upholsterer',
+                    'watchmaker', 'water_well_drilling', 'window_construction', 'winery']),
+    #EDUCATION amenities from OSM tagging system
+    Fill('building', ['school', 'college', 'kindergarten', 'university']),
+    Group('education', ['college', 'driving_school', 'kindergarten', 'language_school', 'library', 'toy_library',
+                        'training', 'music_school', 'school', 'university']),
+    #TRANSPORTATION amenities from OSM tagging system
+    Fill('public_transport', amenity='bus_station'),
+    Fill('building', ['train_station', 'transportation'], amenity='train_station'),
+    Group('transportation', ['bicycle_parking', 'bicycle_repair_station', 'bicycle_rental', 'boat_rental',
+                             'boat_sharing', 'bus_station', 'car_rental', 'car_sharing', 'car_wash', 'compressed_air',
+                             'vehicle_inspection', 'charging_station', 'ferry_terminal', 'fuel', 'motorcycle_parking',
+                             'parking', 'parking_entrance', 'taxi', 'train_station']),
+    #ENTERTAINMENT ARTS AND CULTURE amenities from OSM tagging system
+    Group('entertainment', ['arts_centre', 'brothel', 'casino', 'cinema', 'community_centre', 'conference_centre',
+                            'events_venue', 'exhibition_centre', 'fountain', 'gambling', 'love_hotel', 'music_venue',
+                            'nightclub', 'planetarium', 'public_bookcase', 'social_centre', 'stripclub', 'studio',
+                            'swingerclub', 'theatre']),
+    #FACILITIES amenities from OSM tagging system
+    Fill('building', ['toilets']),
+    Group('facilities', ['bbq', 'bench', 'dog_toilet', 'dressing_room', 'drinking_water', 'give_box', 'mailroom',
+                         'parcel_locker', 'shelter', 'shower', 'telephone', 'toilets', 'water_point',
+                         'watering_place']),
+    #FINANCIAL amenities from OSM tagging system
+    Group('financial', ['atm', 'bank', 'bureau_de_change']),
+    #HEALTHCARE amenities from OSM tagging system
+    Fill('healthcare', amenity='doctors'),
+    Fill('social_facility', amenity='social_facility'),
+    Fill('building', ['hospital']),
+    Group('healthcare', ['baby_hatch', 'clinic', 'dentist', 'doctors', 'hospital', 'nursing_home', 'pharmacy',
+                         'social_facility', 'veterinary']),
+    #HISTORIC
+    Fill('building', ['castle']),
+    Fill('historic'),
+    Group('historic', ['aircraft_wreck', 'archaeological_site', 'battlefield', 'building', 'bunker', 'creamery', 'farm',
+                       'manor', 'monastery', 'ruins']),
+    #LEISURE
+    Fill('leisure', group='leisure'),
+    #OFFICE
+    Fill('office', group='office'),
+    Fill('building', ['office'], amenity='administrative'),
+    Group('office', ['administrative']),
+    #OTHERS amenities from OSM tagging system
+    Fill('landuse', ['cemetery'], amenity='grave_yard'),
+    Group('others', ['animal_boarding', 'animal_breeding', 'animal_shelter', 'baking_oven', 'childcare', 'clock',
+                     'crematorium', 'dive_centre', 'funeral_hall', 'grave_yard', 'hunting_stand', 'internet_cafe',
+                     'kitchen', 'kneipp_water_cure', 'lounger', 'marketplace', 'monastery', 'photo_booth',
+                     'place_of_mourning', 'public_bath', 'refugee_site', 'vending_machine']),
+    #PUBLIC SERVICE amenities from OSM tagging system
+    Fill('building', ['fire_station', 'government', 'public']),
+    Group('public_service', ['courthouse', 'fire_station', 'government', 'police', 'post_box', 'post_depot',
+                             'post_office', 'public', 'prison', 'ranger_station', 'townhall']),
+    #RELIGIOUS
+    Fill('building', ['cathedral', 'chapel', 'church', 'kingdom_hall', 'monastery', 'mosque', 'presbytery', 'religious',
+                      'shrine', 'synagogue', 'temple'], amenity='place_of_worship'),
+    Fill('landuse', ['religious'], amenity='place_of_worship'),
+    Group('religious', ['place_of_worship']),
+    #SHOP
+    Fill('shop', group='shop'),
+    #SPORT
+    Fill('building', SPORT_BUILDINGS, group='sport'),
+    Fill('sport', group='sport'),
+    #TOURISM (the amenity is filled before the group is checked, so no group is set here)
+    Fill('building', ['hotel'], group='tourism'),
+    Fill('tourism'),
+    #WASTE MANAGEMENT amenities from OSM tagging system
+    Group('waste_management', ['sanitary_dump_station', 'recycling', 'waste_basket', 'waste_disposal',
+                               'waste_transfer_station']),
+    #BUILDING- ACCOMODATION
+    Fill('building', ['residential'], amenity='house'),
+    Fill('building', ACCOMODATION),
+    Fill('building', RETAIL),
+    Group('accomodation', ACCOMODATION + ['residential']),
+    Fill('landuse', ['residential'], amenity='house'),
+    Fill('landuse', ['commercial', 'industrial', 'retail']),
+    #BUILDING-SHOP
+    Group('shop', RETAIL),
+    #LANDUSE
+    Fill('landuse', LANDUSE),
+    Group('landuse', LANDUSE),
+    #BUILDING - HOUSE
+    Fill('addr:housenumber', amenity='house'),
+    Fill('addr:housename', amenity='house'),
+    Fill('building', ['yes'], amenity='house'),
+    Group('accomodation', ['house']),
+)
+
+
+class PoiRuleEngine:
+    """
+    Rule table compiled into lookups so that every row is classified in a single
+    vectorized pass instead of one boolean mask per rule.
+
+    The tag columns are factorized once and each distinct tag value is mapped to
+    the first rule it triggers, so the per-row work is a handful of NumPy take
+    operations regardless of the number of rules.
+    """
+
+    def __init__(self, rules):
+        self.groups = ['']
+        fills = {}
+        fill_groups = []
+        last_group = {}
+        for position, rule in enumerate(rules):
+            if isinstance(rule, Fill):
+                fills.setdefault(rule.column, []).append((position, rule))
+                fill_groups.append(self.__group_code(rule.group) if rule.group else 0)
+            else:
+                code = self.__group_code(rule.group)
+                for amenity in rule.amenities:
+                    last_group[amenity] = (position, code)
+                fill_groups.append(0)
+        self.n_rules = len(fill_groups)
+        # Indexed by rule position, position n_rules (or -1) means no fill
+        self._fill_groups = numpy.array(fill_groups + [0], dtype=numpy.int16)
+        self._generic = numpy.array([isinstance(rule, Fill) and rule.column in GENERIC_COLUMNS for rule in rules] + [True])
+        self._fills = fills
+        self._last_group = last_group
+        self._group_names = numpy.array(self.groups, dtype=object)
+
+    def __group_code(self, group):
+        if group not in self.groups:
+            self.groups.append(group)
+        return self.groups.index(group)
+
+    @property
+    def columns(self):
+        """ Tag columns referenced by the fill rules """
+        return list(self._fills)
+
+    def generic(self, rank):
+        """ Whether the amenity of every rank (see classify) comes from a building, land use or address tag """
+        rank = numpy.asarray(rank)
+        return self._generic[rank] & (rank >= 0)
+
+    def classify(self, df, ranks=False):
+        """
+        Classify the rows of a raw POI dataframe.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Raw OSM features with an 'amenity' column and any of the tag columns.
+
+        ranks : bool, optional
+            Whether to also return the rank of every row. Default is False.
+
+        Returns
+        -------
+        amenity : numpy.ndarray
+            The amenity of every row after applying the fill rules (NaN if none).
+        group : numpy.ndarray
+            The group of every row, '' if no rule assigned one.
+        rank : numpy.ndarray, only if ranks is set
+            The specificity of the amenity of every row, lower is more specific: -1
+            for an amenity tag, else the position of the fill rule that set it.
+        """
+        n = len(df)
+        no_fill = self.n_rules
+        amenity = df['amenity'].to_numpy(dtype=object)
+        missing = pd.isna(amenity)
+        position = numpy.full(n, no_fill, dtype=numpy.int32)
+        filled = numpy.full(n, numpy.nan, dtype=object)
+        for column, rules in self._fills.items():
+            if column not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[column])
+            # The extra slot at the end is hit by the NA code -1
+            unique_position = numpy.full(len(uniques) + 1, no_fill, dtype=numpy.int32)
+            unique_amenity = numpy.full(len(uniques) + 1, numpy.nan, dtype=object)
+            values = numpy.asarray(uniques, dtype=object)
+            for rule_position, rule in reversed(rules):
+                if rule.values is None:
+                    match = numpy.ones(len(uniques), dtype=bool)
+                else:
+                    match = pd.Index(values).isin(rule.values)
+                match = numpy.append(match, False)
+                unique_position[match] = rule_position
+                unique_amenity[match] = rule.amenity if rule.amenity is not None else values[match[:-1]]
+            row_position = unique_position[codes]
+            first = row_position < position
+            position[first] = row_position[first]
+            filled[first] = unique_amenity[codes[first]]
+        position[~missing] = -1
+        amenity = numpy.where(missing, filled, amenity)
+
+        codes, uniques = pd.factorize(amenity)
+        last = [self._last_group.get(value, (-1, 0)) for value in uniques] + [(-1, 0)]
+        last_position = numpy.array([item[0] for item in last], dtype=numpy.int32)
+        last_code = numpy.array([item[1] for item in last], dtype=numpy.int16)
+        row_last = last_position[codes]
+        group = numpy.where(row_last > position, last_code[codes], self._fill_groups[position])
+        if ranks:
+            return amenity, self._group_names[group], position
+        return amenity, self._group_names[group]
+
+
+engine = PoiRuleEngine(RULES)
@@ -1,10 +1,10 @@
 from warnings import warn
 
 import numpy
+import shapely
 from shapely.geometry import MultiPoint
-import pandas as pd
-from geopandas.array import from_shapely, points_from_xy
-from geopandas.geoseries import GeoSeries
+
+from spatialzosm.utils._allocate import allocate
 
 def normal(geom, size, rng=None):
     """
@@ -44,7 +44,8 @@ def normal(geom, size, rng=None):
         return MultiPoint()
 
     if geom.geom_type in ("Polygon", "MultiPolygon"):
-        return _normal_polygon(geom, size=size, generator=generator)
+        x, y, _ = _normal_polygons(numpy.array([geom], dtype=object), numpy.array([size]), generator)
+        return shapely.multipoints(numpy.column_stack([x, y]))
 
     if geom.geom_type in ("LineString", "MultiLineString"):
         return _normal_line(geom, size=size, generator=generator)
@@ -56,38 +57,268 @@ def normal(geom, size, rng=None):
     )
     return MultiPoint()
 
-#TODO: Normal line
 def _normal_line(geom, size, generator):
     """
     Sample points from an input shapely linestring
     """
-    fracs = generator.uniform(size=size)
-    return from_shapely(geom.interpolate(fracs, normalized=True)).unary_union()
-
-#Sample point within a polygon from the uniform distribution 
-def _normal_polygon(geom, size, generator):
-    """
-    Sample uniformly from within a polygon using batched sampling.
-    """
-    xmin, ymin, xmax, ymax = geom.bounds
-    xmean = geom.centroid.x
-    ymean = geom.centroid.y
-    mean = [xmean,ymean]
-    height = ymax-ymin
-    width = xmax-xmin
-    cov = numpy.maximum(width/6, height/6) ** 2
-    covmat = numpy.eye(2) *cov
-    #covmat = [[1, 0], [0, 1]]
-    candidates = []
-    while len(candidates) < size:
-        numb = generator.multivariate_normal(mean, covmat, size, method='eigh')
-        x,y = numpy.split(numb, 2, axis=1)
-        x=list(x[:,0])
-        y=list(y[:,0])
-        batch = points_from_xy(
-            x=x, #generator.uniform(xmin, xmax, size=size),
-            y=y, #generator.uniform(ymin, ymax, size=size),
-        )
-        valid_samples = batch[batch.sindex.query(geom, predicate="contains")]
-        candidates.extend(valid_samples)
-    return GeoSeries(candidates[:size]).unary_union
+    x, y, _ = _lines_xy(numpy.array([geom], dtype=object), numpy.array([size]), generator)
+    return shapely.multipoints(numpy.column_stack([x, y]))
+
+def line_xy(geoms, size, rng=None):
+    """
+
+    Sample points uniformly along many lines in one batched call.
+
+    Every line is repeated as many times as it has points and all the points
+    are interpolated at once at random fractions of the line lengths.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely LineString or MultiLineString
+        the lines along which to sample.
+
+    size : integer or array-like of integers
+        how many points to sample on every line.
+
+    Returns
+    -------
+    x, y : numpy.ndarray of the sampled coordinates
+    index : numpy.ndarray with the position in geoms of the source line of
+        every sampled point, points are grouped by line.
+    """
+    generator = numpy.random.default_rng(seed=rng)
+    geoms = numpy.asarray(geoms, dtype=object)
+    sizes = numpy.broadcast_to(numpy.asarray(size, dtype=numpy.int64), geoms.shape).copy()
+    sizes[~numpy.isin(shapely.get_type_id(geoms), (1, 2)) | shapely.is_empty(geoms)] = 0
+    return _lines_xy(geoms, sizes, generator)
+
+def _lines_xy(geoms, sizes, generator):
+    """
+    Interpolate sizes random points along every line.
+    """
+    index = numpy.repeat(numpy.arange(len(geoms)), sizes)
+    fracs = generator.uniform(size=len(index))
+    points = shapely.line_interpolate_point(geoms[index], fracs, normalized=True)
+    return shapely.get_x(points), shapely.get_y(points), index
+
+def normal_xy(geoms, size, rng=None):
+    """
+
+    Sample points around the centroids of many geometries in one batched call.
+
+    Polygons of all geometries are sampled together: candidates are drawn from
+    a normal distribution centred on each centroid and tested with prepared
+    point-in-polygon checks on the raw coordinates. Lines are sampled as in
+    normal(). Other geometry types get no points.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the shapes in which to sample.
+
+    size : integer or array-like of integers
+        how many points to sample in every geometry.
+
+    Returns
+    -------
+    x, y : numpy.ndarray of the sampled coordinates
+    index : numpy.ndarray with the position in geoms of every sampled point,
+        points are grouped by geometry in the order of geoms.
+    """
+    generator = numpy.random.default_rng(seed=rng)
+    geoms = numpy.asarray(geoms, dtype=object)
+    sizes = numpy.broadcast_to(numpy.asarray(size, dtype=numpy.int64), geoms.shape).copy()
+    sizes[shapely.is_missing(geoms) | shapely.is_empty(geoms)] = 0
+    type_id = shapely.get_type_id(geoms)
+    polygons = numpy.isin(type_id, (3, 6))
+    lines = numpy.isin(type_id, (1, 2))
+    if ((sizes > 0) & ~polygons & ~lines).any():
+        warn("Sampling is only supported for Polygon and LineString geometry types.", UserWarning, stacklevel=2)
+
+    polygon_x, polygon_y, polygon_index = _normal_polygons(geoms, numpy.where(polygons, sizes, 0), generator)
+    line_x, line_y, line_index = _lines_xy(geoms, numpy.where(lines, sizes, 0), generator)
+    x = numpy.concatenate([polygon_x, line_x])
+    y = numpy.concatenate([polygon_y, line_y])
+    index = numpy.concatenate([polygon_index, line_index])
+    order = numpy.argsort(index, kind='stable')
+    return x[order], y[order], index[order]
+
+#Sample points within polygons from a normal distribution around their centroids
+def _normal_polygons(geoms, sizes, generator, max_draws=2**24, max_stalls=20):
+    """
+    Sample from within polygons with batched, adaptively oversampled rejection.
+
+    Every round draws about 1.2 times the remaining points divided by the
+    acceptance rate observed so far for each polygon, capped at max_draws
+    candidates per round.
+    """
+    need = sizes.copy()
+    empty = numpy.empty(0)
+    if not need.any():
+        return empty, empty, numpy.empty(0, dtype=numpy.int64)
+    active = numpy.flatnonzero(need > 0)
+    shapely.prepare(geoms[active])
+    bounds = shapely.bounds(geoms)
+    #Only the polygons needing points have a centroid, empty ones would make get_x raise
+    centroids = shapely.centroid(geoms[active])
+    xmean = numpy.full(len(geoms), numpy.nan)
+    ymean = numpy.full(len(geoms), numpy.nan)
+    xmean[active] = shapely.get_x(centroids)
+    ymean[active] = shapely.get_y(centroids)
+    sigma = numpy.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1]) / 6
+    degenerate = (need > 0) & ~(sigma > 0)
+    if degenerate.any():
+        warn("Skipping {} degenerate polygons.".format(degenerate.sum()), UserWarning, stacklevel=3)
+        need[degenerate] = 0
+    #Observed acceptance counts, starting from a weak prior of one hit in two draws
+    drawn = numpy.full(len(geoms), 2.0)
+    hits = numpy.ones(len(geoms))
+    #Start from empty arrays, all the polygons needing points may be degenerate
+    xs, ys, owners = [empty], [empty], [numpy.empty(0, dtype=numpy.int64)]
+    stalls = 0
+    while need.any() and stalls < max_stalls:
+        active = numpy.flatnonzero(need > 0)
+        rate = hits[active] / drawn[active]
+        draws = numpy.ceil(need[active] * 1.2 / numpy.maximum(rate, 0.001)).astype(numpy.int64) + 8
+        if draws.sum() > max_draws:
+            draws = numpy.maximum(draws * max_draws // draws.sum(), 1)
+        owner = numpy.repeat(active, draws)
+        x = generator.normal(xmean[owner], sigma[owner])
+        y = generator.normal(ymean[owner], sigma[owner])
+        inside = shapely.contains_xy(geoms[owner], x, y)
+        drawn[active] += draws
+        hits += numpy.bincount(owner[inside], minlength=len(geoms))
+        #Keep the first accepted candidates of every polygon up to its remaining need
+        owner, x, y = owner[inside], x[inside], y[inside]
+        rank = numpy.arange(len(owner)) - numpy.searchsorted(owner, owner, side='left')
+        keep = rank < need[owner]
+        xs.append(x[keep])
+        ys.append(y[keep])
+        owners.append(owner[keep])
+        need -= numpy.bincount(owner[keep], minlength=len(geoms))
+        stalls = 0 if keep.any() else stalls + 1
+    if need.any():
+        warn("Could not sample {} points within their polygons.".format(need.sum()), UserWarning, stacklevel=3)
+    return numpy.concatenate(xs), numpy.concatenate(ys), numpy.concatenate(owners)
+
+class Triangulation:
+    """
+
+    Constrained triangulation of polygons for exact uniform sampling.
+
+    The triangles and their areas are computed once, so the same triangulation
+    can be sampled for any number of population scenarios. Sampling picks the
+    triangles of every polygon in proportion to their area and draws points
+    directly inside them, without rejection.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the polygons to triangulate. Other geometry types get no triangles.
+
+    Examples
+    --------
+    >>> from shapely.geometry import box
+    >>> triangulation = Triangulation([box(0,0,1,1)])
+    >>> x, y, index = triangulation.sample(102) # doctest: +SKIP
+    """
+
+    def __init__(self, geoms):
+        if not hasattr(shapely, 'constrained_delaunay_triangles'):
+            raise ImportError("Triangulated sampling requires shapely>=2.1")
+        geoms = numpy.asarray(geoms, dtype=object)
+        self.n_geoms = len(geoms)
+        polygons = numpy.where(numpy.isin(shapely.get_type_id(geoms), (3, 6)), geoms, None)
+        triangles, self.owner = shapely.get_parts(shapely.constrained_delaunay_triangles(polygons), return_index=True)
+        #Closed rings of 4 coordinates, the last one repeats the first vertex
+        self.vertices = shapely.get_coordinates(triangles).reshape(-1, 4, 2)[:, :3]
+        edges = self.vertices[:, 1:] - self.vertices[:, :1]
+        self.area = numpy.abs(edges[:, 0, 0] * edges[:, 1, 1] - edges[:, 0, 1] * edges[:, 1, 0]) / 2
+
+    def sample(self, size, rng=None):
+        """
+        Sample points uniformly within every polygon.
+
+        Parameters
+        ----------
+        size : integer or array-like of integers
+            how many points to sample in every polygon.
+
+        Returns
+        -------
+        x, y : numpy.ndarray of the sampled coordinates
+        index : numpy.ndarray with the position of the source polygon of every
+            sampled point, points are grouped by polygon.
+        """
+        generator = numpy.random.default_rng(seed=rng)
+        sizes = numpy.broadcast_to(numpy.asarray(size, dtype=numpy.int64), (self.n_geoms,))
+        per_triangle = allocate(self.owner, sizes, weights=self.area, rng=generator)
+        triangle = numpy.repeat(numpy.arange(len(self.owner)), per_triangle)
+        r1 = generator.random(len(triangle))
+        r2 = generator.random(len(triangle))
+        #Reflect the points falling in the other half of the parallelogram
+        flip = r1 + r2 > 1
+        r1[flip] = 1 - r1[flip]
+        r2[flip] = 1 - r2[flip]
+        a = self.vertices[triangle, 0]
+        b = self.vertices[triangle, 1]
+        c = self.vertices[triangle, 2]
+        points = a + r1[:, None] * (b - a) + r2[:, None] * (c - a)
+        return points[:, 0], points[:, 1], self.owner[triangle]
+
+    def subset(self, start, stop):
+        """
+        Triangulation of the polygons from position start to stop, without triangulating again.
+        """
+        lo, hi = numpy.searchsorted(self.owner, [start, stop])
+        subset = object.__new__(Triangulation)
+        subset.n_geoms = stop - start
+        subset.owner = self.owner[lo:hi] - start
+        subset.vertices = self.vertices[lo:hi]
+        subset.area = self.area[lo:hi]
+        return subset
+
+def sample_xy(geoms, size, method='uniform', rng=None, triangulation=None):
+    """
+
+    Sample points in many geometries with one of the sampling methods.
+
+    Lines are sampled along their length for the 'uniform' and 'normal'
+    methods. Polygons are sampled with GeoPandas for 'uniform', around their
+    centroids for 'normal' and from their triangulation for 'triangulated'.
+
+    Parameters
+    ----------
+    geoms : array-like of shapely geometries
+        the shapes in which to sample.
+
+    size : integer or array-like of integers
+        how many points to sample in every geometry.
+
+    method : str
+        'uniform', 'normal' or 'triangulated'.
+
+    triangulation : Triangulation, optional
+        precomputed triangulation of geoms for the 'triangulated' method.
+
+    Returns
+    -------
+    x, y : numpy.ndarray of the sampled coordinates
+    index : numpy.ndarray with the position in geoms of every sampled point.
+    """
+    generator = numpy.random.default_rng(seed=rng)
+    geoms = numpy.asarray(geoms, dtype=object)
+    if method in ('uniform', 'normal') and numpy.isin(shapely.get_type_id(geoms), (-1, 1, 2)).all():
+        return line_xy(geoms, size, generator)
+    if method == 'uniform':
+        from geopandas import GeoSeries
+        sampled = GeoSeries(geoms).sample_points(method=method, size=size, rng=generator)
+        coordinates, index = shapely.get_coordinates(numpy.asarray(sampled.values), return_index=True)
+        return coordinates[:, 0], coordinates[:, 1], index
+    if method == 'normal':
+        return normal_xy(geoms, size, generator)
+    if method == 'triangulated':
+        if triangulation is None:
+            triangulation = Triangulation(geoms)
+        return triangulation.sample(size, generator)
+    raise AttributeError(f"This module has no sampling method {method}.")
@@ -0,0 +1,95 @@
+import numpy
+
+""" module: shared download of OSM features for several tag sets """
+
+def merge_tags(*tag_sets):
+    """
+    Merge osmnx tag dicts. A key requested with True keeps True, otherwise the
+    values of all the sets are joined in a sorted list without duplicates.
+    """
+    merged = {}
+    for tags in tag_sets:
+        for key, value in tags.items():
+            if merged.get(key) is True or value is True:
+                merged[key] = True
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            merged[key] = sorted(set(merged.get(key, [])) | set(values))
+    return dict(sorted(merged.items()))
+
+def covers(tags, requested):
+    """ Whether a download of tags contains every feature matching requested """
+    for key, value in requested.items():
+        if key not in tags:
+            return False
+        if tags[key] is True:
+            continue
+        values = [value] if isinstance(value, str) else value
+        if value is True or not set(values) <= set(tags[key]):
+            return False
+    return True
+
+def select(features, tags):
+    """ Rows of features matching any of the tags, as osmnx would have returned them """
+    keep = numpy.zeros(len(features), dtype=bool)
+    for key, value in tags.items():
+        if key not in features.columns:
+            continue
+        column = features[key]
+        if value is True:
+            keep |= column.notna().to_numpy()
+        else:
+            keep |= column.isin([value] if isinstance(value, str) else value).to_numpy()
+    return features[keep]
+
+class FetchSession:
+    """
+
+    Download the features of a place once for all the tag sets requested.
+
+    The tag sets are merged (so that e.g. the several aeroway values of the
+    POIs are all kept) and downloaded in a single query the first time
+    features are needed. Later requests covered by that download are served
+    from memory by selecting the matching rows, so the POIs and the buildings
+    of a place share one Overpass query.
+
+    Parameters
+    ----------
+    download : callable
+        function downloading the features of the place for a tag dict.
+
+    tags : dict, optional
+        tag sets expected to be requested, merged into the first download.
+
+    Examples
+    --------
+    >>> session = FetchSession(lambda tags: ox.features_from_place('Dresden', tags), POI_TAGS) # doctest: +SKIP
+    >>> buildings = session.features({'building': True}) # doctest: +SKIP
+    """
+
+    def __init__(self, download, tags=None):
+        self._download = download
+        self.tags = merge_tags(tags or {})
+        self._features = None
+        self._downloaded = None
+
+    def request(self, tags):
+        """ Add a tag set to the next download """
+        self.tags = merge_tags(self.tags, tags)
+
+    def features(self, tags=None):
+        """
+        Features matching tags (all the downloaded features if None), downloading
+        the merged tag set if the current download does not cover them.
+        """
+        if tags is not None:
+            self.request(tags)
+        if self._features is None or not covers(self._downloaded, self.tags):
+            self._features = self._download(self.tags)
+            self._downloaded = self.tags
+        return self._features if tags is None else select(self._features, tags)
+
+    def clear(self):
+        """ Drop the downloaded features """
+        self._features = None
+        self._downloaded = None
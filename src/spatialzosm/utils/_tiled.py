@@ -0,0 +1,163 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import networkx as nx
+import numpy
+import osmnx as ox
+import pandas as pd
+import shapely
+
+from spatialzosm.utils._instrument import logger
+
+""" module: tiled, concurrent download of large places """
+
+#osmnx only exposes its errors in a private module, they are all ValueErrors
+InsufficientResponseError = getattr(getattr(ox, '_errors', None), 'InsufficientResponseError', ValueError)
+#Messages of the osmnx errors raised for an area without any data. Other errors (e.g. an Overpass answer that is not valid
+#JSON, which is also an InsufficientResponseError) are failures
+EMPTY_MESSAGES = ('No matching features', 'No data elements in server response', 'Found no graph nodes')
+
+class _EmptyTile(Exception):
+    """ A tile without any OSM data, raised through the cache so that it is not stored """
+
+def tile_polygon(polygon, tile_size):
+    """
+    Split a polygon into the parts falling in the cells of a square grid.
+
+    Parameters
+    ----------
+    polygon : shapely.Polygon or shapely.MultiPolygon
+
+    tile_size : float
+        side of the grid cells, in the units of the polygon.
+
+    Returns
+    -------
+    list of the non-empty intersections of the polygon with the grid cells.
+    """
+    west, south, east, north = polygon.bounds
+    xs = numpy.arange(west, east, tile_size)
+    ys = numpy.arange(south, north, tile_size)
+    x, y = (grid.ravel() for grid in numpy.meshgrid(xs, ys))
+    cells = shapely.box(x, y, numpy.minimum(x + tile_size, east), numpy.minimum(y + tile_size, north))
+    tiles = shapely.intersection(cells, polygon)
+    return [tile for tile in tiles if not tile.is_empty and tile.area > 0]
+
+class TiledDownloader:
+    """
+
+    Downloader fetching a place as a grid of tiles fetched concurrently.
+
+    Large places are split into tiles of tile_size degrees that are queried
+    on their own with a bounded thread pool, so one slow or failing query
+    does not sink the whole download. Failed tiles are retried on their own
+    with exponential backoff and, if a cache is given, every tile with data is
+    cached so a rerun only fetches the tiles that are missing or were empty. Features are merged and
+    deduplicated by OSM id; the street graphs of the tiles are fetched
+    unsimplified (including the edges crossing the tile borders), composed on
+    their OSM node ids and then simplified, like a single query would be.
+
+    Parameters
+    ----------
+    downloader : object, optional
+        object providing geocode_to_gdf, features_from_polygon and
+        graph_from_polygon. Default is None (osmnx).
+
+    tile_size : float, optional
+        side of the tiles in degrees. Default is 0.05 (about 5 km).
+
+    workers : int, optional
+        number of tiles fetched at a time. Default is 4.
+
+    retries : int, optional
+        number of times a failed tile is fetched again. Default is 3.
+
+    backoff : float, optional
+        seconds waited before the first retry, doubled at every retry.
+        Default is 1.
+
+    cache : OsmCache, optional
+        cache of the tiles. Default is None.
+
+    Examples
+    --------
+    >>> berlin = Osmpoi('Berlin, Germany', downloader=TiledDownloader(workers=8)) # doctest: +SKIP
+    """
+
+    def __init__(self, downloader=None, tile_size=0.05, workers=4, retries=3, backoff=1.0, cache=None):
+        self.downloader = ox if downloader is None else downloader
+        self.tile_size = tile_size
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+
+    @property
+    def __version__(self):
+        # Part of the cache key, the tiling changes the result at the tile borders
+        version = getattr(self.downloader, '__version__', type(self.downloader).__name__)
+        return '{}:tiled:{}'.format(version, self.tile_size)
+
+    def tiles(self, place):
+        """ Tiles of the polygon of a place name (or of a polygon) """
+        if isinstance(place, (shapely.Polygon, shapely.MultiPolygon)):
+            polygon = place
+        else:
+            polygon = shapely.union_all(self.downloader.geocode_to_gdf(place).geometry.values)
+        return tile_polygon(polygon, self.tile_size)
+
+    def __fetch_tile(self, function, tile, kwargs):
+        """
+        Fetch one tile, retried on its own. Tiles without any OSM data are None. They are not cached, as an Overpass answer cut short (e.g.
+        by its timeout) cannot be told apart from an empty area, so they are fetched again by the next run.
+        """
+        def fetch():
+            try:
+                return getattr(self.downloader, function)(tile, **kwargs)
+            except ValueError as e:
+                # osmnx raises ValueError (InsufficientResponseError for the features) for tiles without any data or street node
+                if any(message in str(e) for message in EMPTY_MESSAGES):
+                    raise _EmptyTile(str(e)) from e
+                raise
+        for attempt in range(self.retries + 1):
+            try:
+                if self.cache is None:
+                    return fetch()
+                version = getattr(self.downloader, '__version__', type(self.downloader).__name__)
+                return self.cache.get(self.cache.key(function, tile, version, **kwargs), fetch)
+            except _EmptyTile as e:
+                logger.info('No OSM data in tile %s: %s', tile.bounds, e)
+                return None
+            except LookupError:
+                # Offline cache misses are not retried
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def __fetch(self, function, place, **kwargs):
+        tiles = self.tiles(place)
+        with ThreadPoolExecutor(max(self.workers, 1)) as pool:
+            results = list(pool.map(lambda tile: self.__fetch_tile(function, tile, kwargs), tiles))
+        results = [result for result in results if result is not None]
+        if not results:
+            raise InsufficientResponseError(f"No OSM data was found in any tile of {place}.")
+        return results
+
+    def features_from_place(self, place, tags):
+        """ Features of a place matching tags, like osmnx.features_from_place """
+        features = pd.concat(self.__fetch('features_from_polygon', place, tags=tags))
+        # Features crossing tile borders are returned by every tile they touch
+        return features[~features.index.duplicated(keep='first')]
+
+    def graph_from_place(self, place, network_type='all', simplify=True, retain_all=False):
+        """ Street network of a place, like osmnx.graph_from_place """
+        graphs = self.__fetch('graph_from_polygon', place, network_type=network_type, simplify=False, retain_all=True,
+                              truncate_by_edge=True)
+        graph = nx.compose_all(graphs)
+        if simplify:
+            graph = ox.simplification.simplify_graph(graph)
+        if not retain_all:
+            graph = ox.truncate.largest_component(graph)
+        return graph
@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+
+""" module: chunked writer for sampled points """
+
+class PointWriter:
+    """
+
+    Append blocks of sampled points to a CSV or Parquet file.
+
+    The file is written block by block, so the points never need to be held in
+    memory all at once. Parquet output requires pyarrow.
+
+    Parameters
+    ----------
+    path : str
+        the file to write, it is overwritten.
+
+    format : str, optional
+        'csv' or 'parquet'. By default it is taken from the file extension.
+
+    Examples
+    --------
+    >>> with PointWriter('houses.csv') as writer: # doctest: +SKIP
+    ...     writer.write(block)
+    """
+
+    formats = ('csv', 'parquet')
+
+    def __init__(self, path, format=None):
+        if format is None:
+            format = 'parquet' if os.path.splitext(path)[1] in ('.parquet', '.pq') else 'csv'
+        if format not in self.formats:
+            raise ValueError(f"Unsupported output format {format}, use one of {self.formats}.")
+        self.path = path
+        self.format = format
+        self.rows = 0
+        self._parquet = None
+        self._columns = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, df):
+        """ Append a DataFrame of points, its index is not written """
+        if self.format == 'csv':
+            df.to_csv(self.path, mode='a' if self._columns is not None else 'w', header=self._columns is None, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            elif not table.schema.equals(self._parquet.schema):
+                # Blocks from different sources (e.g. copied from an earlier file) can differ in their column types
+                table = table.cast(self._parquet.schema)
+            self._parquet.write_table(table)
+        self._columns = list(df.columns)
+        self.rows += len(df)
+
+    def write_lines(self, columns, lines):
+        """ Append CSV lines (with their line endings) copied from a file with the given columns """
+        if self.format != 'csv':
+            raise ValueError("Only CSV lines can be copied.")
+        with open(self.path, 'a' if self._columns is not None else 'w') as file:
+            if self._columns is None:
+                file.write(','.join(columns) + '\n')
+            file.writelines(lines)
+        self._columns = list(columns)
+        self.rows += len(lines)
+
+    def close(self, columns=('x', 'y')):
+        """ Finish the file, an empty file with the given columns is written if no block was """
+        if self._columns is None:
+            self.write(pd.DataFrame({column: pd.Series(dtype=float) for column in columns}))
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
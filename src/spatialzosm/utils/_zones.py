@@ -0,0 +1,82 @@
+import numpy
+import shapely
+
+""" module: STRtree assignment of streets and buildings to zone units """
+
+class ZoneIndex:
+    """
+
+    Spatial index of the polygons of the zone units.
+
+    Features are assigned to zones with one bulk query of a shapely STRtree
+    instead of an overlay: polygons (buildings) by their centroid and lines
+    (streets) by their midpoint, or clipped at the zone borders.
+
+    Parameters
+    ----------
+    zones : geopandas.GeoDataFrame
+        the polygons of the zone units.
+
+    ids : array-like, optional
+        the id of every zone. Default is None (the index of zones).
+
+    Examples
+    --------
+    >>> index = ZoneIndex(districts, districts['district_id']) # doctest: +SKIP
+    >>> position = index.locate(buildings.geometry.values) # doctest: +SKIP
+    """
+
+    def __init__(self, zones, ids=None):
+        self.geometries = numpy.asarray(zones.geometry.values)
+        self.ids = numpy.asarray(zones.index if ids is None else ids)
+        self.crs = zones.crs
+        self.tree = shapely.STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def locate(self, geoms):
+        """
+        Position of the zone containing every feature, -1 if none does.
+
+        Lines are located by their midpoint (which lies on the line, unlike the
+        centroid of a curved street) and other geometries by their centroid. A
+        point on the border of several zones goes to the first of them.
+        """
+        geoms = numpy.asarray(geoms)
+        lines = numpy.isin(shapely.get_type_id(geoms), (1, 2, 5))
+        points = numpy.where(lines, shapely.line_interpolate_point(numpy.where(lines, geoms, None), 0.5, normalized=True),
+                             shapely.centroid(geoms))
+        feature, zone = self.tree.query(points, predicate='intersects')
+        position = numpy.full(len(geoms), -1, dtype=numpy.int64)
+        # Reversed so that the first zone of every feature is the one written last
+        position[feature[::-1]] = zone[::-1]
+        return position
+
+    def clip(self, geoms):
+        """
+        Split lines at the zone borders.
+
+        Returns
+        -------
+        feature : numpy.ndarray of int
+            the position of the line every piece comes from.
+        zone : numpy.ndarray of int
+            the position of the zone of every piece.
+        pieces : numpy.ndarray of shapely.LineString
+            the pieces of the lines inside every zone.
+        weight : numpy.ndarray of float
+            the share of the length of the line in every piece, so a line
+            split between zones weighs the same as a whole one.
+        """
+        geoms = numpy.asarray(geoms)
+        feature, zone = self.tree.query(geoms, predicate='intersects')
+        pieces = shapely.intersection(geoms[feature], self.geometries[zone])
+        # Intersections can be multi part or include points where a line only touches a zone
+        parts, part = shapely.get_parts(pieces, return_index=True)
+        keep = (shapely.get_type_id(parts) == 1) & (shapely.length(parts) > 0)
+        parts, part = parts[keep], part[keep]
+        feature, zone = feature[part], zone[part]
+        total = shapely.length(geoms)[feature]
+        weight = numpy.divide(shapely.length(parts), total, out=numpy.ones(len(parts)), where=total > 0)
+        return feature, zone, parts, weight
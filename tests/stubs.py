@@ -0,0 +1,91 @@
+""" Offline stand-ins for osmnx, counting their calls """
+import threading
+import time
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+
+import synthetic
+from spatialzosm.utils._tiled import InsufficientResponseError
+
+
+class StubDownloader:
+    """
+    Downloader serving a small synthetic city for any place. Places in broken raise ConnectionError, and
+    the first failures[tile] calls of a tile (by its bounds) fail too (with error, by default ConnectionError),
+    to exercise the retries. Tiles in empty have no OSM data, like osmnx they raise InsufficientResponseError.
+    """
+    __version__ = 'stub'
+
+    def __init__(self, broken=(), failures=None, delay=0.0, error=None, empty=()):
+        self.broken = set(broken)
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.error = error
+        self.empty = set(empty)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call(self, function, place):
+        with self.lock:
+            self.calls.append((function, str(place)))
+            key = tuple(np.round(place.bounds, 6)) if isinstance(place, shapely.Geometry) else place
+            failing = self.failures.get(key, 0)
+            if failing:
+                self.failures[key] = failing - 1
+        if self.delay:
+            time.sleep(self.delay)
+        if failing and self.error is not None:
+            raise self.error
+        if str(place) in self.broken or failing:
+            raise ConnectionError(f'Overpass is down for {place}')
+        if key in self.empty:
+            raise InsufficientResponseError('No matching features. Check query location, tags, and log.')
+
+    def count(self, function=None):
+        return sum(1 for call in self.calls if function is None or call[0] == function)
+
+    @staticmethod
+    def features(n=400):
+        """ POIs (points) and building footprints of the synthetic city, indexed like osmnx by element and id """
+        buildings = synthetic.buildings(n, 4).drop(columns='zone')
+        raw = synthetic.raw_pois(n)
+        points = gpd.GeoDataFrame(raw.drop(columns=['x', 'y']), geometry=gpd.points_from_xy(raw.x, raw.y), crs='EPSG:4326')
+        features = pd.concat([buildings, points], ignore_index=True)
+        features.index = pd.MultiIndex.from_arrays([np.where(np.arange(len(features)) < len(buildings), 'way', 'node'),
+                                                    np.arange(len(features))], names=['element', 'id'])
+        return features
+
+    @staticmethod
+    def graph(n=200):
+        streets = synthetic.grid_streets(n, 4)
+        graph = nx.MultiDiGraph(crs='EPSG:4326')
+        for i, row in enumerate(streets.itertuples()):
+            start, end = row.geometry.coords[0], row.geometry.coords[-1]
+            graph.add_node(start, x=start[0], y=start[1])
+            graph.add_node(end, x=end[0], y=end[1])
+            graph.add_edge(start, end, osmid=i, highway=row.highway, length=row.length, geometry=row.geometry)
+        return graph
+
+    def features_from_place(self, place, tags):
+        self.__call('features_from_place', place)
+        return self.features()
+
+    def graph_from_place(self, place, network_type='all', simplify=True, retain_all=False):
+        self.__call('graph_from_place', place)
+        return self.graph()
+
+    def geocode_to_gdf(self, place):
+        self.__call('geocode_to_gdf', place)
+        return gpd.GeoDataFrame(geometry=[shapely.box(0.0, 0.0, 0.2, 0.1)], crs='EPSG:4326')
+
+    def features_from_polygon(self, polygon, tags):
+        self.__call('features_from_polygon', polygon)
+        #One POI at the centre of every tile and one on the corner shared by all the tiles, returned by each of them
+        centre = polygon.centroid
+        return gpd.GeoDataFrame({'amenity': ['cafe', 'bank']}, geometry=[centre, shapely.Point(0.1, 0.05)], crs='EPSG:4326',
+                                index=pd.MultiIndex.from_tuples([('node', int(centre.x * 1e6) * 1000 + int(centre.y * 1e6)), ('node', 1)],
+                                                                names=['element', 'id']))
@@ -0,0 +1,94 @@
+import importlib.util
+import os
+
+import pytest
+
+import synthetic
+from spatialzosm import batch
+from spatialzosm.batch import STAGES, BatchRunner, Place
+from stubs import StubDownloader
+
+NAMES = ['Alpha town', 'Broken city', 'Gamma']
+
+
+@pytest.fixture
+def places(tmp_path):
+    zones, population = str(tmp_path / 'zones.gpkg'), str(tmp_path / 'population.csv')
+    synthetic.zone_units(4).to_file(zones)
+    synthetic.population(4, 200).to_csv(population)
+    return [Place(name, zones=zones, population=population) for name in NAMES]
+
+
+def run(places, tmp_path, downloader, **kwargs):
+    runner = BatchRunner(places, output=str(tmp_path / 'batch'), downloader=downloader, format='csv', seed=1, processes=False,
+                         callback=lambda *args: None, **kwargs)
+    return runner.run()
+
+
+def states(status, name):
+    return {stage: status[name, stage] for stage in STAGES}
+
+
+def test_failures_are_isolated(places, tmp_path):
+    stub = StubDownloader(broken=['Broken city'])
+    status = run(places, tmp_path, stub)
+    assert states(status, 'Alpha town') == dict.fromkeys(STAGES, 'done')
+    assert states(status, 'Gamma') == dict.fromkeys(STAGES, 'done')
+    assert states(status, 'Broken city') == {'fetch': 'failed', 'filter': 'blocked', 'streets': 'failed', 'buildings': 'blocked',
+                                             'sample': 'blocked'}
+    assert os.path.exists(tmp_path / 'batch' / 'Gamma' / 'houses.csv')
+    assert not os.path.exists(tmp_path / 'batch' / 'Broken_city' / 'checkpoints' / 'fetch.json')
+    #The POIs and the buildings of a place come from one download
+    assert stub.calls.count(('features_from_place', 'Alpha town')) == 1
+
+
+def test_resume_only_runs_the_missing_stages(places, tmp_path):
+    run(places, tmp_path, StubDownloader(broken=['Broken city']))
+    houses = tmp_path / 'batch' / 'Alpha_town' / 'houses.csv'
+    first = houses.read_text()
+    os.remove(tmp_path / 'batch' / 'Alpha_town' / 'checkpoints' / 'sample.json')
+    stub = StubDownloader()
+    status = run(places, tmp_path, stub)
+    assert states(status, 'Alpha town') == dict(dict.fromkeys(STAGES, 'resumed'), sample='done')
+    assert states(status, 'Gamma') == dict.fromkeys(STAGES, 'resumed')
+    assert states(status, 'Broken city') == dict.fromkeys(STAGES, 'done')
+    assert {place for _, place in stub.calls} == {'Broken city'}
+    assert houses.read_text() == first
+
+
+def test_restart_runs_every_stage_again(places, tmp_path):
+    run(places, tmp_path, StubDownloader())
+    stub = StubDownloader()
+    status = run(places, tmp_path, stub, restart=True)
+    assert set(status.values()) == {'done'}
+    assert {place for _, place in stub.calls} == set(NAMES)
+
+
+def test_default_format_needs_pyarrow(monkeypatch):
+    assert BatchRunner(['Alpha town'], stages=('fetch',)).options['format'] == 'parquet'
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name, *args: None if name == 'pyarrow' else find_spec(name, *args))
+    assert BatchRunner(['Alpha town'], stages=('fetch',)).options['format'] == 'csv'
+    assert BatchRunner(['Alpha town'], stages=('fetch',), format='feather').options['format'] == 'feather'
+
+
+def test_sample_workers_and_chunks_give_the_same_houses(places, tmp_path):
+    run(places[:1], tmp_path / 'one', StubDownloader())
+    run(places[:1], tmp_path / 'two', StubDownloader(), workers=2, chunk_size=50)
+    houses = [(tmp_path / run / 'batch' / 'Alpha_town' / 'houses.csv').read_text() for run in ('one', 'two')]
+    assert houses[0] == houses[1]
+
+
+def test_command_line_options_reach_the_runner(tmp_path, monkeypatch):
+    arguments = {}
+
+    class Runner:
+        def __init__(self, places, **kwargs):
+            arguments.update(kwargs)
+
+        def run(self):
+            return {}
+    monkeypatch.setattr(batch, 'BatchRunner', Runner)
+    (tmp_path / 'places.txt').write_text('Alpha town\n')
+    assert batch.main([str(tmp_path / 'places.txt'), '--stages', 'fetch', '--chunk-size', '5000', '--workers', '3', '--quiet']) == 0
+    assert arguments['chunk_size'] == 5000 and arguments['workers'] == 3
@@ -0,0 +1,105 @@
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+from spatialzosm.spatialize import Osmpoi
+from spatialzosm.utils import _cache
+from spatialzosm.utils._cache import OsmCache
+from stubs import StubDownloader
+
+
+def fetch_points(cache, downloader, records=None):
+    osmpoi = Osmpoi('Stub city', cache=cache, downloader=downloader, callback=None if records is None else records.append)
+    return osmpoi.fetch_osm_points()
+
+
+def test_miss_then_hit(tmp_path):
+    downloader = StubDownloader()
+    records = []
+    first = fetch_points(OsmCache(str(tmp_path)), downloader, records)
+    second = fetch_points(OsmCache(str(tmp_path)), downloader, records)
+    assert downloader.count() == 1
+    assert first.equals(second)
+    assert [record['source'] for record in records if record['stage'] == 'fetch_points'] == ['network', 'cache']
+
+
+def test_key_depends_on_the_query_not_the_order_of_arguments():
+    assert OsmCache.key('a', tags={'x': True}, n=1) == OsmCache.key('a', n=1, tags={'x': True})
+    assert OsmCache.key('a', tags={'x': True}) != OsmCache.key('b', tags={'x': True})
+
+
+def test_offline_miss_raises_lookup_error(tmp_path):
+    cache = OsmCache(str(tmp_path), offline=True)
+    calls = []
+    with pytest.raises(LookupError):
+        cache.get('missing', lambda: calls.append(1))
+    assert not calls
+    downloader = StubDownloader()
+    assert fetch_points(cache, downloader) is None
+    assert downloader.count() == 0
+
+
+def test_offline_hit(tmp_path):
+    downloader = StubDownloader()
+    fetch_points(OsmCache(str(tmp_path)), downloader)
+    assert fetch_points(OsmCache(str(tmp_path), offline=True), downloader) is not None
+    assert downloader.count() == 1
+
+
+def test_expired_entries_are_fetched_again(tmp_path):
+    cache = OsmCache(str(tmp_path), ttl=60)
+    cache.put('key', 'old')
+    assert cache.get('key', lambda: 'new') == 'old'
+    old = time.time() - 120
+    os.utime(tmp_path / 'key.pkl', (old, old))
+    assert 'key' not in cache
+    assert cache.get('key', lambda: 'new') == 'new'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    size = len(pickle.dumps('x' * 100, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = OsmCache(str(tmp_path), max_size=2 * size)
+    cache.put('a', 'x' * 100)
+    cache.put('b', 'x' * 100)
+    old = time.time() - 100
+    for name in ('a', 'b'):
+        os.utime(tmp_path / (name + '.pkl'), (old, old))
+    cache.get('a', None)
+    cache.put('c', 'x' * 100)
+    assert sorted(os.listdir(tmp_path)) == ['a.pkl', 'c.pkl']
+
+
+def test_concurrent_writers_of_the_same_key(tmp_path):
+    cache = OsmCache(str(tmp_path), max_size=10**6)
+    errors = []
+
+    def write(value):
+        try:
+            for _ in range(20):
+                cache.put('key', value)
+                cache.get('key', lambda: value)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(['value'] * 1000,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert os.listdir(tmp_path) == ['key.pkl']
+    assert cache.get('key', None) == ['value'] * 1000
+
+
+def test_entries_removed_by_another_writer_are_skipped(tmp_path, monkeypatch):
+    cache = OsmCache(str(tmp_path), max_size=1, ttl=3600)
+    cache.put('kept', 'value')
+    listdir = os.listdir
+    #Another writer evicted gone.pkl between the listing and the stat
+    monkeypatch.setattr(_cache.os, 'listdir', lambda path: listdir(path) + ['gone.pkl'])
+    cache.evict()
+    cache.clear()
+    assert listdir(tmp_path) == []
@@ -0,0 +1,14 @@
+import numpy
+import shapely
+
+from spatialzosm.utils._capacity import street_capacity
+from spatialzosm.utils._geo import METRES_PER_DEGREE as DEGREE
+
+
+def test_missing_lengths_are_measured_in_metres():
+    #At 60 degrees of latitude a degree of longitude is half a degree of latitude, as the osmnx lengths
+    lines = [shapely.LineString([(10.0, 60.0), (10.02, 60.0)]), shapely.LineString([(10.0, 60.0), (10.0, 60.01)])]
+    capacity = street_capacity(lines, [None, 'unknown'])
+    numpy.testing.assert_allclose(capacity, [0.01 * DEGREE, 0.01 * DEGREE], rtol=1e-4)
+    numpy.testing.assert_allclose(street_capacity(lines, ['5', None]), [5.0, 0.01 * DEGREE], rtol=1e-4)
+    numpy.testing.assert_allclose(street_capacity(lines, geographic=False), [0.02, 0.01])
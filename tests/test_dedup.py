@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from spatialzosm.spatialize import Osmpoi
+from spatialzosm.utils._dedup import _close_pairs
+
+
+def raw(features):
+    """ Raw POIs as returned by fetch_osm_points, with their points at the centroid of the geometry """
+    df = pd.DataFrame(features)
+    for column in ('amenity', 'name', 'building', 'landuse', 'shop', 'addr:housenumber'):
+        if column not in df.columns:
+            df[column] = np.nan
+    centroids = shapely.centroid(df['geometry'].to_numpy())
+    df['x'], df['y'] = shapely.get_x(centroids), shapely.get_y(centroids)
+    return df
+
+
+def filtered(df, **kwargs):
+    osmpoi = Osmpoi('Test')
+    osmpoi.save_filtered = False
+    return osmpoi.filter_osm_points(df, **kwargs)
+
+
+def test_landuse_area_keeps_the_features_inside():
+    features = [dict(geometry=shapely.box(13.70, 51.00, 13.71, 51.01), landuse='residential', name='Area')]
+    for i in range(5):
+        features.append(dict(geometry=shapely.box(13.701 + i * 0.001, 51.001, 13.7015 + i * 0.001, 51.0015), building='yes'))
+    for i in range(3):
+        features.append(dict(geometry=shapely.Point(13.701 + i * 0.001, 51.005), **{'addr:housenumber': str(i + 1)}))
+    df = raw(features)
+    assert len(filtered(df, deduplicate=False)) == 9
+    assert len(filtered(df)) == 9
+
+
+def test_node_inside_its_building_polygon():
+    df = raw([dict(geometry=shapely.box(13.70, 51.00, 13.7003, 51.0003), building='retail', name='Mall'),
+              dict(geometry=shapely.Point(13.7001, 51.0001), shop='supermarket', name='Super')])
+    result = filtered(df)
+    assert list(result['name']) == ['Super']
+    assert list(result['amenity']) == ['supermarket']
+
+
+def test_address_node_inside_house_keeps_the_node():
+    df = raw([dict(geometry=shapely.box(13.70, 51.00, 13.7002, 51.0002), building='yes', name='Footprint'),
+              dict(geometry=shapely.Point(13.7001, 51.0001), name='Entrance', **{'addr:housenumber': '4'})])
+    assert list(filtered(df)['name']) == ['Entrance']
+
+
+def test_building_with_several_candidates_is_kept():
+    df = raw([dict(geometry=shapely.box(13.70, 51.00, 13.701, 51.001), building='retail', name='Mall'),
+              dict(geometry=shapely.Point(13.7002, 51.0002), shop='bakery', name='Bakery'),
+              dict(geometry=shapely.Point(13.7008, 51.0008), shop='florist', name='Florist')])
+    assert sorted(filtered(df)['name']) == ['Bakery', 'Florist', 'Mall']
+
+
+def test_different_groups_are_not_duplicates():
+    df = raw([dict(geometry=shapely.box(13.70, 51.00, 13.7002, 51.0002), building='house', name='House'),
+              dict(geometry=shapely.Point(13.7001, 51.0001), shop='bakery', name='Bakery')])
+    assert sorted(filtered(df)['name']) == ['Bakery', 'House']
+
+
+def test_close_points_of_the_same_amenity():
+    df = raw([dict(geometry=shapely.Point(13.70, 51.0), amenity='cafe', name='First'),
+              dict(geometry=shapely.Point(13.70000001, 51.0), amenity='cafe', name='Second'),
+              dict(geometry=shapely.Point(13.7001, 51.0), amenity='cafe', name='Far')])
+    assert list(filtered(df)['name']) == ['First', 'Far']
+    assert len(filtered(df, duplicate_distance=10.0)) == 1
+
+
+def test_files_give_the_same_result(tmp_path):
+    pytest.importorskip('pyarrow')
+    import geopandas as gpd
+    df = raw([dict(geometry=shapely.box(13.70, 51.00, 13.7003, 51.0003), building='retail', name='Mall'),
+              dict(geometry=shapely.Point(13.7001, 51.0001), shop='supermarket', name='Super'),
+              dict(geometry=shapely.box(13.71, 51.00, 13.72, 51.01), landuse='residential', name='Area'),
+              dict(geometry=shapely.Point(13.715, 51.005), name='Number', **{'addr:housenumber': '1'})])
+    gdf = gpd.GeoDataFrame(df, geometry='geometry', crs=4326)
+    gdf.to_parquet(tmp_path / 'raw.parquet')
+    gdf.to_csv(tmp_path / 'raw.csv', index=False)
+    expected = list(filtered(df)['name'])
+    assert expected == ['Super', 'Area', 'Number']
+    assert list(filtered(str(tmp_path / 'raw.parquet'))['name']) == expected
+    assert list(filtered(str(tmp_path / 'raw.csv'), chunk_size=2)['name']) == expected
+
+
+def test_close_pairs_match_brute_force():
+    generator = np.random.default_rng(1)
+    X, Y = np.round(generator.random((2, 2000)) * 300, 1)
+    for distance in (0.5, 5.0, 50.0):
+        left, right = _close_pairs(X, Y, distance)
+        i, j = np.nonzero(np.triu(np.hypot(X[:, None] - X, Y[:, None] - Y) <= distance, 1))
+        assert set(zip(left, right)) == set(zip(i, j))
+        assert len(left) == len(set(zip(left, right)))
@@ -0,0 +1,31 @@
+import numpy
+import pandas as pd
+import shapely
+
+from spatialzosm.utils._geo import METRES_PER_DEGREE, line_lengths, project
+from spatialzosm.utils._poiindex import PoiIndex
+
+
+def test_line_lengths_in_metres():
+    lines = [shapely.LineString([(10.0, 60.0), (10.02, 60.0)]), shapely.LineString([(10.0, 60.0), (10.0, 60.01)]),
+             shapely.MultiLineString([[(0.0, 0.0), (0.0, 0.01)], [(5.0, 0.0), (5.0, 0.01)]]), None, shapely.LineString()]
+    expected = [0.01 * METRES_PER_DEGREE, 0.01 * METRES_PER_DEGREE, 0.02 * METRES_PER_DEGREE, 0.0, 0.0]
+    numpy.testing.assert_allclose(line_lengths(lines), expected, rtol=1e-4)
+
+
+def test_projection_matches_great_circle_distances():
+    generator = numpy.random.default_rng(0)
+    x, y = 10.0 + generator.uniform(-0.1, 0.1, 200), 60.0 + generator.uniform(-0.05, 0.05, 200)
+    X, Y = project(x, y, (10.0, 60.0))
+    planar = numpy.hypot(X[1:] - X[:-1], Y[1:] - Y[:-1])
+    sphere = line_lengths(shapely.linestrings(numpy.stack([numpy.stack([x[:-1], y[:-1]], -1), numpy.stack([x[1:], y[1:]], -1)], 1)))
+    numpy.testing.assert_allclose(planar, sphere, rtol=3e-3)
+
+
+def test_index_distances_in_metres():
+    #POIs 100 m north and 100 m east of the query, at 60 degrees of latitude
+    step = 100 / METRES_PER_DEGREE
+    pois = pd.DataFrame({'x': [10.0, 10.0 + 2 * step], 'y': [60.0 + step, 60.0], 'group': ['food', 'food']})
+    query, row, distance = PoiIndex.build(pois).radius([10.0], [60.0], 150)
+    assert sorted(row) == [0, 1]
+    numpy.testing.assert_allclose(distance, [100.0, 100.0], rtol=1e-3)
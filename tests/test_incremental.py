@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+import synthetic
+from spatialzosm.sampling import HouseSampler
+from spatialzosm.utils._incremental import IncrementalOutput
+
+
+def houses(path):
+    """ The houses of a file, in a canonical order """
+    df = pd.read_csv(path) if path.endswith('.csv') else pd.read_parquet(path)
+    df['zone'] = df['zone'].astype(str)
+    return df.sort_values(['zone', 'x', 'y'], kind='stable').reset_index(drop=True)
+
+
+def sample(kind, features, population, output, **kwargs):
+    create = HouseSampler().create_houses_buildings if kind == 'buildings' else HouseSampler().create_houses_streets
+    index = {'index_column': 'zone'} if kind == 'buildings' else {'index_col': 'zone'}
+    #The sampler resets the index of the frame it is given
+    return create(features.copy(), population, seed=7, output=output, format=output.rsplit('.', 1)[1], incremental=True, **index, **kwargs)
+
+
+@pytest.mark.parametrize('kind, format', [('buildings', 'csv'), ('buildings', 'parquet'), ('streets', 'csv')])
+def test_splice_equals_full_resample(tmp_path, kind, format):
+    features = synthetic.buildings(600, 4) if kind == 'buildings' else synthetic.grid_streets(300, 4)
+    population = synthetic.population(4, 2000)
+    output = str(tmp_path / ('houses.' + format))
+    sample(kind, features, population, output)
+    before = houses(output)
+    #One zone gains people and another one loses a feature
+    population.iloc[1] += 50
+    features = features.drop(features.index[(features['zone'] == 2).to_numpy()][:1])
+    sample(kind, features, population, output)
+    full = str(tmp_path / ('full.' + format))
+    sample(kind, features, population, full)
+    spliced = houses(output)
+    pd.testing.assert_frame_equal(spliced, houses(full))
+    unchanged = ['0', '3']
+    pd.testing.assert_frame_equal(spliced[spliced['zone'].isin(unchanged)].reset_index(drop=True),
+                                  before[before['zone'].isin(unchanged)].reset_index(drop=True))
+    assert (spliced['zone'] == '1').sum() == population.iloc[1]
+
+
+def test_unchanged_zones_keep_the_output(tmp_path):
+    features, population = synthetic.buildings(300, 4), synthetic.population(4, 1000)
+    output = str(tmp_path / 'houses.csv')
+    sample('buildings', features, population, output)
+    first = open(output).read()
+    sampler = HouseSampler()
+    sampler.create_houses_buildings(features.copy(), population, index_column='zone', seed=7, output=output, incremental=True)
+    assert open(output).read() == first
+    assert [record.get('rows_out') for record in sampler.run_report()['stages'] if record['stage'] == 'fingerprints'] == [0]
+
+
+def test_output_rewritten_by_a_full_run_is_resampled(tmp_path):
+    features, population = synthetic.buildings(300, 4), synthetic.population(4, 1000)
+    output, full = str(tmp_path / 'houses.csv'), str(tmp_path / 'full.csv')
+    sample('buildings', features, population, output)
+    #A run that is not incremental overwrites the output and leaves the fingerprints of the previous one
+    HouseSampler().create_houses_buildings(features.copy(), population, index_column='zone', seed=3, output=output)
+    sample('buildings', features, population, output)
+    sample('buildings', features, population, full)
+    pd.testing.assert_frame_equal(houses(output), houses(full))
+
+
+def test_output_modified_since_the_last_run_is_resampled(tmp_path):
+    features, population = synthetic.buildings(300, 4), synthetic.population(4, 1000)
+    output, full = str(tmp_path / 'houses.csv'), str(tmp_path / 'full.csv')
+    sample('buildings', features, population, output)
+    pd.read_csv(output).iloc[::2].to_csv(output, index=False)
+    sample('buildings', features, population, output)
+    sample('buildings', features, population, full)
+    pd.testing.assert_frame_equal(houses(output), houses(full))
+
+
+def test_output_without_zones_has_no_previous_run(tmp_path):
+    output = str(tmp_path / 'houses.csv')
+    pd.DataFrame({'x': [0.0], 'y': [0.0]}).to_csv(output, index=False)
+    incremental = IncrementalOutput(output, 'csv', 'zone')
+    incremental.plan(['a'], ['fingerprint'])
+    incremental.commit()
+    assert IncrementalOutput(output, 'csv', 'zone').previous == {}
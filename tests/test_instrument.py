@@ -0,0 +1,51 @@
+import tracemalloc
+
+import numpy
+
+from spatialzosm.utils import _instrument
+from spatialzosm.utils._instrument import Instrumentation
+
+MB = 2**20
+
+
+def test_stage_memory_is_the_growth_of_the_peak(monkeypatch):
+    #High-water marks of the process and of its finished workers, every stage raises them to the given values
+    marks = {False: 100.0, True: 0.0}
+    monkeypatch.setattr(_instrument, 'peak_memory', lambda children=False: marks[children])
+    instrumentation = Instrumentation(callback=lambda record: None)
+    for name, peak, workers in (('big', 300.0, 0.0), ('small', 300.0, 0.0), ('workers', 320.0, 500.0)):
+        with instrumentation.stage(name):
+            marks.update({False: peak, True: workers})
+    big, small, workers = instrumentation.records
+    assert (big['stage_mb'], big['peak_mb']) == (200.0, 300.0)
+    assert (small['stage_mb'], small['peak_mb']) == (0.0, 300.0)
+    assert (workers['stage_mb'], workers['workers_mb']) == (20.0, 500.0)
+    assert instrumentation.report()['workers_mb'] == 500.0
+
+
+def test_high_water_marks_are_available():
+    if _instrument.resource is not None:
+        assert _instrument.peak_memory() > 0
+        assert _instrument.peak_memory(children=True) >= 0
+
+
+def test_traced_memory_of_every_stage():
+    instrumentation = Instrumentation(callback=lambda record: None)
+    tracemalloc.start()
+    try:
+        with instrumentation.stage('outer'):
+            with instrumentation.stage('big'):
+                big = numpy.ones(20 * MB // 8)
+                del big
+            with instrumentation.stage('small'):
+                small = numpy.ones(MB // 8)
+                del small
+    finally:
+        tracemalloc.stop()
+    records = {record['stage']: record for record in instrumentation.records}
+    assert records['big']['traced_mb'] > 19
+    assert records['small']['traced_mb'] < 5
+    assert records['outer']['traced_mb'] >= records['big']['traced_mb']
+    with instrumentation.stage('untraced'):
+        pass
+    assert 'traced_mb' not in instrumentation.records[-1]
@@ -0,0 +1,76 @@
+import geopandas as gpd
+import pytest
+import shapely
+
+from spatialzosm.spatialize import Osmpoi
+from spatialzosm.utils import _localosm
+from spatialzosm.utils._localosm import OsmFile
+
+pytest.importorskip('osmium')
+
+INSIDE = shapely.box(0.0, 0.0, 0.01, 0.01)
+
+
+@pytest.fixture
+def extract(tmp_path):
+    """ Two cafes and a street inside INSIDE, a bank and a street outside """
+    nodes = [(1, 0.002, 0.002, 'cafe'), (2, 0.008, 0.008, 'cafe'), (3, 0.05, 0.05, 'bank'),
+             (4, 0.001, 0.005, None), (5, 0.009, 0.005, None), (6, 0.04, 0.05, None), (7, 0.06, 0.05, None)]
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">']
+    for id, x, y, amenity in nodes:
+        tag = f'<tag k="amenity" v="{amenity}"/>' if amenity else ''
+        lines.append(f'<node id="{id}" version="1" lat="{y}" lon="{x}">{tag}</node>')
+    for id, refs in ((10, (4, 5)), (11, (6, 7))):
+        lines.append(f'<way id="{id}" version="1">' + ''.join(f'<nd ref="{ref}"/>' for ref in refs)
+                     + '<tag k="highway" v="residential"/></way>')
+    lines.append('</osm>')
+    path = tmp_path / 'extract.osm'
+    path.write_text('\n'.join(lines))
+    return str(path)
+
+
+@pytest.fixture
+def geocoded(monkeypatch):
+    places = []
+
+    def geocode_to_gdf(place):
+        places.append(place)
+        return gpd.GeoDataFrame(geometry=[INSIDE], crs='EPSG:4326')
+    monkeypatch.setattr(_localosm.ox, 'geocode_to_gdf', geocode_to_gdf)
+    return places
+
+
+def test_places_are_geocoded_and_clipped(extract, geocoded):
+    osm = OsmFile(extract)
+    features = osm.features_from_place('Inside town', {'amenity': True})
+    graph = osm.graph_from_place('Inside town', retain_all=True)
+    assert sorted(features.index.get_level_values('id')) == [1, 2]
+    assert sorted(graph.nodes) == [4, 5]
+    assert geocoded == ['Inside town']
+
+
+def test_polygons_are_not_geocoded(extract, geocoded):
+    features = OsmFile(extract).features_from_place(shapely.box(0.0, 0.0, 0.005, 0.005), {'amenity': True})
+    assert list(features.index.get_level_values('id')) == [1]
+    assert not geocoded
+
+
+def test_whole_extract_without_geocoding(extract, geocoded):
+    osm = OsmFile(extract, geocode=False)
+    with pytest.warns(UserWarning, match='ignored'):
+        features = osm.features_from_place('Inside town', {'amenity': True})
+    assert sorted(features.index.get_level_values('id')) == [1, 2, 3]
+    assert not geocoded
+
+
+def test_the_area_is_part_of_the_cache_key(extract):
+    versions = {OsmFile(extract).__version__, OsmFile(extract, geocode=False).__version__, OsmFile(extract, polygon=INSIDE).__version__}
+    assert len(versions) == 3
+
+
+def test_downloads_are_recorded_as_extract(extract, tmp_path):
+    records = []
+    for _ in range(2):
+        osmpoi = Osmpoi('Inside town', cache=str(tmp_path / 'cache'), downloader=OsmFile(extract, polygon=INSIDE), callback=records.append)
+        assert len(osmpoi.fetch_osm_points()) == 2
+    assert [record['source'] for record in records] == ['extract', 'cache']
@@ -0,0 +1,37 @@
+import numpy
+import pandas as pd
+import pytest
+
+import synthetic
+from spatialzosm.sampling import HouseSampler
+from spatialzosm.utils._parallel import iter_partitions, partition_bounds, sample_partitions
+
+
+@pytest.mark.parametrize('method', ['uniform', 'triangulated'])
+def test_buildings_do_not_depend_on_workers(method):
+    buildings, population = synthetic.buildings(800, 9), synthetic.population(9, 3000)
+    results = [HouseSampler().create_houses_buildings(buildings.copy(), population, index_column='zone', method=method, seed=3, workers=workers,
+                                                      save_file=False, chunk_size=500)
+               for workers in (1, 4)]
+    assert len(results[0]) == population.sum()
+    pd.testing.assert_frame_equal(results[0], results[1])
+
+
+def test_streets_do_not_depend_on_workers():
+    streets, population = synthetic.grid_streets(400, 9), synthetic.population(9, 3000)
+    results = [HouseSampler().create_houses_streets(streets.copy(), population, index_col='zone', seed=3, workers=workers, save_file=False)
+               for workers in (1, 4)]
+    pd.testing.assert_frame_equal(results[0], results[1])
+
+
+def test_partitions_do_not_depend_on_workers_nor_blocks():
+    buildings = synthetic.buildings(500, 16).sort_values('zone', kind='stable')
+    bounds = partition_bounds(buildings['zone'])
+    size = numpy.random.default_rng(0).integers(0, 5, len(buildings))
+    geoms = buildings.geometry.values
+    x, y, index = sample_partitions(geoms, size, bounds, seed=11, workers=1)
+    assert len(x) == size.sum()
+    for workers, chunk_size in ((4, None), (4, 100), (1, 37)):
+        blocks = list(iter_partitions(geoms, size, bounds, seed=11, workers=workers, chunk_size=chunk_size))
+        for expected, arrays in zip((x, y, index), zip(*blocks)):
+            numpy.testing.assert_array_equal(numpy.concatenate(arrays), expected)
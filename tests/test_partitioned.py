@@ -0,0 +1,80 @@
+import os
+
+import pandas as pd
+import pytest
+
+import synthetic
+from spatialzosm.sampling import HouseSampler
+from spatialzosm.utils._partitioned import read_batches, zone_frames
+
+ZONES = 9
+
+
+@pytest.fixture
+def buildings():
+    """ Buildings sorted by zone, about 170 per zone """
+    return synthetic.buildings(1500, ZONES).sort_values('zone', kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture
+def population():
+    return synthetic.population(ZONES, 3000)
+
+
+def houses(blocks):
+    """ The houses of the blocks, grouped by zone in the order they were sampled in every zone """
+    df = pd.concat(list(blocks), ignore_index=True)
+    df['zone'] = df['zone'].astype(int)
+    return df.sort_values('zone', kind='stable').reset_index(drop=True)
+
+
+def sample(features, population, **kwargs):
+    return houses(HouseSampler().iter_houses(features, population, zone_column='zone', seed=5, **kwargs))
+
+
+def write_hive(buildings, path):
+    for zone, part in buildings.groupby('zone'):
+        os.makedirs(os.path.join(path, f'zone={zone}'))
+        part.drop(columns='zone').to_parquet(os.path.join(path, f'zone={zone}', 'part.parquet'))
+    return path
+
+
+def test_same_houses_for_any_partitioning(buildings, population, tmp_path):
+    path = str(tmp_path / 'buildings.parquet')
+    buildings.to_parquet(path)
+    expected = sample(path, population)
+    assert len(expected) == population.sum()
+    pd.testing.assert_frame_equal(sample(path, population, batch_size=37), expected)
+    pd.testing.assert_frame_equal(sample(path, population, workers=2, chunk_size=100), expected)
+    pd.testing.assert_frame_equal(sample(write_hive(buildings, str(tmp_path / 'hive')), population, batch_size=50), expected)
+    pd.testing.assert_frame_equal(sample(iter([buildings.iloc[:400], buildings.iloc[400:]]), population), expected)
+    #The zones in another order, each with its rows in the same order
+    reverse = pd.concat([part for _, part in buildings.groupby('zone')][::-1])
+    pd.testing.assert_frame_equal(sample(iter([reverse]), population), expected)
+
+
+def test_exact_population_of_every_zone(buildings, population, tmp_path):
+    path = str(tmp_path / 'buildings.feather')
+    buildings.to_feather(path)
+    counts = sample(path, population, batch_size=64, weights='capacity')['zone'].value_counts()
+    pd.testing.assert_series_equal(counts.reindex(population.index, fill_value=0), population.astype(counts.dtype), check_names=False)
+
+
+def test_zones_must_be_contiguous(buildings, population, tmp_path):
+    path = str(tmp_path / 'buildings.parquet')
+    buildings.sample(frac=1, random_state=0).to_parquet(path)
+    with pytest.raises(ValueError, match='contiguous'):
+        sample(path, population, batch_size=100)
+
+
+def test_zones_spanning_batches_are_held_back(buildings, tmp_path):
+    path = str(tmp_path / 'buildings.parquet')
+    buildings.to_parquet(path)
+    frames = list(zone_frames(read_batches(path, columns=['zone'], batch_size=37), 'zone'))
+    #Every zone is in one frame only, whole and in the order of the file
+    zones = [set(frame['zone']) for frame in frames]
+    assert sum(map(len, zones)) == ZONES
+    merged = pd.concat(frames, ignore_index=True)
+    assert list(merged['zone']) == list(buildings['zone'])
+    assert list(merged['geometry']) == list(buildings.geometry)
+    assert list(merged.columns) == ['zone', 'geometry']
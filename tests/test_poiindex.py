@@ -0,0 +1,100 @@
+import geopandas as gpd
+import numpy
+import pandas as pd
+import pytest
+import shapely
+
+from spatialzosm.utils._poiindex import PoiIndex, _project
+
+GROUPS = ['food', 'health', 'education']
+
+
+@pytest.fixture(scope='module')
+def pois():
+    """ 5000 POIs of groups of very different densities, a dense cluster, and rows without group or coordinates """
+    generator = numpy.random.default_rng(0)
+    n = 5000
+    x = 13.70 + generator.random(n) * 0.1
+    y = 51.00 + generator.random(n) * 0.06
+    cluster = generator.random(n) < 0.3
+    x[cluster] = 13.75 + generator.normal(0, 0.002, cluster.sum())
+    y[cluster] = 51.03 + generator.normal(0, 0.002, cluster.sum())
+    group = generator.choice(GROUPS, n, p=[0.85, 0.14, 0.01]).astype(object)
+    group[generator.random(n) < 0.02] = None
+    x[generator.random(n) < 0.01] = numpy.nan
+    return pd.DataFrame({'x': x, 'y': y, 'group': group})
+
+
+@pytest.fixture(scope='module')
+def queries():
+    generator = numpy.random.default_rng(1)
+    #Points in the area of the POIs and around it
+    return 13.68 + generator.random(300) * 0.14, 50.98 + generator.random(300) * 0.1
+
+
+def brute(index, pois, qx, qy, groups):
+    """ Distance in metres from every query point to every POI of the groups, inf for the other POIs """
+    X, Y = _project(pois['x'].to_numpy(), pois['y'].to_numpy(), index.meta)
+    QX, QY = _project(qx, qy, index.meta)
+    distance = numpy.hypot(QX[:, None] - X[None, :], QY[:, None] - Y[None, :])
+    member = pois['group'].isin(groups).to_numpy() & numpy.isfinite(X)
+    distance[:, ~member] = numpy.inf
+    return distance
+
+
+@pytest.mark.parametrize('group', ['food', 'education', ['health', 'education'], None])
+@pytest.mark.parametrize('k, max_distance', [(1, numpy.inf), (5, numpy.inf), (60, numpy.inf), (5, 300.0)])
+def test_knn_matches_brute_force(pois, queries, group, k, max_distance):
+    index = PoiIndex.build(pois)
+    groups = GROUPS if group is None else [group] if isinstance(group, str) else group
+    distance = brute(index, pois, *queries, groups)
+    order = numpy.argsort(distance, axis=1)[:, :k]
+    expected = numpy.take_along_axis(distance, order, axis=1)
+    missing = ~numpy.isfinite(expected) | (expected > max_distance)
+    expected[missing] = numpy.inf
+    rows, found = index.knn(*queries, k=k, group=group, max_distance=max_distance)
+    numpy.testing.assert_allclose(found, expected)
+    numpy.testing.assert_array_equal(rows, numpy.where(missing, -1, order))
+
+
+@pytest.mark.parametrize('group', ['health', ['food', 'education'], None])
+def test_radius_matches_brute_force(pois, queries, group):
+    index = PoiIndex.build(pois)
+    groups = GROUPS if group is None else [group] if isinstance(group, str) else group
+    distance = brute(index, pois, *queries, groups)
+    query, row = numpy.nonzero(distance <= 250)
+    order = numpy.lexsort((distance[query, row], query))
+    found = index.radius(*queries, 250, group=group)
+    numpy.testing.assert_array_equal(found[0], query[order])
+    numpy.testing.assert_array_equal(found[1], row[order])
+    numpy.testing.assert_allclose(found[2], distance[query, row][order])
+
+
+def test_within_and_locate(pois):
+    index = PoiIndex.build(pois)
+    polygon = shapely.Point(13.75, 51.03).buffer(0.01)
+    grouped = pois['group'].notna().to_numpy() & numpy.isfinite(pois['x'].to_numpy())
+    inside = shapely.contains_xy(polygon, pois['x'].to_numpy(), pois['y'].to_numpy())
+    numpy.testing.assert_array_equal(index.within(polygon), numpy.flatnonzero(inside & grouped))
+    health = (pois['group'] == 'health').to_numpy()
+    numpy.testing.assert_array_equal(index.within(polygon, group='health'), numpy.flatnonzero(inside & health))
+    zones = gpd.GeoDataFrame({'name': ['west', 'east']}, geometry=[shapely.box(13.70, 51.0, 13.75, 51.06), shapely.box(13.75, 51.0, 13.78, 51.06)],
+                             crs='EPSG:4326')
+    located = index.locate(zones, ids=zones['name'], size=len(pois))
+    expected = pd.Series(numpy.nan, index=pois.index, dtype=object)
+    for name, box in zip(zones['name'], zones.geometry):
+        expected[grouped & shapely.contains_xy(box, pois['x'].to_numpy(), pois['y'].to_numpy())] = name
+    pd.testing.assert_series_equal(located.fillna(numpy.nan), expected.infer_objects().fillna(numpy.nan), check_dtype=False)
+
+
+def test_memory_mapped_reload(pois, queries, tmp_path):
+    index = PoiIndex.build(pois)
+    index.save(str(tmp_path / 'index'))
+    loaded = PoiIndex.load(str(tmp_path / 'index'), mmap=True)
+    assert isinstance(loaded.X, numpy.memmap) and len(loaded) == len(index)
+    for a, b in zip(index.knn(*queries, k=3), loaded.knn(*queries, k=3)):
+        numpy.testing.assert_array_equal(a, b)
+    for a, b in zip(index.radius(*queries, 200, group=['food', 'health']), loaded.radius(*queries, 200, group=['food', 'health'])):
+        numpy.testing.assert_array_equal(a, b)
+    polygon = shapely.box(13.72, 51.01, 13.76, 51.04)
+    numpy.testing.assert_array_equal(index.within(polygon), loaded.within(polygon))
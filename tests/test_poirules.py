@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+from spatialzosm.utils._poirules import RULES, Fill, engine
+
+#Lists of the original sequential classifier of filter_osm_points
+AERODROME = ['aerodrome', 'hangar', 'heliport', 'terminal']
+SUSTENANCE = ['bar', 'biergarten', 'cafe', 'fast_food', 'food_court', 'ice_cream', 'pub', 'restaurant']
+CRAFT = ['agricultural_engines', 'atelier', 'bakery', 'basket_maker', 'beekeeper', 'blacksmith', 'boatbuilder', 'bookbinder', 'brewery',
+         'builder', 'cabinet_maker', 'candlemaker', 'car_painter', 'carpenter', 'carpet_layer', 'caterer', 'chimney_sweeper', 'cleaning',
+         'clockmaker', 'confectionery', 'cooper', 'dental_technician', 'distillery', 'door_construction', 'dressmaker', 'electronics_repair',
+         'embroiderer', 'electrician', 'engraver', 'fence_maker', 'floorer', 'fruit_press', 'gardener', 'glaziery', 'goldsmith',
+         'grinding_mill', 'handicraft', 'hvac', 'insulation', 'interior_decorator', 'interior_work', 'jeweller', 'joiner', 'key_cutter',
+         'locksmith', 'metal_construction', 'mint', 'musical_instrument', 'oil_mill', 'optician', 'organ_builder', 'painter',
+         'parquet_layer', 'paver', 'photographer', 'photographic_laboratory', 'piano_tuner', 'plasterer', 'plumber', 'pottery', 'printer',
+         'printmaker', 'rigger', 'roofer', 'saddler', 'sailmaker', 'sawmill', 'scaffolder', 'sculptor', 'shoemaker', 'signmaker',
+         'stand_builder', 'stonemason', 'stove_fitter', 'sun_protection', 'tailor', 'tiler', 'tinsmith', 'toolmaker', 'turner',
+         'upholsterer', 'watchmaker', 'water_well_drilling', 'window_construction', 'winery']
+EDUCATION = ['college', 'driving_school', 'kindergarten', 'language_school', 'library', 'toy_library', 'training', 'music_school', 'school',
+             'university']
+TRANSPORTATION = ['bicycle_parking', 'bicycle_repair_station', 'bicycle_rental', 'boat_rental', 'boat_sharing', 'bus_station', 'car_rental',
+                  'car_sharing', 'car_wash', 'compressed_air', 'vehicle_inspection', 'charging_station', 'ferry_terminal', 'fuel',
+                  'motorcycle_parking', 'parking', 'parking_entrance', 'taxi', 'train_station']
+ENTERTAINMENT = ['arts_centre', 'brothel', 'casino', 'cinema', 'community_centre', 'conference_centre', 'events_venue', 'exhibition_centre',
+                 'fountain', 'gambling', 'love_hotel', 'music_venue', 'nightclub', 'planetarium', 'public_bookcase', 'social_centre',
+                 'stripclub', 'studio', 'swingerclub', 'theatre']
+FACILITIES = ['bbq', 'bench', 'dog_toilet', 'dressing_room', 'drinking_water', 'give_box', 'mailroom', 'parcel_locker', 'shelter', 'shower',
+              'telephone', 'toilets', 'water_point', 'watering_place']
+HEALTHCARE = ['baby_hatch', 'clinic', 'dentist', 'doctors', 'hospital', 'nursing_home', 'pharmacy', 'social_facility', 'veterinary']
+HISTORIC = ['aircraft_wreck', 'archaeological_site', 'battlefield', 'building', 'bunker', 'creamery', 'farm', 'manor', 'monastery', 'ruins']
+OTHERS = ['animal_boarding', 'animal_breeding', 'animal_shelter', 'baking_oven', 'childcare', 'clock', 'crematorium', 'dive_centre',
+          'funeral_hall', 'grave_yard', 'hunting_stand', 'internet_cafe', 'kitchen', 'kneipp_water_cure', 'lounger', 'marketplace',
+          'monastery', 'photo_booth', 'place_of_mourning', 'public_bath', 'refugee_site', 'vending_machine']
+PUBLIC_SERVICE = ['courthouse', 'fire_station', 'government', 'police', 'post_box', 'post_depot', 'post_office', 'public', 'prison',
+                  'ranger_station', 'townhall']
+RELIGIOUS_BUILDINGS = ['cathedral', 'chapel', 'church', 'kingdom_hall', 'monastery', 'mosque', 'presbytery', 'religious', 'shrine',
+                       'synagogue', 'temple']
+SPORT_BUILDINGS = ['grandstand', 'pavilion', 'riding_hall', 'sports_hall', 'sports_centre', 'stadium']
+WASTE = ['sanitary_dump_station', 'recycling', 'waste_basket', 'waste_disposal', 'waste_transfer_station']
+ACCOMODATION = ['apartments', 'barracks', 'bungalow', 'cabin', 'detached', 'dormitory', 'farm', 'ger', 'house', 'houseboat',
+                'semidetached_house', 'shed', 'static_caravan', 'stilt_house', 'terrace', 'tree_house']
+RETAIL = ['commercial', 'industrial', 'kiosk', 'retail', 'supermarket']
+LANDUSE = ['farmland', 'farmyard', 'forest', 'grass', 'greenhouse', 'greenhouse_horticulture', 'orchard', 'plant_nuersey', 'recreation_ground']
+
+
+def baseline_classify(df):
+    """
+    The sequential classifier that PoiRuleEngine replaced: one boolean mask per rule, applied in order.
+    Returns the amenity, the group and the number of the fill step that set the amenity (-1 for an amenity tag,
+    the number of fill steps if none did).
+    """
+    df = df.reset_index(drop=True).copy()
+    df['amenity'] = df['amenity'].astype(object)
+    df['group'] = ''
+    step = np.full(len(df), -1)
+    steps = []
+
+    def tag(column):
+        return df[column] if column in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+
+    def fill(column, values=None, amenity=None, group=None):
+        steps.append(column)
+        mask = df['amenity'].isnull() & (tag(column).notnull() if values is None else tag(column).isin(values))
+        if group is not None:
+            df.loc[mask, 'group'] = group
+        df.loc[mask, 'amenity'] = tag(column)[mask] if amenity is None else amenity
+        step[mask.to_numpy()] = len(steps) - 1
+
+    def group(name, amenities):
+        df.loc[df['amenity'].isin(amenities), 'group'] = name
+
+    fill('aeroway')
+    group('aeroway', AERODROME)
+    fill('cuisine', amenity='restaurant')
+    group('sustenance', SUSTENANCE)
+    fill('craft')
+    group('craft', CRAFT)
+    fill('building', ['school', 'college', 'kindergarten', 'university'])
+    group('education', EDUCATION)
+    fill('public_transport', amenity='bus_station')
+    fill('building', ['train_station', 'transportation'], amenity='train_station')
+    group('transportation', TRANSPORTATION)
+    group('entertainment', ENTERTAINMENT)
+    fill('building', ['toilets'])
+    group('facilities', FACILITIES)
+    group('financial', ['atm', 'bank', 'bureau_de_change'])
+    fill('healthcare', amenity='doctors')
+    fill('social_facility', amenity='social_facility')
+    fill('building', ['hospital'])
+    group('healthcare', HEALTHCARE)
+    fill('building', ['castle'])
+    fill('historic')
+    group('historic', HISTORIC)
+    fill('leisure', group='leisure')
+    fill('office', group='office')
+    fill('building', ['office'], amenity='administrative')
+    group('office', ['administrative'])
+    fill('landuse', ['cemetery'], amenity='grave_yard')
+    group('others', OTHERS)
+    fill('building', ['fire_station', 'government', 'public'])
+    group('public_service', PUBLIC_SERVICE)
+    fill('building', RELIGIOUS_BUILDINGS, amenity='place_of_worship')
+    fill('landuse', ['religious'], amenity='place_of_worship')
+    group('religious', ['place_of_worship'])
+    fill('shop', group='shop')
+    fill('building', SPORT_BUILDINGS, group='sport')
+    fill('sport', group='sport')
+    fill('building', ['hotel'], group='tourism')
+    #The original filled the amenity before checking it for the tourism group, so no group was set
+    fill('tourism')
+    group('waste_management', WASTE)
+    fill('building', ['residential'], amenity='house')
+    fill('building', ACCOMODATION)
+    fill('building', RETAIL)
+    group('accomodation', ACCOMODATION + ['residential'])
+    fill('landuse', ['residential'], amenity='house')
+    fill('landuse', ['commercial', 'industrial', 'retail'])
+    group('shop', RETAIL)
+    fill('landuse', LANDUSE)
+    group('landuse', LANDUSE)
+    fill('addr:housenumber', amenity='house')
+    fill('addr:housename', amenity='house')
+    fill('building', ['yes'], amenity='house')
+    group('accomodation', ['house'])
+    step[df['amenity'].isnull().to_numpy()] = len(steps)
+    return df['amenity'].to_numpy(dtype=object), df['group'].to_numpy(dtype=object), step
+
+
+def random_tags(n, seed=0):
+    """ Raw POIs with every tag column of the rules, mostly empty, drawing from the values of the rules and unknown ones """
+    generator = np.random.default_rng(seed)
+    vocabulary = ['yes', 'unknown', 'building', 'residential', 'retail', 'religious', 'cemetery', 'hotel', 'house', 'office', 'farm',
+                  'monastery', 'toilets', 'hospital', 'school'] + RETAIL + LANDUSE + SPORT_BUILDINGS + ACCOMODATION[:5] + SUSTENANCE[:3]
+    vocabulary += HEALTHCARE[:3] + EDUCATION[:3] + PUBLIC_SERVICE[:3] + RELIGIOUS_BUILDINGS[:3] + CRAFT[:5] + AERODROME + WASTE[:2]
+    columns = ['amenity'] + engine.columns
+    data = {}
+    for column in columns:
+        values = generator.choice(vocabulary, n).astype(object)
+        values[generator.random(n) > (0.1 if column == 'amenity' else 0.15)] = np.nan
+        data[column] = values
+    return pd.DataFrame(data)
+
+
+def engine_steps(rank):
+    """ Fill step of every rank of PoiRuleEngine.classify """
+    positions = [position for position, rule in enumerate(RULES) if isinstance(rule, Fill)]
+    lookup = {position: step for step, position in enumerate(positions)}
+    lookup.update({-1: -1, engine.n_rules: len(positions)})
+    return np.array([lookup[value] for value in rank])
+
+
+def assert_same(df):
+    amenity, group, rank = engine.classify(df, ranks=True)
+    expected_amenity, expected_group, expected_step = baseline_classify(df)
+    assert list(pd.Series(amenity).fillna('<NA>')) == list(pd.Series(expected_amenity).fillna('<NA>'))
+    assert list(group) == list(expected_group)
+    assert list(engine_steps(rank)) == list(expected_step)
+
+
+def test_same_as_sequential_masks():
+    assert_same(random_tags(20000))
+
+
+def test_same_with_categorical_and_missing_columns():
+    df = random_tags(5000, seed=1)
+    for column in engine.columns[::2]:
+        df[column] = df[column].astype('category')
+    assert_same(df.drop(columns=['landuse', 'addr:housename']))
+
+
+def test_fill_order_of_houses():
+    df = pd.DataFrame({'amenity': [np.nan] * 5,
+                       'landuse': ['residential', np.nan, np.nan, np.nan, 'retail'],
+                       'addr:housenumber': ['1', '2', np.nan, np.nan, '5'],
+                       'addr:housename': ['A', 'B', 'C', np.nan, np.nan],
+                       'building': ['yes'] * 5})
+    assert_same(df)
+    amenity, group, rank = engine.classify(df, ranks=True)
+    assert list(amenity) == ['house', 'house', 'house', 'house', 'retail']
+    assert list(group) == ['accomodation'] * 4 + ['shop']
+    #landuse before addr:housenumber before addr:housename before building=yes
+    assert rank[0] < rank[1] < rank[2] < rank[3]
+    assert list(engine.generic(rank)) == [True] * 5
+    assert not engine.generic(engine.classify(pd.DataFrame({'amenity': ['cafe'], 'building': ['yes']}), ranks=True)[2])[0]
+
+
+def test_filter_keeps_the_classified_pois():
+    from spatialzosm.spatialize import Osmpoi
+    df = random_tags(3000, seed=2)
+    generator = np.random.default_rng(2)
+    df['x'], df['y'] = generator.random((2, len(df)))
+    df['name'] = np.arange(len(df)).astype(str)
+    df['highway'] = np.where(generator.random(len(df)) < 0.1, 'footway', None)
+    osmpoi = Osmpoi('Test')
+    osmpoi.save_filtered = False
+    result = osmpoi.filter_osm_points(df, deduplicate=False)
+    amenity, group, _ = baseline_classify(df)
+    keep = (group != '') & df['highway'].isnull().to_numpy()
+    assert list(result['name']) == list(df['name'][keep])
+    assert list(result['group']) == list(group[keep])
+    assert list(result['amenity']) == list(amenity[keep])
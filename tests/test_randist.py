@@ -0,0 +1,42 @@
+import geopandas as gpd
+import numpy
+import pytest
+from shapely import Polygon, box
+
+from spatialzosm.sampling import HouseSampler
+from spatialzosm.utils._randist import normal_xy
+
+SLIVER = Polygon([(0, 0)] * 4)
+
+
+def geometries(*geoms):
+    array = numpy.empty(len(geoms), dtype=object)
+    array[:] = geoms
+    return array
+
+
+@pytest.mark.parametrize('geoms', [[SLIVER], [SLIVER, None, Polygon()], [SLIVER, Polygon([(1, 1)] * 4)]])
+def test_only_degenerate_polygons_give_no_points(geoms):
+    with pytest.warns(UserWarning, match='degenerate'):
+        x, y, index = normal_xy(geometries(*geoms), 5, 0)
+    assert len(x) == len(y) == len(index) == 0
+    assert index.dtype == numpy.int64
+
+
+def test_missing_and_empty_polygons_give_no_points():
+    x, y, index = normal_xy(geometries(None, Polygon()), 5, 0)
+    assert len(x) == len(index) == 0
+
+
+def test_degenerate_polygons_are_skipped():
+    with pytest.warns(UserWarning, match='Skipping 1 degenerate'):
+        x, y, index = normal_xy(geometries(SLIVER, box(0, 0, 1, 1)), 5, 0)
+    assert list(index) == [1] * 5
+    assert ((x > 0) & (x < 1) & (y > 0) & (y < 1)).all()
+
+
+def test_areas_with_a_sliver_zone():
+    zones = gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1), SLIVER, box(1, 0, 2, 1)], crs='EPSG:4326')
+    with pytest.warns(UserWarning, match='degenerate'):
+        houses = HouseSampler().create_houses_areas(zones, method='normal', pop_size=[4, 3, 2], seed=1, save_file=False)
+    assert len(houses) == 6
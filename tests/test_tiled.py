@@ -0,0 +1,86 @@
+import pytest
+import shapely
+
+from spatialzosm.utils import _tiled
+from spatialzosm.utils._cache import OsmCache
+from spatialzosm.utils._tiled import InsufficientResponseError, TiledDownloader
+from stubs import StubDownloader
+
+PLACE = shapely.box(0.0, 0.0, 0.2, 0.1)
+FIRST, SECOND = (0.0, 0.0, 0.05, 0.05), (0.15, 0.05, 0.2, 0.1)
+
+
+@pytest.fixture
+def waits(monkeypatch):
+    waits = []
+    monkeypatch.setattr(_tiled.time, 'sleep', waits.append)
+    return waits
+
+
+def test_tiles_cover_the_place():
+    tiles = TiledDownloader(StubDownloader()).tiles(PLACE)
+    assert len(tiles) == 8
+    assert shapely.union_all(tiles).equals(PLACE)
+
+
+def test_failed_tiles_are_retried_with_backoff(waits):
+    stub = StubDownloader(failures={FIRST: 1, SECOND: 2})
+    features = TiledDownloader(stub, workers=1, retries=3, backoff=0.5).features_from_place(PLACE, {'amenity': True})
+    assert stub.count('features_from_polygon') == 8 + 3
+    assert sorted(waits) == [0.5, 0.5, 1.0]
+    #The POI of every tile and the one on their shared corner, once
+    assert len(features) == 9
+    assert not features.index.duplicated().any()
+
+
+def test_tiles_failing_every_retry_raise(waits):
+    stub = StubDownloader(failures={FIRST: 3})
+    with pytest.raises(ConnectionError):
+        TiledDownloader(stub, workers=2, retries=2, backoff=0).features_from_place(PLACE, {'amenity': True})
+    assert stub.failures[FIRST] == 0
+
+
+def test_place_names_are_geocoded(waits):
+    stub = StubDownloader()
+    features = TiledDownloader(stub).features_from_place('Stub city', {'amenity': True})
+    assert stub.count('geocode_to_gdf') == 1
+    assert len(features) == 9
+
+
+def test_cached_rerun_does_not_download(tmp_path, waits):
+    stub = StubDownloader(failures={FIRST: 1})
+    first = TiledDownloader(stub, retries=1, backoff=0, cache=OsmCache(str(tmp_path))).features_from_place(PLACE, {'amenity': True})
+    rerun = StubDownloader()
+    second = TiledDownloader(rerun, cache=OsmCache(str(tmp_path))).features_from_place(PLACE, {'amenity': True})
+    assert rerun.count() == 0
+    assert first.equals(second)
+
+
+def test_offline_misses_are_not_retried(tmp_path, waits):
+    stub = StubDownloader()
+    with pytest.raises(LookupError):
+        TiledDownloader(stub, cache=OsmCache(str(tmp_path), offline=True)).features_from_place(PLACE, {'amenity': True})
+    assert stub.count() == 0
+    assert not waits
+
+
+def test_empty_tiles_are_not_cached(tmp_path, waits):
+    stub = StubDownloader(empty=[FIRST])
+    features = TiledDownloader(stub, cache=OsmCache(str(tmp_path))).features_from_place(PLACE, {'amenity': True})
+    assert len(features) == 8
+    assert stub.count('features_from_polygon') == 8 and not waits
+    rerun = StubDownloader()
+    features = TiledDownloader(rerun, cache=OsmCache(str(tmp_path))).features_from_place(PLACE, {'amenity': True})
+    assert rerun.count() == 1
+    assert len(features) == 9
+
+
+def test_invalid_answers_are_retried_not_emptied(tmp_path, waits):
+    #osmnx raises InsufficientResponseError for an Overpass answer that is not valid JSON too
+    error = InsufficientResponseError('Overpass returned an invalid JSON response')
+    stub = StubDownloader(failures={FIRST: 1}, error=error)
+    features = TiledDownloader(stub, retries=1, backoff=0, cache=OsmCache(str(tmp_path))).features_from_place(PLACE, {'amenity': True})
+    assert len(features) == 9
+    stub = StubDownloader(failures={FIRST: 2}, error=error)
+    with pytest.raises(InsufficientResponseError):
+        TiledDownloader(stub, retries=1, backoff=0).features_from_place(PLACE, {'amenity': True})